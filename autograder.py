@@ -82,6 +82,11 @@ def readCommand(argv):
                       dest='noGraphics',
                       action='store_true',
                       help='No graphics display for pacman games.')
+    parser.add_option('--early-stop',
+                      dest='earlyStop',
+                      type='float',
+                      default=None,
+                      help='Stop agent evaluation games once the grade is settled at this confidence, e.g. 0.99.')
     (options, args) = parser.parse_args(argv)
     return options
 
@@ -197,7 +202,7 @@ def printTest(testDict, solutionDict):
         print("   |", line)
 
 
-def runTest(testName, moduleDict, printTestCase=False, display=None):
+def runTest(testName, moduleDict, printTestCase=False, display=None, earlyStop=None):
     import testParser
     import testClasses
     for module in moduleDict:
@@ -207,6 +212,8 @@ def runTest(testName, moduleDict, printTestCase=False, display=None):
     solutionDict = testParser.TestParser(testName + ".solution").parse()
     test_out_file = os.path.join('%s.test_output' % testName)
     testDict['test_out_file'] = test_out_file
+    if earlyStop is not None:
+        testDict.setdefault('earlyStopConfidence', str(earlyStop))
     testClass = getattr(projectTestClasses, testDict['class'])
 
     questionClass = getattr(testClasses, 'Question')
@@ -251,7 +258,7 @@ def getTestSubdirs(testParser, testRoot, questionToGrade):
 # evaluate student code
 def evaluate(generateSolutions, testRoot, moduleDict, exceptionMap=ERROR_HINT_MAP,
              edxOutput=False, muteOutput=False, gsOutput=False,
-             printTestCase=False, questionToGrade=None, display=None):
+             printTestCase=False, questionToGrade=None, display=None, earlyStop=None):
     # imports of testbench code.  note that the testClasses import must follow
     # the import of student code due to dependencies
     import testParser
@@ -286,6 +293,8 @@ def evaluate(generateSolutions, testRoot, moduleDict, exceptionMap=ERROR_HINT_MA
             if testDict.get("disabled", "false").lower() == "true":
                 continue
             testDict['test_out_file'] = test_out_file
+            if earlyStop is not None:
+                testDict.setdefault('earlyStopConfidence', str(earlyStop))
             testClass = getattr(projectTestClasses, testDict['class'])
             testCase = testClass(question, testDict)
 
@@ -351,9 +360,10 @@ if __name__ == '__main__':
 
     if options.runTest != None:
         runTest(options.runTest, moduleDict, printTestCase=options.printTestCase,
-                display=getDisplay(True, options))
+                display=getDisplay(True, options), earlyStop=options.earlyStop)
     else:
         evaluate(options.generateSolutions, options.testRoot, moduleDict,
                  gsOutput=options.gsOutput,
                  edxOutput=options.edxOutput, muteOutput=options.muteOutput, printTestCase=options.printTestCase,
-                 questionToGrade=options.gradeQuestion, display=getDisplay(options.gradeQuestion != None, options))
+                 questionToGrade=options.gradeQuestion, display=getDisplay(options.gradeQuestion != None, options),
+                 earlyStop=options.earlyStop)
@@ -0,0 +1,334 @@
+# benchmarks.py
+# -------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Micro-benchmarks for the search and simulation code.
+
+  python benchmarks.py -b leafEval -l smallClassic,mediumClassic
+  python benchmarks.py -b moveLatency -l mediumClassic
+  python benchmarks.py -b quiescence -l smallClassic
+  python benchmarks.py -b tablebase -l trappedClassic,minimaxClassic
+  python benchmarks.py -b simulation -l smallClassic,mediumClassic
+
+Every benchmark prints one line per layout so runs can be diffed.
+"""
+from pacman import GameState
+import layout
+import multiAgents
+import os
+import random
+import sys
+import time
+
+
+def collectChildGroups(lay, numGroups, seed=0, evaluator=None):
+    """
+    Plays random moves on lay and returns numGroups lists of sibling states
+    (all children of one node), the unit the search kernels evaluate at
+    their last ply.  When evaluator is an IncrementalEvaluator its features
+    are attached to each start state, as MultiAgentSearchAgent does.
+    """
+    rand = random.Random(seed)
+    groups = []
+    while len(groups) < numGroups:
+        state = GameState()
+        state.initialize(lay, lay.getNumGhosts())
+        if isinstance(evaluator, multiAgents.IncrementalEvaluator):
+            evaluator.attach(state)
+        agentIndex = 0
+        while not (state.isWin() or state.isLose()) and len(groups) < numGroups:
+            children = [state.getNextState(agentIndex, action)
+                        for action in state.getLegalActions(agentIndex)]
+            groups.append(children)
+            state = rand.choice(children)
+            agentIndex = (agentIndex + 1) % state.getNumAgents()
+    return groups
+
+
+def benchmarkLeafEvaluation(layoutName, evalFn='betterEvaluationFunction', numGroups=2000, repeats=5):
+    """
+    Compares leaf-evaluation throughput of calling the evaluation function
+    once per state against one evaluateBatch call per group of siblings.
+    """
+    lay = layout.getLayout(layoutName)
+    evaluator = getattr(multiAgents, evalFn)
+    groups = collectChildGroups(lay, numGroups, evaluator=evaluator)
+    numStates = sum([len(group) for group in groups])
+
+    def perState():
+        for group in groups:
+            [evaluator(state) for state in group]
+
+    def batched():
+        for group in groups:
+            evaluator.evaluateBatch(group)
+
+    for group in groups:
+        expected = [evaluator(state) for state in group]
+        for batchValue, value in zip(evaluator.evaluateBatch(group), expected):
+            if abs(batchValue - value) > 1e-6:
+                raise Exception('Batched and per-state evaluation disagree')
+    perStateTime = bestOf(perState, repeats)
+    batchedTime = bestOf(batched, repeats)
+    print('%-16s %7d states  per-state: %10.0f states/s  batched: %10.0f states/s  (x%.2f)' % (
+        layoutName, numStates, numStates / perStateTime, numStates / batchedTime,
+        perStateTime / batchedTime))
+
+
+class TimedAgent:
+    """
+    Forwards to agent and records how long each getAction call takes.
+    """
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.index = agent.index
+        self.moveTimes = []
+        for method in ['registerInitialState', 'observationFunction', 'final']:
+            if hasattr(agent, method):
+                setattr(self, method, getattr(agent, method))
+
+    def getAction(self, state):
+        start = time.perf_counter()
+        action = self.agent.getAction(state)
+        self.moveTimes.append(time.perf_counter() - start)
+        return action
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def benchmarkMoveLatency(layoutName, pacman='AlphaBetaAgent',
+                         agentArgs=('evalFn=better,depth=4', 'evalFn=better,depth=4,evalCache=100000',
+                                    'evalFn=better,nodeBudget=2000'),
+                         numGames=2, numGhosts=2, seed=0):
+    """
+    Plays numGames games per Pacman configuration and reports the p50 and
+    p99 wall-clock time of a single getAction call, and the evaluation
+    cache counters of configurations that use one.
+    """
+    import pacman as pacmanModule
+    import ghostAgents
+    import textDisplay
+    lay = layout.getLayout(layoutName)
+    for args in agentArgs:
+        agentType = getattr(multiAgents, pacman)
+        agent = TimedAgent(agentType(**pacmanModule.parseAgentArgs(args)))
+        ghosts = [ghostAgents.RandomGhost(i + 1) for i in range(numGhosts)]
+        random.seed(seed)
+        rules = pacmanModule.ClassicGameRules()
+        scores = []
+        for i in range(numGames):
+            game = rules.newGame(lay, agent, ghosts, textDisplay.NullGraphics(), quiet=True)
+            game.run()
+            scores.append(game.state.getScore())
+        times = agent.moveTimes
+        print('%-16s %-40s moves: %5d  p50: %8.2f ms  p99: %8.2f ms  max: %8.2f ms  avg score: %.1f' % (
+            layoutName, args, len(times), 1000 * percentile(times, 0.5),
+            1000 * percentile(times, 0.99), 1000 * max(times), sum(scores) / len(scores)))
+        cacheStats = agent.agent.getEvalCacheStats()
+        if cacheStats is not None:
+            print('%-16s %-40s cache hits: %d  misses: %d  evictions: %d  hit rate: %.2f' % (
+                layoutName, '', cacheStats['hits'], cacheStats['misses'], cacheStats['evictions'],
+                cacheStats['hitRate']))
+
+
+class RecordingAgent(TimedAgent):
+    """
+    A TimedAgent that also keeps a copy of every state it was asked to move in.
+    """
+
+    def __init__(self, agent):
+        TimedAgent.__init__(self, agent)
+        self.states = []
+        self.actions = []
+
+    def getAction(self, state):
+        self.states.append(state.deepCopy())
+        action = TimedAgent.getAction(self, state)
+        self.actions.append(action)
+        return action
+
+
+def benchmarkQuiescence(layoutName, pacman='AlphaBetaAgent', evalFn='better',
+                        agentArgs=('depth=2', 'depth=2,quiescence=1', 'depth=2,quiescence=2', 'depth=3'),
+                        reference='depth=3', numGames=2, numGhosts=2, seed=0):
+    """
+    Collects the positions Pacman faced in numGames games and reports, for
+    each configuration, how often it picks the same move as the reference
+    search and how long it takes per move.
+    """
+    import pacman as pacmanModule
+    import ghostAgents
+    import textDisplay
+    lay = layout.getLayout(layoutName)
+    agentType = getattr(multiAgents, pacman)
+
+    def makeAgent(args):
+        return agentType(**pacmanModule.parseAgentArgs('evalFn=%s,%s' % (evalFn, args)))
+
+    recorder = RecordingAgent(makeAgent(agentArgs[0]))
+    ghosts = [ghostAgents.RandomGhost(i + 1) for i in range(numGhosts)]
+    random.seed(seed)
+    rules = pacmanModule.ClassicGameRules()
+    for i in range(numGames):
+        rules.newGame(lay, recorder, ghosts, textDisplay.NullGraphics(), quiet=True).run()
+    states = recorder.states
+
+    def decide(agent):
+        actions = []
+        start = time.perf_counter()
+        for state in states:
+            state = state.deepCopy()
+            if hasattr(agent, 'observationFunction'):
+                state = agent.observationFunction(state)
+            actions.append(agent.getAction(state))
+        return actions, time.perf_counter() - start
+
+    referenceActions, referenceTime = decide(makeAgent(reference))
+    for args in agentArgs:
+        actions, elapsed = decide(makeAgent(args))
+        agree = len([a for a, r in zip(actions, referenceActions) if a == r])
+        print('%-16s %-24s agrees with %s on %5.1f%% of %d moves  %8.2f ms/move' % (
+            layoutName, args, reference, 100.0 * agree / len(states), len(states),
+            1000 * elapsed / len(states)))
+
+
+def benchmarkTablebase(layoutName, agents=('MinimaxAgent:depth=2', 'MinimaxAgent:depth=4',
+                                             'ExpectimaxAgent:depth=2'),
+                       model='minimax', numGames=5, seed=0):
+    """
+    Scores agents against the solved game: for every position they moved
+    in, whether their move was optimal under the tablebase's ghost model.
+    The table is solved and written first if it does not exist yet.
+    """
+    import pacman as pacmanModule
+    import ghostAgents
+    import tablebase
+    import textDisplay
+    lay = layout.getLayout(layoutName)
+    path = tablebase.getTablebasePath(layoutName, lay.getNumGhosts(), model)
+    if not os.path.exists(path):
+        solver = tablebase.TablebaseSolver(lay, lay.getNumGhosts(), model)
+        solver.solve()
+        solver.write(path)
+    table = tablebase.Tablebase(path)
+    start = GameState()
+    start.initialize(lay, lay.getNumGhosts())
+    print('%-16s solved start value: %s (%s ghosts)' % (layoutName, table.lookup(start)[0], model))
+    ghostType = ghostAgents.DirectionalGhost if model == 'minimax' else ghostAgents.RandomGhost
+    for spec in agents:
+        agentName, args = spec.split(':')
+        recorder = RecordingAgent(getattr(multiAgents, agentName)(**pacmanModule.parseAgentArgs(args)))
+        ghosts = [ghostType(i + 1) for i in range(lay.getNumGhosts())]
+        random.seed(seed)
+        rules = pacmanModule.ClassicGameRules()
+        scores = []
+        for i in range(numGames):
+            game = rules.newGame(lay, recorder, ghosts, textDisplay.NullGraphics(), quiet=True)
+            game.run()
+            scores.append(game.state.getScore())
+        optimal = 0
+        for state, action in zip(recorder.states, recorder.actions):
+            bestValue = table.lookup(state)[0]
+            if table.getActionValue(state, action) >= bestValue - 1e-6:
+                optimal += 1
+        print('%-16s %-26s optimal moves: %5.1f%% of %4d  avg score: %.1f' % (
+            layoutName, spec, 100.0 * optimal / len(recorder.states), len(recorder.states),
+            sum(scores) / len(scores)))
+    table.close()
+
+
+def benchmarkSimulation(layoutName, agents=('GreedyAgent', 'LeftTurnAgent', 'ExpectimaxAgent:depth=1'),
+                        numGames=30, numGhosts=2, seed=0):
+    """
+    Plays numGames quiet games per Pacman agent against random ghosts, once
+    through the interactive loop of Game.run and once through
+    Game.runHeadless, and reports games and turns per second for each.  Both
+    loops play the same games, which is checked.
+    """
+    import pacman as pacmanModule
+    import ghostAgents
+    import textDisplay
+    lay = layout.getLayout(layoutName)
+    for spec in agents:
+        agentName, args = (spec.split(':') + [None])[:2]
+        results = []
+        for headless in [False, True]:
+            agent = pacmanModule.loadAgent(agentName, True)(**pacmanModule.parseAgentArgs(args))
+            ghosts = [ghostAgents.RandomGhost(i + 1) for i in range(numGhosts)]
+            random.seed(seed)
+            rules = pacmanModule.ClassicGameRules()
+            rules.quiet = True
+            scores = []
+            turns = 0
+            start = time.perf_counter()
+            for i in range(numGames):
+                game = rules.newGame(lay, agent, ghosts, textDisplay.NullGraphics(), quiet=True)
+                game.allowHeadless = headless
+                game.run()
+                scores.append(game.state.getScore())
+                turns += len(game.moveHistory)
+            results.append((time.perf_counter() - start, turns, scores))
+        (classicTime, turns, classicScores), (headlessTime, headlessTurns, headlessScores) = results
+        if classicScores != headlessScores:
+            raise Exception('The headless loop played different games for ' + spec)
+        print('%-16s %-26s run: %7.1f games/s %9.0f turns/s  runHeadless: %7.1f games/s %9.0f turns/s  (%.2fx)' % (
+            layoutName, spec, numGames / classicTime, turns / classicTime,
+            numGames / headlessTime, turns / headlessTime, classicTime / headlessTime))
+
+
+def bestOf(function, repeats):
+    best = None
+    for i in range(repeats):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+BENCHMARKS = {
+    'leafEval': benchmarkLeafEvaluation,
+    'moveLatency': benchmarkMoveLatency,
+    'quiescence': benchmarkQuiescence,
+    'tablebase': benchmarkTablebase,
+    'simulation': benchmarkSimulation,
+}
+
+
+def readCommand(argv):
+    from optparse import OptionParser
+    parser = OptionParser('python benchmarks.py -b BENCHMARK [options]')
+    parser.add_option('-b', '--benchmark', dest='benchmark', default='leafEval',
+                      help='one of: %s [Default: %%default]' % ', '.join(sorted(BENCHMARKS)))
+    parser.add_option('-l', '--layouts', dest='layouts', default='smallClassic,mediumClassic',
+                      help='comma separated layouts to run on [Default: %default]')
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    if options.benchmark not in BENCHMARKS:
+        raise Exception('Unknown benchmark ' + options.benchmark)
+    return options
+
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    for layoutName in options.layouts.split(','):
+        BENCHMARKS[options.benchmark](layoutName)
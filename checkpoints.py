@@ -0,0 +1,220 @@
+# checkpoints.py
+# --------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Checkpoints of a run of games, so a run that is killed can be resumed.
+
+  python pacman.py -p ExpectimaxAgent -a evalFn=better -n 5000 -q --checkpoint run.ckpt
+  python pacman.py -p ExpectimaxAgent -a evalFn=better -n 5000 -q --checkpoint run.ckpt --resume
+
+A checkpoint is two files:
+
+  PATH        - JSON lines: a header describing the run, then the result of
+                every finished game
+  PATH.state  - a pickle, replaced after every game and every
+                checkpointMoves moves, holding the index of the next game,
+                the random module's state at its start and, when the game
+                is under way, a snapshot of it: the GameStateData (as
+                gameRecord.snapshotState), moveHistory, the agents' time
+                totals and warnings, the random state after the last move
+                and the next agent to move
+
+Resuming replays nothing: the finished results are read back, the random
+module is restored and an unfinished game continues from its snapshot, so
+the run carries on exactly where it stopped as long as the agents keep no
+decision-relevant state between moves (the agents in this project only keep
+caches).  Snapshots are taken on the game's thread, which costs a few
+microseconds plus a copy of moveHistory; serializing and writing them
+happens on a background thread, so checkpoints do not eat into the agents'
+move times.
+"""
+import gameRecord
+import json
+import os
+import pickle
+import queue
+import random
+import threading
+
+CHECKPOINT_VERSION = 3
+
+# Snapshot an unfinished game this often (in moves) unless told otherwise
+DEFAULT_CHECKPOINT_MOVES = 200
+
+
+def getRunHeader(layout, pacman, ghosts, numGames, numTraining, seed, agentArgs=None,
+                 timeout=30, catchExceptions=False):
+    """
+    What a resumed run has to agree on with the run it continues.  agentArgs
+    are the options Pacman was created with (as parseAgentArgs returns them).
+    """
+    return {'version': CHECKPOINT_VERSION, 'layout': layout.contentHash,
+            'pacman': pacman.__class__.__name__,
+            'agentArgs': dict([(str(key), str(value)) for key, value in (agentArgs or {}).items()]),
+            'ghosts': [ghost.__class__.__name__ for ghost in ghosts],
+            'numGames': numGames, 'numTraining': numTraining, 'seed': seed,
+            'timeout': timeout, 'catchExceptions': bool(catchExceptions)}
+
+
+def getStatePath(path):
+    return path + '.state'
+
+
+def takeGameSnapshot(game, nextAgentIndex):
+    return {'state': gameRecord.snapshotState(game.state),
+            'moveHistory': list(game.moveHistory),
+            'totalAgentTimes': list(game.totalAgentTimes),
+            'totalAgentTimeWarnings': list(game.totalAgentTimeWarnings),
+            'random': random.getstate(),
+            'nextAgentIndex': nextAgentIndex}
+
+
+def restoreGame(game, layout, snapshot):
+    """
+    Puts a freshly created Game back where snapshot was taken; run() then
+    carries on with the next agent to move.
+    """
+    game.state = gameRecord.restoreState(layout, snapshot['state'])
+    game.moveHistory = list(snapshot['moveHistory'])
+    game.totalAgentTimes = list(snapshot['totalAgentTimes'])
+    game.totalAgentTimeWarnings = list(snapshot['totalAgentTimeWarnings'])
+    game.startingIndex = snapshot['nextAgentIndex']
+    random.setstate(snapshot['random'])
+
+
+class CheckpointWriter:
+    """
+    Writes results and state snapshots on a background thread, in the order
+    they were handed over.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.work)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def writeLine(self, record):
+        self.queue.put(('line', record))
+
+    def writeState(self, state):
+        self.queue.put(('state', state))
+
+    def work(self):
+        with open(self.path, 'a') as results:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    return
+                kind, payload = item
+                if kind == 'line':
+                    results.write(json.dumps(payload) + '\n')
+                    results.flush()
+                    os.fsync(results.fileno())
+                else:
+                    statePath = getStatePath(self.path)
+                    tmpPath = '%s.%d.tmp' % (statePath, os.getpid())
+                    with open(tmpPath, 'wb') as f:
+                        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmpPath, statePath)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+class RunCheckpointer:
+    """
+    Keeps the checkpoint of one run.  With resume, reads back what an
+    earlier run with the same header left: finished holds the GameSummary
+    of every finished game, nextGame the index of the first game to play,
+    randomState the random module's state at its start and snapshot the
+    unfinished game, if any.  Without resume, any old checkpoint is
+    replaced.
+    """
+
+    def __init__(self, path, header, checkpointMoves=DEFAULT_CHECKPOINT_MOVES, resume=False):
+        from pacman import GameSummary
+        self.path = path
+        self.header = header
+        self.checkpointMoves = checkpointMoves
+        self.finished = []
+        self.nextGame = 0
+        self.randomState = None
+        self.snapshot = None
+        if resume and os.path.exists(path) and os.path.exists(getStatePath(path)):
+            with open(getStatePath(path), 'rb') as f:
+                state = pickle.load(f)
+            lines = []
+            with open(path) as f:
+                for line in f:
+                    if not line.endswith('\n'):
+                        break
+                    lines.append(json.loads(line))
+            if not lines or lines[0] != header:
+                raise Exception('%s was written by a different run: %s' % (path, lines[:1]))
+            results = lines[1:1 + state['numResults']]
+            self.finished = [GameSummary(r['index'], r['score'], r['win'], r['moves'],
+                                         r['timeout'], r['crashed']) for r in results]
+            self.nextGame = state['nextGame']
+            self.randomState = state['random']
+            self.snapshot = state['game']
+            # Drop results written after the state file was last replaced
+            with open(path, 'w') as f:
+                for line in lines[:1 + len(self.finished)]:
+                    f.write(json.dumps(line) + '\n')
+        else:
+            self.randomState = random.getstate()
+            with open(path, 'w') as f:
+                f.write(json.dumps(header) + '\n')
+        self.writer = CheckpointWriter(path)
+        self.numResults = len(self.finished)
+        self.gameIndex = None
+        self.movesSinceSnapshot = 0
+        if self.snapshot is None:
+            self.writeState(None)
+
+    def writeState(self, game):
+        self.writer.writeState({'nextGame': self.nextGame, 'numResults': self.numResults,
+                                'random': self.randomState, 'game': game})
+
+    def beginGame(self, gameIndex):
+        "Called before game gameIndex is seeded and created."
+        self.gameIndex = gameIndex
+        self.nextGame = gameIndex
+        self.randomState = random.getstate()
+        self.movesSinceSnapshot = 0
+
+    def recordMove(self, game, nextAgentIndex):
+        self.movesSinceSnapshot += 1
+        if self.checkpointMoves and self.movesSinceSnapshot >= self.checkpointMoves and not game.gameOver:
+            self.movesSinceSnapshot = 0
+            self.writeState(takeGameSnapshot(game, nextAgentIndex))
+
+    def endGame(self, summary=None):
+        "Called after a game, with its GameSummary unless it was a training game."
+        if summary is not None:
+            self.writer.writeLine({'index': summary.index, 'score': summary.score, 'win': summary.win,
+                                   'moves': summary.numMoves, 'timeout': summary.timeout,
+                                   'crashed': summary.crashed})
+            self.numResults += 1
+        self.nextGame = self.gameIndex + 1
+        self.randomState = random.getstate()
+        self.writeState(None)
+
+    def close(self):
+        self.writer.close()
@@ -0,0 +1,274 @@
+# foodPlanner.py
+# --------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Summaries of the food left on the board, for estimating how long it takes
+Pacman to clear it.
+
+Everything is keyed by the food bitmask GameStateData keeps up to date
+(_foodKey), so the thousands of search nodes that share a food set share
+one summary, and a summary is only built when a pellet is eaten:
+
+  - the minimum spanning tree of the pellets under maze distance, derived
+    from the parent food set's tree when the eaten pellet was one of its
+    leaves;
+  - the distance from every cell to the nearest pellet;
+  - for few pellets, the exact shortest path through all of them from each
+    starting pellet (Held-Karp dynamic programming).
+
+With these, getLowerBound and getClearanceEstimate cost a table lookup per
+call (plus one per pellet for the exact tours).
+"""
+import collections
+import util
+
+# Food sets up to this size get exact tours
+MAX_TOUR_FOOD = 8
+
+# MST edges longer than this separate food clusters
+CLUSTER_GAP = 3
+
+# Planners by Layout.contentHash
+FOOD_PLANNERS = {}
+
+# Summaries kept per planner before the least recently used are dropped
+MAX_SUMMARIES = 20000
+
+
+def getFoodPlanner(layout):
+    if layout.contentHash not in FOOD_PLANNERS:
+        FOOD_PLANNERS[layout.contentHash] = FoodClearancePlanner(layout)
+    return FOOD_PLANNERS[layout.contentHash]
+
+
+class FoodSummary:
+    """
+    What a FoodClearancePlanner knows about one food set:
+
+      food        - the pellets, in bit order of the food key
+      parents     - the pellets' MST as a parent map (the root maps to None)
+      edgeWeights - per pellet, the weight of the edge to its parent
+      mstWeight   - total weight of the tree
+      nearest     - per LayoutTables cell index, maze distance to the
+                    closest pellet
+      tours       - per pellet, the length of the shortest path through all
+                    the pellets starting there; None for large food sets
+    """
+
+    def __init__(self, food, parents, edgeWeights, mstWeight):
+        self.food = food
+        self.parents = parents
+        self.edgeWeights = edgeWeights
+        self.mstWeight = mstWeight
+        self.nearest = None
+        self.tours = None
+
+
+class FoodClearancePlanner:
+    """
+    Caches FoodSummary objects per food key for one layout, least recently
+    used first, and answers clearance queries from them.
+    """
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.tables = layout.getTables()
+        self.height = layout.height
+        self.summaries = collections.OrderedDict()
+        self.rebuilds = 0
+        self.derived = 0
+        self.evictions = 0
+
+    def distance(self, pos1, pos2):
+        distance = self.tables.getDistance(pos1, pos2)
+        return self.tables.unreachable if distance is None else distance
+
+    def decodeFood(self, foodKey):
+        food = []
+        height = self.height
+        while foodKey:
+            low = foodKey & -foodKey
+            bit = low.bit_length() - 1
+            food.append((bit // height, bit % height))
+            foodKey ^= low
+        return food
+
+    def getSummary(self, foodKey, parentKey=None):
+        """
+        Returns the FoodSummary of foodKey.  When parentKey (the food set
+        before the last pellet was eaten) is already summarized and the
+        eaten pellet is a leaf of its tree, the tree is derived from it
+        instead of being rebuilt.
+        """
+        summaries = self.summaries
+        summary = summaries.get(foodKey)
+        if summary is not None:
+            summaries.move_to_end(foodKey)
+            return summary
+        parent = summaries.get(parentKey) if parentKey is not None else None
+        summary = None
+        if parent is not None:
+            eaten = self.decodeFood(parentKey ^ foodKey)
+            if len(eaten) == 1:
+                summary = self.removeLeaf(parent, eaten[0])
+        if summary is None:
+            summary = self.buildSummary(self.decodeFood(foodKey))
+            self.rebuilds += 1
+        else:
+            self.derived += 1
+        summaries[foodKey] = summary
+        if len(summaries) > MAX_SUMMARIES:
+            summaries.popitem(last=False)
+            self.evictions += 1
+        return summary
+
+    def buildSummary(self, food):
+        "Prim's algorithm over the maze distances between pellets."
+        parents = {}
+        edgeWeights = {}
+        if not food:
+            return FoodSummary(food, parents, edgeWeights, 0)
+        root = food[0]
+        parents[root] = None
+        edgeWeights[root] = 0
+        best = dict([(pellet, (self.distance(root, pellet), root)) for pellet in food[1:]])
+        total = 0
+        while best:
+            pellet = min(best, key=lambda p: best[p][0])
+            weight, parent = best.pop(pellet)
+            parents[pellet] = parent
+            edgeWeights[pellet] = weight
+            total += weight
+            for other in best:
+                distance = self.distance(pellet, other)
+                if distance < best[other][0]:
+                    best[other] = (distance, pellet)
+        return FoodSummary(food, parents, edgeWeights, total)
+
+    def removeLeaf(self, summary, eaten):
+        """
+        Removing a leaf from a minimum spanning tree leaves a minimum spanning
+        tree of the remaining vertices; returns None if eaten is not a leaf.
+        """
+        parents = summary.parents
+        if eaten not in parents:
+            return None
+        if parents[eaten] is None:
+            # The root is a leaf when it has exactly one child, which becomes the root
+            children = [p for p in parents if parents[p] == eaten]
+            if len(children) > 1:
+                return None
+            newParents = dict(parents)
+            newWeights = dict(summary.edgeWeights)
+            del newParents[eaten]
+            del newWeights[eaten]
+            weight = 0
+            if children:
+                weight = newWeights[children[0]]
+                newParents[children[0]] = None
+                newWeights[children[0]] = 0
+        else:
+            for p in parents:
+                if parents[p] == eaten:
+                    return None
+            newParents = dict(parents)
+            newWeights = dict(summary.edgeWeights)
+            weight = newWeights[eaten]
+            del newParents[eaten]
+            del newWeights[eaten]
+        food = [p for p in summary.food if p != eaten]
+        return FoodSummary(food, newParents, newWeights, summary.mstWeight - weight)
+
+    def getNearest(self, summary):
+        if summary.nearest is None:
+            if summary.food:
+                summary.nearest = self.tables.bfsFrom(summary.food)
+            else:
+                summary.nearest = [0] * len(self.tables.freeCells)
+        return summary.nearest
+
+    def getTours(self, summary):
+        """
+        Held-Karp over subsets of the pellets: path[S][j] is the shortest
+        path that starts at pellet j and visits every pellet of S.
+        """
+        if summary.tours is None:
+            food = summary.food
+            n = len(food)
+            distances = [[self.distance(a, b) for b in food] for a in food]
+            full = (1 << n) - 1
+            path = [[self.tables.unreachable * n] * n for s in range(full + 1)]
+            for j in range(n):
+                path[1 << j][j] = 0
+            for subset in range(1, full + 1):
+                for j in range(n):
+                    if not (subset >> j) & 1 or subset == 1 << j:
+                        continue
+                    rest = subset ^ (1 << j)
+                    row = distances[j]
+                    restPaths = path[rest]
+                    path[subset][j] = min([row[k] + restPaths[k] for k in range(n) if (rest >> k) & 1])
+            summary.tours = path[full] if n else []
+        return summary.tours
+
+    def getLowerBound(self, pacmanPosition, foodKey, parentKey=None):
+        """
+        An admissible bound on the moves needed to eat every pellet: any such
+        walk first reaches some pellet and then spans all of them, so it is
+        at least the distance to the nearest pellet plus the MST weight.
+        """
+        summary = self.getSummary(foodKey, parentKey)
+        if not summary.food:
+            return 0
+        index = self.tables.cellIndex.get(util.nearestPoint(pacmanPosition))
+        nearest = self.getNearest(summary)[index] if index is not None else 0
+        return nearest + summary.mstWeight
+
+    def getClearanceEstimate(self, pacmanPosition, foodKey, parentKey=None):
+        """
+        The exact number of moves needed to eat every pellet, ignoring ghosts,
+        when at most MAX_TOUR_FOOD are left, and getLowerBound otherwise.
+        """
+        summary = self.getSummary(foodKey, parentKey)
+        if not summary.food or len(summary.food) > MAX_TOUR_FOOD:
+            return self.getLowerBound(pacmanPosition, foodKey, parentKey)
+        position = util.nearestPoint(pacmanPosition)
+        tours = self.getTours(summary)
+        return min([self.distance(position, pellet) + tour
+                    for pellet, tour in zip(summary.food, tours)])
+
+    def getClusters(self, foodKey):
+        """
+        Groups the pellets into clusters: the components left after cutting
+        the MST edges longer than CLUSTER_GAP.  Returns a dict from pellet
+        to cluster id.
+        """
+        summary = self.getSummary(foodKey)
+        clusters = {}
+        nextId = 0
+        for pellet in summary.food:
+            chain = []
+            current = pellet
+            while current not in clusters:
+                chain.append(current)
+                parent = summary.parents[current]
+                if parent is None or summary.edgeWeights[current] > CLUSTER_GAP:
+                    clusters[current] = nextId
+                    nextId += 1
+                    chain.pop()
+                    break
+                current = parent
+            for member in chain:
+                clusters[member] = clusters[current]
+        return clusters
@@ -39,6 +39,10 @@ class Agent:
     def registerInitialState(self, state): # inspects the starting state
     """
 
+    # Agents that only read the states they are given set this to False, so
+    # Game.runHeadless can hand them the game's own state instead of a copy
+    mutatesState = True
+
     def __init__(self, index=0):
         self.index = index
 
@@ -242,6 +246,18 @@ class Grid:
                     list.append((x, y))
         return list
 
+    def asBitmask(self, key=True):
+        """
+        Returns an int with bit (x * height + y) set for every cell equal to key.
+        """
+        mask = 0
+        for x in range(self.width):
+            column = self.data[x]
+            for y in range(self.height):
+                if column[y] == key:
+                    mask |= 1 << (x * self.height + y)
+        return mask
+
     def packBits(self):
         """
         Returns an efficient int list representation
@@ -293,6 +309,20 @@ class Grid:
         return bools
 
 
+def gridFromBitmask(width, height, mask):
+    """
+    Inverse of Grid.asBitmask: builds a Grid with cell (x, y) set when bit
+    (x * height + y) of mask is.
+    """
+    g = Grid(width, height)
+    for x in range(width):
+        column = g.data[x]
+        for y in range(height):
+            if mask >> (x * height + y) & 1:
+                column[y] = True
+    return g
+
+
 def reconstituteGrid(bitRep):
     if type(bitRep) is not type((1, 2)):
         return bitRep
@@ -406,6 +436,7 @@ class GameStateData:
             self.layout = prevState.layout
             self._eaten = prevState._eaten
             self.score = prevState.score
+            self._foodKey = prevState._foodKey
 
         self._foodEaten = None
         self._foodAdded = None
@@ -414,6 +445,8 @@ class GameStateData:
         self._lose = False
         self._win = False
         self.scoreChange = 0
+        # Cached evaluation features (see multiAgents.IncrementalEvaluator)
+        self._features = None
 
     def deepCopy(self):
         state = GameStateData(self)
@@ -423,6 +456,7 @@ class GameStateData:
         state._foodEaten = self._foodEaten
         state._foodAdded = self._foodAdded
         state._capsuleEaten = self._capsuleEaten
+        state._features = self._features
         return state
 
     def copyAgentStates(self, agentStates):
@@ -519,6 +553,7 @@ class GameStateData:
         Creates an initial game state from a layout array (see layout.py).
         """
         self.food = layout.food.copy()
+        self._foodKey = self.food.asBitmask()
         #self.capsules = []
         self.capsules = layout.capsules[:]
         self.layout = layout
@@ -560,6 +595,12 @@ class Game:
         self.muteAgents = muteAgents
         self.catchExceptions = catchExceptions
         self.moveHistory = []
+        # Optional gameRecord.GameRecorder that is sent every move
+        self.recorder = None
+        # Optional checkpoints.RunCheckpointer that is sent every move
+        self.checkpointer = None
+        # Whether run() may take the runHeadless fast path when it applies
+        self.allowHeadless = True
         self.totalAgentTimes = [0 for agent in agents]
         self.totalAgentTimeWarnings = [0 for agent in agents]
         self.agentTimeout = False
@@ -601,10 +642,84 @@ class Game:
         sys.stdout = OLD_STDOUT
         sys.stderr = OLD_STDERR
 
+    def canRunHeadless(self):
+        """
+        A game can take the runHeadless fast path when nothing watches it:
+        no exceptions to catch or moves to time, and a null display.
+        """
+        checkNullDisplay = getattr(self.display, 'checkNullDisplay', None)
+        return self.allowHeadless and not self.catchExceptions and not _BOINC_ENABLED and \
+            checkNullDisplay is not None and checkNullDisplay()
+
+    def runHeadless(self):
+        """
+        The control loop of run() for games played for their results.  Agent
+        methods are looked up once rather than every turn, the display is
+        not called per move, and agents whose mutatesState is False are
+        given the game's state itself instead of a deep copy.
+        """
+        self.display.initialize(self.state.data)
+        self.numMoves = 0
+        for i in range(len(self.agents)):
+            agent = self.agents[i]
+            if not agent:
+                self.mute(i)
+                print("Agent %d failed to load" % i, file=sys.stderr)
+                self.unmute()
+                self._agentCrash(i, quiet=True)
+                return
+            registerInitialState = getattr(agent, 'registerInitialState', None)
+            if registerInitialState is not None:
+                self.mute(i)
+                registerInitialState(self.state.deepCopy())
+                self.unmute()
+
+        observers = [getattr(agent, 'observationFunction', None) for agent in self.agents]
+        deciders = [agent.getAction for agent in self.agents]
+        copies = [getattr(agent, 'mutatesState', True) for agent in self.agents]
+        mute = self.muteAgents
+        recorder = self.recorder
+        checkpointer = self.checkpointer
+        rules = self.rules
+        moveHistory = self.moveHistory
+        agentIndex = self.startingIndex
+        numAgents = len(self.agents)
+
+        while not self.gameOver:
+            observation = self.state.deepCopy() if copies[agentIndex] else self.state
+            if mute:
+                self.mute(agentIndex)
+            observe = observers[agentIndex]
+            if observe is not None:
+                observation = observe(observation)
+            action = deciders[agentIndex](observation)
+            if mute:
+                self.unmute()
+
+            moveHistory.append((agentIndex, action))
+            self.state = self.state.getNextState(agentIndex, action)
+            if recorder is not None:
+                recorder.recordMove(agentIndex, action, self.state)
+            rules.process(self.state, self)
+            agentIndex = (agentIndex + 1) % numAgents
+            if checkpointer is not None:
+                checkpointer.recordMove(self, agentIndex)
+
+        for agentIndex, agent in enumerate(self.agents):
+            final = getattr(agent, 'final', None)
+            if final is not None:
+                self.mute(agentIndex)
+                final(self.state)
+                self.unmute()
+        self.display.update(self.state.data)
+        self.display.finish()
+
     def run(self):
         """
         Main control loop for game play.
         """
+        if self.canRunHeadless():
+            return self.runHeadless()
         self.display.initialize(self.state.data)
         self.numMoves = 0
 
@@ -745,6 +860,8 @@ class Game:
                     return
             else:
                 self.state = self.state.getNextState(agentIndex, action)
+            if self.recorder is not None:
+                self.recorder.recordMove(agentIndex, action, self.state)
 
             # Change the display
             self.display.update(self.state.data)
@@ -758,6 +875,8 @@ class Game:
                 self.numMoves += 1
             # Next agent
             agentIndex = (agentIndex + 1) % numAgents
+            if self.checkpointer is not None:
+                self.checkpointer.recordMove(self, agentIndex)
 
             if _BOINC_ENABLED:
                 boinc.set_fraction_done(self.getProgress())
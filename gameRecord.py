@@ -0,0 +1,459 @@
+# gameRecord.py
+# -------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+A compact, append-only file format for recorded games.
+
+A file starts with RECORD_MAGIC and a version byte, followed by chunks, each
+a tag byte, a varint length and a payload:
+
+  'L'  a layout: its text, written the first time a game on it is recorded
+  'G'  a game header: JSON with the layout hash, the game's seed and the
+       agent types, followed (outside the chunk) by the game's moves
+
+A move is the varint 1 + agentIndex * 5 + the action's index in ACTIONS;
+a 0 ends the game and is followed by the final score (a zigzag varint)
+and a win byte.  From version 2 on, these are followed by the game's
+keyframes: a varint count, then per keyframe the number of moves played
+before it and a length-prefixed snapshot of the state (see snapshotState),
+taken every KEYFRAME_INTERVAL moves.  Version 2 snapshots were pickles; they
+are skipped when reading, and games appended to a version 2 file carry no
+keyframes, so those games are replayed from their first move.  Games are appended one after another
+to the same file, and a game cut short by a crash is skipped when reading.
+
+RecordIndex scans a file once for where each game and keyframe starts, so
+getState(game, move) restores the nearest keyframe and replays at most
+KEYFRAME_INTERVAL - 1 moves instead of the whole game.
+
+  recorder = GameRecorder('games.rec')   # pacman.py -r --recordFile games.rec
+  for game in readGames('games.rec'):
+      print(game.header['seed'], len(game.actions), game.score)
+"""
+import json
+import os
+
+RECORD_MAGIC = b'PACREC'
+RECORD_VERSION = 3
+READABLE_VERSIONS = (1, 2, 3)
+
+# Moves between two keyframes of a recorded game
+KEYFRAME_INTERVAL = 100
+ACTIONS = ['North', 'South', 'East', 'West', 'Stop']
+ACTION_CODES = dict([(action, i) for i, action in enumerate(ACTIONS)])
+
+
+def encodeVarint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decodeVarint(data, offset):
+    "Returns the varint at data[offset:] and the offset just past it."
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def unzigzag(value):
+    return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+
+class GameRecorder:
+    """
+    Appends games to a record file.  Call beginGame before Game.run (which
+    feeds recordMove through Game.recorder) and endGame after it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        isNew = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.knownLayouts = set()
+        if not isNew:
+            self.knownLayouts, end = scanRecordFile(path)
+            if end < os.path.getsize(path):
+                # Drop a game left unfinished by a crash so appends stay readable
+                with open(path, 'r+b') as f:
+                    f.truncate(end)
+        self.version = RECORD_VERSION
+        if not isNew:
+            with open(path, 'rb') as f:
+                self.version = f.read(len(RECORD_MAGIC) + 1)[-1]
+        self.file = open(path, 'ab')
+        if isNew:
+            self.file.write(RECORD_MAGIC + bytes([RECORD_VERSION]))
+        self.buffer = bytearray()
+        self.numMoves = 0
+        self.keyframes = []
+
+    def writeChunk(self, tag, payload):
+        chunk = bytearray(tag)
+        encodeVarint(len(payload), chunk)
+        chunk.extend(payload)
+        self.file.write(chunk)
+
+    def beginGame(self, layout, agents, seed=None, **metadata):
+        if layout.contentHash not in self.knownLayouts:
+            self.writeChunk(b'L', '\n'.join(layout.layoutText).encode())
+            self.knownLayouts.add(layout.contentHash)
+        header = dict(metadata)
+        header.update({'layoutHash': layout.contentHash, 'seed': seed,
+                       'agents': [type(agent).__name__ for agent in agents]})
+        self.writeChunk(b'G', json.dumps(header, sort_keys=True).encode())
+        self.buffer = bytearray()
+        self.numMoves = 0
+        self.keyframes = []
+
+    def recordMove(self, agentIndex, action, state):
+        """
+        Records a move; state is the game state right after it, kept as a
+        keyframe every KEYFRAME_INTERVAL moves.
+        """
+        encodeVarint(1 + agentIndex * 5 + ACTION_CODES[action], self.buffer)
+        self.numMoves += 1
+        if self.version >= 3 and self.numMoves % KEYFRAME_INTERVAL == 0:
+            self.keyframes.append((self.numMoves, snapshotState(state)))
+        if len(self.buffer) >= 4096:
+            self.file.write(self.buffer)
+            self.buffer = bytearray()
+
+    def endGame(self, state):
+        buffer = self.buffer
+        buffer.append(0)
+        encodeVarint(zigzag(int(state.getScore())), buffer)
+        buffer.append(1 if state.isWin() else 0)
+        if self.version >= 2:
+            encodeVarint(len(self.keyframes), buffer)
+            for numMoves, snapshot in self.keyframes:
+                encodeVarint(numMoves, buffer)
+                encodeVarint(len(snapshot), buffer)
+                buffer.extend(snapshot)
+            self.keyframes = []
+        self.file.write(buffer)
+        self.buffer = bytearray()
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class RecordedGame:
+    """
+    One game read back: its header dict, layout text, list of
+    (agentIndex, action) moves, final score and win flag.
+    """
+
+    def __init__(self, header, layoutText, actions, score, win):
+        self.header = header
+        self.layoutText = layoutText
+        self.actions = actions
+        self.score = score
+        self.win = win
+
+    def getLayout(self):
+        import layout
+        return layout.Layout(self.layoutText)
+
+
+class RecordReader:
+    "Reads a record file sequentially through a buffered file object."
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        magic = self.file.read(len(RECORD_MAGIC) + 1)
+        if magic[:len(RECORD_MAGIC)] != RECORD_MAGIC or magic[-1] not in READABLE_VERSIONS:
+            self.file.close()
+            raise Exception('%s is not a readable game record' % path)
+        self.version = magic[-1]
+        self.size = os.fstat(self.file.fileno()).st_size
+
+    def readByte(self):
+        byte = self.file.read(1)
+        if not byte:
+            raise EOFError()
+        return byte[0]
+
+    def readVarint(self):
+        value = 0
+        shift = 0
+        while True:
+            byte = self.readByte()
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def readChunk(self):
+        "Returns (tag, payload), or (None, None) at the end of the file."
+        tag = self.file.read(1)
+        if not tag:
+            return None, None
+        length = self.readVarint()
+        payload = self.file.read(length)
+        if len(payload) < length:
+            raise EOFError()
+        return tag, payload
+
+    def readMoves(self):
+        """
+        Reads a game's moves and footer and returns (actions, score, win,
+        keyframes), where keyframes lists (numMoves, offset, length) for
+        each stored snapshot; the snapshots themselves are skipped, and so
+        are the pickled ones of version 2 files, which are not listed.
+        """
+        actions = []
+        while True:
+            code = self.readVarint()
+            if code == 0:
+                break
+            agentIndex, actionCode = divmod(code - 1, 5)
+            actions.append((agentIndex, ACTIONS[actionCode]))
+        score = unzigzag(self.readVarint())
+        win = self.readByte() == 1
+        keyframes = []
+        if self.version >= 2:
+            for i in range(self.readVarint()):
+                numMoves = self.readVarint()
+                length = self.readVarint()
+                offset = self.file.tell()
+                if offset + length > self.size:
+                    raise EOFError()
+                self.file.seek(length, 1)
+                if self.version >= 3:
+                    keyframes.append((numMoves, offset, length))
+        return actions, score, win, keyframes
+
+    def close(self):
+        self.file.close()
+
+
+def readGames(path):
+    """
+    Yields the RecordedGame objects in a record file one at a time, holding
+    only the current game's moves in memory.
+    """
+    reader = RecordReader(path)
+    layouts = {}
+    try:
+        while True:
+            tag, payload = reader.readChunk()
+            if tag is None:
+                return
+            if tag == b'L':
+                text = payload.decode().split('\n')
+                import layout
+                layouts[layout.hashLayoutText(text)] = text
+            elif tag == b'G':
+                header = json.loads(payload.decode())
+                actions, score, win, keyframes = reader.readMoves()
+                yield RecordedGame(header, layouts.get(header['layoutHash']), actions, score, win)
+            else:
+                raise Exception('Unknown chunk %r in %s' % (tag, path))
+    except EOFError:
+        # The last game was not finished
+        return
+    finally:
+        reader.close()
+
+
+def scanRecordFile(path):
+    """
+    Returns the set of layout hashes stored in a record file and the offset
+    just past its last complete chunk or game.
+    """
+    import layout
+    reader = RecordReader(path)
+    hashes = set()
+    end = reader.file.tell()
+    try:
+        while True:
+            tag, payload = reader.readChunk()
+            if tag is None:
+                break
+            if tag == b'L':
+                hashes.add(layout.hashLayoutText(payload.decode().split('\n')))
+            elif tag == b'G':
+                reader.readMoves()
+            end = reader.file.tell()
+    except EOFError:
+        pass
+    finally:
+        reader.close()
+    return hashes, end
+
+
+def encodeCoordinate(value, out):
+    "Appends a position coordinate, a multiple of 0.5 (scared ghosts move at half speed)."
+    half = int(value * 2)
+    if half != value * 2 or half < 0:
+        raise Exception('Cannot record the coordinate %r' % (value,))
+    encodeVarint(half, out)
+
+
+def decodeCoordinate(data, offset):
+    half, offset = decodeVarint(data, offset)
+    return (half // 2 if half % 2 == 0 else half / 2.0), offset
+
+
+def snapshotState(state):
+    """
+    Serializes what a GameState needs beyond its layout, as varints: per
+    agent its start and current positions and directions, isPacman, scared
+    timer and the contest counters numCarrying and numReturned; then the
+    remaining food as its bitmask, the capsules, the score (zigzag), the
+    eaten flags as a bitmask and a byte holding the win and lose flags.
+    """
+    data = state.data
+    out = bytearray()
+    encodeVarint(len(data.agentStates), out)
+    for agent in data.agentStates:
+        for configuration in (agent.start, agent.configuration):
+            encodeCoordinate(configuration.pos[0], out)
+            encodeCoordinate(configuration.pos[1], out)
+            encodeVarint(ACTION_CODES[configuration.direction], out)
+        encodeVarint(1 if agent.isPacman else 0, out)
+        for value in (agent.scaredTimer, agent.numCarrying, agent.numReturned):
+            encodeVarint(value, out)
+    encodeVarint(data._foodKey, out)
+    encodeVarint(len(data.capsules), out)
+    for x, y in data.capsules:
+        encodeVarint(x, out)
+        encodeVarint(y, out)
+    encodeVarint(zigzag(int(data.score)), out)
+    encodeVarint(sum([1 << i for i, eaten in enumerate(data._eaten) if eaten]), out)
+    out.append((1 if data._win else 0) | (2 if data._lose else 0))
+    return bytes(out)
+
+
+def restoreState(layout, snapshot):
+    "Rebuilds the GameState serialized by snapshotState on layout."
+    from game import AgentState, Configuration, gridFromBitmask
+    from pacman import GameState
+    numAgents, offset = decodeVarint(snapshot, 0)
+    state = GameState()
+    state.initialize(layout, numAgents - 1)
+    data = state.data
+    data.agentStates = []
+    for i in range(numAgents):
+        configurations = []
+        for j in range(2):
+            x, offset = decodeCoordinate(snapshot, offset)
+            y, offset = decodeCoordinate(snapshot, offset)
+            direction, offset = decodeVarint(snapshot, offset)
+            configurations.append(Configuration((x, y), ACTIONS[direction]))
+        isPacman, offset = decodeVarint(snapshot, offset)
+        agent = AgentState(configurations[0], isPacman == 1)
+        agent.configuration = configurations[1]
+        agent.scaredTimer, offset = decodeVarint(snapshot, offset)
+        agent.numCarrying, offset = decodeVarint(snapshot, offset)
+        agent.numReturned, offset = decodeVarint(snapshot, offset)
+        data.agentStates.append(agent)
+    foodKey, offset = decodeVarint(snapshot, offset)
+    data.food = gridFromBitmask(layout.width, layout.height, foodKey)
+    data._foodKey = foodKey
+    numCapsules, offset = decodeVarint(snapshot, offset)
+    data.capsules = []
+    for i in range(numCapsules):
+        x, offset = decodeVarint(snapshot, offset)
+        y, offset = decodeVarint(snapshot, offset)
+        data.capsules.append((x, y))
+    score, offset = decodeVarint(snapshot, offset)
+    data.score = unzigzag(score)
+    eaten, offset = decodeVarint(snapshot, offset)
+    data._eaten = [eaten >> i & 1 == 1 for i in range(numAgents)]
+    flags = snapshot[offset]
+    data._win = flags & 1 == 1
+    data._lose = flags & 2 == 2
+    return state
+
+
+class RecordIndex:
+    """
+    Where every game of a record file starts and where its keyframes are,
+    found by one pass over the file that skips the snapshots themselves.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.games = []
+        self.layouts = {}
+        import layout
+        reader = RecordReader(path)
+        try:
+            while True:
+                tag, payload = reader.readChunk()
+                if tag is None:
+                    break
+                if tag == b'L':
+                    text = payload.decode().split('\n')
+                    self.layouts[layout.hashLayoutText(text)] = text
+                elif tag == b'G':
+                    header = json.loads(payload.decode())
+                    actions, score, win, keyframes = reader.readMoves()
+                    self.games.append((header, actions, score, win, keyframes))
+        except EOFError:
+            pass
+        finally:
+            reader.close()
+        self.layoutObjects = {}
+
+    def __len__(self):
+        return len(self.games)
+
+    def getGame(self, gameIndex):
+        header, actions, score, win, keyframes = self.games[gameIndex]
+        return RecordedGame(header, self.layouts.get(header['layoutHash']), actions, score, win)
+
+    def getLayout(self, gameIndex):
+        import layout
+        layoutHash = self.games[gameIndex][0]['layoutHash']
+        if layoutHash not in self.layoutObjects:
+            self.layoutObjects[layoutHash] = layout.Layout(self.layouts[layoutHash])
+        return self.layoutObjects[layoutHash]
+
+    def getState(self, gameIndex, numMoves):
+        """
+        Returns the state of game gameIndex after its first numMoves moves,
+        restored from the last keyframe at or before that move and brought
+        forward by simulation.
+        """
+        header, actions, score, win, keyframes = self.games[gameIndex]
+        if not 0 <= numMoves <= len(actions):
+            raise Exception('Game %d has %d moves, not %d' % (gameIndex, len(actions), numMoves))
+        lay = self.getLayout(gameIndex)
+        usable = [keyframe for keyframe in keyframes if keyframe[0] <= numMoves]
+        start = 0
+        if usable:
+            start, offset, length = usable[-1]
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                state = restoreState(lay, f.read(length))
+        else:
+            from pacman import GameState
+            state = GameState()
+            state.initialize(lay, len(header['agents']) - 1)
+        for agentIndex, action in actions[start:numMoves]:
+            state = state.getNextState(agentIndex, action)
+        return state
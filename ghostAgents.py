@@ -21,6 +21,8 @@ import util
 
 
 class GhostAgent(Agent):
+    mutatesState = False
+
     def __init__(self, index):
         self.index = index
 
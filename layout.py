@@ -14,12 +14,55 @@
 
 from util import manhattanDistance
 from game import Grid
+from game import gridFromBitmask
+from array import array
+import hashlib
 import os
 import random
-from functools import reduce
+import struct
 
+# Visibility matrices, keyed by Layout.contentHash
 VISIBILITY_MATRIX_CACHE = {}
 
+# Layouts already loaded in this process, keyed by the hash of their text
+LAYOUT_REGISTRY = {}
+
+# Compiled layouts live next to their source, like __pycache__
+COMPILED_LAYOUT_DIR = '__layoutcache__'
+COMPILED_LAYOUT_MAGIC = b'PACLAY'
+COMPILED_LAYOUT_VERSION = 1
+
+# All-pairs distance tables are only precomputed up to this many free cells;
+# bigger boards compute distance rows on demand
+MAX_DISTANCE_TABLE_CELLS = 2000
+
+# Unsigned array typecodes for cell indices and distances, smallest first
+CELL_TYPECODES = ['H', 'I', 'L', 'Q']
+
+# Bits of the per-cell move table, one per open neighbour
+MOVE_BITS = [((0, 1), 1), ((0, -1), 2), ((1, 0), 4), ((-1, 0), 8)]
+
+
+def getUnreachable(typecode):
+    "The largest value of an array of typecode, which stands for no path."
+    return (1 << (8 * array(typecode).itemsize)) - 1
+
+
+def getCellTypecode(numCells):
+    """
+    The smallest typecode whose arrays hold every cell index and maze
+    distance of a board with numCells open cells (all below numCells) and
+    keep getUnreachable free.
+    """
+    for typecode in CELL_TYPECODES:
+        if numCells <= getUnreachable(typecode):
+            return typecode
+    raise Exception('No array typecode holds %d cells' % numCells)
+
+
+def hashLayoutText(layoutText):
+    return hashlib.sha1('\n'.join(layoutText).encode('utf-8')).hexdigest()
+
 
 class Layout:
     """
@@ -37,67 +80,213 @@ class Layout:
         self.processLayoutText(layoutText)
         self.layoutText = layoutText
         self.totalFood = len(self.food.asList())
+        self.contentHash = hashLayoutText(layoutText)
+        self.tables = None
+        # The layout this one was copied from before its tables were built
+        self.tableSource = None
         # self.initializeVisibilityMatrix()
 
     def getNumGhosts(self):
         return self.numGhosts
 
     def initializeVisibilityMatrix(self):
-        global VISIBILITY_MATRIX_CACHE
-        if reduce(str.__add__, self.layoutText) not in VISIBILITY_MATRIX_CACHE:
+        """
+        Precomputes what Pacman can see from every cell looking in every
+        direction: the half-cell positions along his line of sight up to the
+        first wall.  A line of sight never leaves its row (East/West) or
+        column (North/South), so each set is stored as a bitmask over that
+        line, bit i standing for coordinate i / 2.  Masks are built by one
+        sweep per line: a cell sees the half-cell in front of it, plus the
+        next cell and everything that cell sees when it is open.
+
+        The matrix is shared by every layout with the same text.
+        """
+        if self.contentHash not in VISIBILITY_MATRIX_CACHE:
             from game import Directions
-            vecs = [(-0.5, 0), (0.5, 0), (0, -0.5), (0, 0.5)]
-            dirs = [Directions.NORTH, Directions.SOUTH,
-                    Directions.WEST, Directions.EAST]
-            vis = Grid(self.width, self.height, {Directions.NORTH: set(), Directions.SOUTH: set(
-            ), Directions.EAST: set(), Directions.WEST: set(), Directions.STOP: set()})
-            for x in range(self.width):
-                for y in range(self.height):
-                    if self.walls[x][y] == False:
-                        for vec, direction in zip(vecs, dirs):
-                            dx, dy = vec
-                            nextx, nexty = x + dx, y + dy
-                            while (nextx + nexty) != int(nextx) + int(nexty) or not self.walls[int(nextx)][int(nexty)]:
-                                vis[x][y][direction].add((nextx, nexty))
-                                nextx, nexty = x + dx, y + dy
-            self.visibility = vis
-            VISIBILITY_MATRIX_CACHE[reduce(str.__add__, self.layoutText)] = vis
-        else:
-            self.visibility = VISIBILITY_MATRIX_CACHE[reduce(
-                str.__add__, self.layoutText)]
+            width, height, walls = self.width, self.height, self.walls
+            vis = {Directions.NORTH: [0] * (width * height), Directions.SOUTH: [0] * (width * height),
+                   Directions.EAST: [0] * (width * height), Directions.WEST: [0] * (width * height)}
+            for x in range(width):
+                north, south = vis[Directions.NORTH], vis[Directions.SOUTH]
+                for y in range(height - 1, -1, -1):
+                    mask = 1 << (2 * y + 1)
+                    if y + 1 < height and not walls[x][y + 1]:
+                        mask |= 1 << (2 * y + 2) | north[x * height + y + 1]
+                    north[x * height + y] = mask
+                for y in range(height):
+                    mask = 1 << (2 * y - 1) if y > 0 else 0
+                    if y > 0 and not walls[x][y - 1]:
+                        mask |= 1 << (2 * y - 2) | south[x * height + y - 1]
+                    south[x * height + y] = mask
+            east, west = vis[Directions.EAST], vis[Directions.WEST]
+            for y in range(height):
+                for x in range(width - 1, -1, -1):
+                    mask = 1 << (2 * x + 1)
+                    if x + 1 < width and not walls[x + 1][y]:
+                        mask |= 1 << (2 * x + 2) | east[(x + 1) * height + y]
+                    east[x * height + y] = mask
+                for x in range(width):
+                    mask = 1 << (2 * x - 1) if x > 0 else 0
+                    if x > 0 and not walls[x - 1][y]:
+                        mask |= 1 << (2 * x - 2) | west[(x - 1) * height + y]
+                    west[x * height + y] = mask
+            VISIBILITY_MATRIX_CACHE[self.contentHash] = vis
+        self.visibility = VISIBILITY_MATRIX_CACHE[self.contentHash]
 
     def isWall(self, pos):
         x, col = pos
         return self.walls[x][col]
 
-    def getRandomLegalPosition(self):
-        x = random.choice(list(range(self.width)))
-        y = random.choice(list(range(self.height)))
-        while self.isWall((x, y)):
-            x = random.choice(list(range(self.width)))
-            y = random.choice(list(range(self.height)))
-        return (x, y)
+    def getRandomLegalPosition(self, rand=random):
+        """
+        Returns an open cell chosen uniformly at random.  rand may be a
+        random.Random instance for reproducible sampling.
+        """
+        freeCells = self.getTables().freeCells
+        return freeCells[rand.randrange(len(freeCells))]
 
-    def getRandomCorner(self):
-        poses = [(1, 1), (1, self.height - 2), (self.width - 2, 1),
-                 (self.width - 2, self.height - 2)]
-        return random.choice(poses)
+    def getRandomCorner(self, rand=random):
+        """
+        Returns one of the four corners (the open cells nearest to the
+        corners of the board) chosen uniformly at random.
+        """
+        corners = self.getTables().getCorners()
+        return corners[rand.randrange(len(corners))]
 
     def getFurthestCorner(self, pacPos):
-        poses = [(1, 1), (1, self.height - 2), (self.width - 2, 1),
-                 (self.width - 2, self.height - 2)]
-        dist, pos = max([(manhattanDistance(p, pacPos), p) for p in poses])
-        return pos
+        """
+        Returns the corner furthest from pacPos by maze distance, falling
+        back to Manhattan distance when pacPos is not an open cell.
+        """
+        tables = self.getTables()
+        corner = tables.getFurthestCorner(pacPos)
+        if corner is None:
+            dist, corner = max([(manhattanDistance(p, pacPos), p) for p in tables.getCorners()])
+        return corner
 
     def isVisibleFrom(self, ghostPos, pacPos, pacDirection):
+        """
+        Returns whether a ghost at ghostPos is in Pacman's line of sight when
+        he stands at pacPos facing pacDirection.  Pacman sees nothing while
+        stopped.
+        """
+        if not hasattr(self, 'visibility'):
+            self.initializeVisibilityMatrix()
+        masks = self.visibility.get(pacDirection)
+        if masks is None:
+            return False
         row, col = [int(x) for x in pacPos]
-        return ghostPos in self.visibility[row][col][pacDirection]
+        gx, gy = ghostPos
+        if pacDirection in ('North', 'South'):
+            if gx != row:
+                return False
+            coordinate = 2 * gy
+        else:
+            if gy != col:
+                return False
+            coordinate = 2 * gx
+        if coordinate != int(coordinate) or coordinate < 0:
+            return False
+        return masks[row * self.height + col] >> int(coordinate) & 1 == 1
+
+    def getTables(self):
+        """
+        Returns the LayoutTables derived from the walls, building them the
+        first time they are needed.  A copy asks the layout it was copied
+        from, so the original and all its copies share one set of tables.
+        """
+        if self.tables is None:
+            if self.tableSource is not None:
+                self.tables = self.tableSource.getTables()
+                self.tableSource = None
+            else:
+                self.tables = LayoutTables(self.walls)
+        return self.tables
+
+    def getLegalNeighbors(self, pos):
+        """
+        Returns the open cells next to pos, read from the move table.
+        """
+        return self.getTables().getNeighbors(pos)
+
+    def getJunctionGraph(self):
+        """
+        Returns the corridor-contracted JunctionGraph of this layout, shared
+        by every copy of it.
+        """
+        tables = self.getTables()
+        if tables.junctionGraph is None:
+            tables.junctionGraph = JunctionGraph(tables, self.food, self.capsules)
+        return tables.junctionGraph
+
+    def getStructure(self):
+        """
+        Returns the MazeStructure (dead ends, tunnels, articulation points)
+        of this layout, shared by every copy of it.
+        """
+        tables = self.getTables()
+        if tables.structure is None:
+            tables.structure = MazeStructure(tables)
+        return tables.structure
+
+    def getSymmetries(self, includeIdentity=False):
+        """
+        Returns the mirror Symmetry objects (horizontal, vertical and their
+        composition, the half turn) that map the walls onto themselves,
+        preceded by the identity if includeIdentity is set.
+        """
+        tables = self.getTables()
+        if tables.symmetries is None:
+            tables.symmetries = [Symmetry(self.width, self.height, False, False)]
+            for flipX, flipY in [(True, False), (False, True), (True, True)]:
+                symmetry = Symmetry(self.width, self.height, flipX, flipY)
+                if all([self.walls[x][y] == self.walls[symmetry.mapX(x)][symmetry.mapY(y)]
+                        for x in range(self.width) for y in range(self.height)]):
+                    tables.symmetries.append(symmetry)
+        if includeIdentity:
+            return tables.symmetries
+        return tables.symmetries[1:]
+
+    def getNearestInGrid(self, pos, grid):
+        """
+        Returns (distance, cell) for the cell of grid (a Grid of booleans such
+        as the food) nearest to pos by maze distance, or (None, None).
+        """
+        return self.getTables().findNearestInGrid(pos, grid)
+
+    def getMazeDistance(self, pos1, pos2):
+        """
+        Returns the maze distance between two open cells, or None if either
+        is a wall or they are not connected.
+        """
+        return self.getTables().getDistance(pos1, pos2)
 
     def __str__(self):
         return "\n".join(self.layoutText)
 
     def deepCopy(self):
-        return Layout(self.layoutText[:])
+        """
+        Copies the board state without re-parsing the layout text.  The
+        derived tables are read-only and shared with the copy; if they have
+        not been built yet, the copy builds them through this layout the
+        first time it needs them.
+        """
+        layout = Layout.__new__(Layout)
+        layout.width = self.width
+        layout.height = self.height
+        layout.walls = self.walls.copy()
+        layout.food = self.food.copy()
+        layout.capsules = self.capsules[:]
+        layout.agentPositions = self.agentPositions[:]
+        layout.numGhosts = self.numGhosts
+        layout.layoutText = self.layoutText[:]
+        layout.totalFood = self.totalFood
+        layout.contentHash = self.contentHash
+        layout.tables = self.tables
+        layout.tableSource = self if self.tables is None else None
+        if hasattr(self, 'visibility'):
+            layout.visibility = self.visibility
+        return layout
 
     def processLayoutText(self, layoutText):
         """
@@ -137,28 +326,796 @@ class Layout:
             self.numGhosts += 1
 
 
-def getLayout(name, back=2):
-    if name.endswith('.lay'):
-        layout = tryToLoad('layouts/' + name)
-        if layout == None:
-            layout = tryToLoad(name)
+class LayoutTables:
+    """
+    Static lookup tables derived from a layout's walls:
+
+      freeCells  - the open cells, in x-major order
+      cellIndex  - maps an open cell to its index in freeCells
+      moves      - per cell (index x * height + y), a bitmask of the open
+                   neighbours (see MOVE_BITS)
+      distances  - all-pairs maze distances between open cells, row major
+                   over cell indices, unreachable when not connected; None
+                   for boards too large to tabulate, in which case rows are
+                   computed by BFS on demand and kept in distanceRows
+
+    Index and distance arrays use typecode, the smallest that fits the
+    number of open cells; unreachable is its largest value.
+    """
+
+    def __init__(self, walls, moves=None, distances=None):
+        self.width = walls.width
+        self.height = walls.height
+        self.freeCells = walls.asList(False)
+        self.typecode = getCellTypecode(len(self.freeCells))
+        self.unreachable = getUnreachable(self.typecode)
+        self.cellIndex = dict([(cell, i) for i, cell in enumerate(self.freeCells)])
+        self.moves = moves if moves is not None else self.buildMoves(walls)
+        self.neighbors = {}
+        for x, y in self.freeCells:
+            mask = self.moves[x * self.height + y]
+            self.neighbors[(x, y)] = [(x + dx, y + dy) for (dx, dy), bit in MOVE_BITS if mask & bit]
+        self.distanceRows = {}
+        self.junctionGraph = None
+        self.structure = None
+        self.corners = None
+        self.furthestCorners = None
+        self.symmetries = None
+        self.bfsOrders = {}
+        if distances is None and len(self.freeCells) <= MAX_DISTANCE_TABLE_CELLS:
+            distances = self.buildDistances()
+        self.distances = distances
+
+    def buildMoves(self, walls):
+        moves = bytearray(self.width * self.height)
+        for x, y in self.freeCells:
+            mask = 0
+            for (dx, dy), bit in MOVE_BITS:
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < self.width and 0 <= ny < self.height and not walls[nx][ny]:
+                    mask |= bit
+            moves[x * self.height + y] = mask
+        return moves
+
+    def bfs(self, source):
+        "Returns a list of distances from source indexed like freeCells."
+        return self.bfsFrom([source])
+
+    def bfsFrom(self, sources):
+        "Returns a list of distances to the nearest of sources, indexed like freeCells."
+        unreachable = self.unreachable
+        row = [unreachable] * len(self.freeCells)
+        for source in sources:
+            row[self.cellIndex[source]] = 0
+        frontier = list(sources)
+        distance = 0
+        while frontier:
+            distance += 1
+            nextFrontier = []
+            for cell in frontier:
+                for neighbor in self.neighbors[cell]:
+                    index = self.cellIndex[neighbor]
+                    if row[index] == unreachable:
+                        row[index] = distance
+                        nextFrontier.append(neighbor)
+            frontier = nextFrontier
+        return row
+
+    def getBfsOrder(self, source):
+        """
+        Returns (order, distances): the indices of every cell reachable from
+        source, nearest first, and their maze distances.  Built on first use
+        per source.
+        """
+        if source not in self.bfsOrders:
+            order = array(self.typecode)
+            distances = array(self.typecode)
+            row = self.bfs(source)
+            for distance, index in sorted([(d, i) for i, d in enumerate(row) if d != self.unreachable]):
+                order.append(index)
+                distances.append(distance)
+            self.bfsOrders[source] = (order, distances)
+        return self.bfsOrders[source]
+
+    def findNearestInGrid(self, source, grid):
+        """
+        Returns (distance, cell) for the cell nearest to source by maze
+        distance that is set in grid, or (None, None) if there is none.
+        """
+        if source not in self.cellIndex:
+            return None, None
+        order, distances = self.getBfsOrder(source)
+        freeCells = self.freeCells
+        data = grid.data
+        for i in range(len(order)):
+            x, y = freeCells[order[i]]
+            if data[x][y]:
+                return distances[i], (x, y)
+        return None, None
+
+    def buildDistances(self):
+        distances = array(self.typecode)
+        for cell in self.freeCells:
+            distances.extend(self.bfs(cell))
+        return distances
+
+    def getNeighbors(self, pos):
+        return self.neighbors.get(pos, [])
+
+    def getCorners(self):
+        """
+        Returns the open cells nearest to the four corners of the board,
+        building them and the furthest corner of every cell on first use.
+        """
+        if self.corners is None:
+            corners = []
+            for corner in [(1, 1), (1, self.height - 2), (self.width - 2, 1),
+                           (self.width - 2, self.height - 2)]:
+                nearest = min(self.freeCells, key=lambda cell: (manhattanDistance(cell, corner), cell))
+                if nearest not in corners:
+                    corners.append(nearest)
+            rows = [self.bfs(corner) for corner in corners]
+            self.furthestCorners = [
+                max([(row[i] if row[i] != self.unreachable else -1, corner)
+                     for row, corner in zip(rows, corners)])[1]
+                for i in range(len(self.freeCells))]
+            self.corners = corners
+        return self.corners
+
+    def getFurthestCorner(self, pos):
+        "Returns the corner furthest from pos by maze distance, or None if pos is not open."
+        self.getCorners()
+        i = self.cellIndex.get(pos)
+        if i is None:
+            return None
+        return self.furthestCorners[i]
+
+    def getDistance(self, pos1, pos2):
+        i = self.cellIndex.get(pos1)
+        j = self.cellIndex.get(pos2)
+        if i is None or j is None:
+            return None
+        if self.distances is not None:
+            distance = self.distances[i * len(self.freeCells) + j]
+        else:
+            if pos1 not in self.distanceRows:
+                self.distanceRows[pos1] = self.bfs(pos1)
+            distance = self.distanceRows[pos1][j]
+        if distance == self.unreachable:
+            return None
+        return distance
+
+
+class Corridor:
+    """
+    A directed edge of a JunctionGraph: the walk from node start to node end.
+    cells lists the cells entered along the way (end included, start not)
+    and actions the moves that enter them; food and capsules are the
+    layout's initial pellets and capsules on those cells.
+    """
+
+    def __init__(self, start, cells, actions, food, capsules):
+        self.start = start
+        self.end = cells[-1]
+        self.cells = cells
+        self.actions = actions
+        self.length = len(cells)
+        self.food = [cell for cell in cells if food[cell[0]][cell[1]]]
+        self.capsules = [cell for cell in cells if cell in capsules]
+
+    def countFood(self, foodGrid):
+        "Returns how many of the corridor's cells still hold food in foodGrid."
+        return len([1 for x, y in self.cells if foodGrid[x][y]])
+
+
+class JunctionGraph:
+    """
+    The maze with its corridors contracted.  Nodes are the open cells that do
+    not have exactly two open neighbours (junctions and dead ends).  The
+    chain of two-neighbour cells between two nodes becomes a Corridor
+    weighted by its length; each node has one outgoing corridor per open
+    direction.  A corridor that loops back to where it started without
+    meeting a node ends at its start cell.
+    """
+
+    def __init__(self, tables, food, capsules):
+        from game import Actions
+        self.vectorToDirection = Actions.vectorToDirection
+        self.directionToVector = Actions.directionToVector
+        self.neighbors = tables.neighbors
+        self.food = food
+        self.capsules = capsules
+        self.nodes = [cell for cell in tables.freeCells if len(self.neighbors[cell]) != 2]
+        self.nodeSet = set(self.nodes)
+        self.paths = {}
+        self.corridors = {}
+        for node in self.nodes:
+            self.corridors[node] = [self.walk(node, neighbor) for neighbor in self.neighbors[node]]
+
+    def isNode(self, cell):
+        return cell in self.nodeSet
+
+    def getCorridors(self, node):
+        "Returns the corridors leaving node."
+        return self.corridors.get(node, [])
+
+    def walk(self, start, first):
+        cells = [first]
+        previous, cell = start, first
+        while cell not in self.nodeSet and cell != start:
+            following = [n for n in self.neighbors[cell] if n != previous]
+            previous, cell = cell, following[0]
+            cells.append(cell)
+        actions = []
+        previous = start
+        for cell in cells:
+            actions.append(self.vectorToDirection((cell[0] - previous[0], cell[1] - previous[1])))
+            previous = cell
+        return Corridor(start, cells, actions, self.food, self.capsules)
+
+    def getPath(self, pos, action):
+        """
+        Returns the Corridor followed by leaving pos with action and then
+        going along the corridor to the next node, or None if action runs
+        into a wall.  pos need not be a node.
+        """
+        key = (pos, action)
+        if key not in self.paths:
+            dx, dy = self.directionToVector(action)
+            first = (int(pos[0] + dx), int(pos[1] + dy))
+            if first not in self.neighbors.get(pos, []):
+                self.paths[key] = None
+            else:
+                self.paths[key] = self.walk(pos, first)
+        return self.paths[key]
+
+
+class Symmetry:
+    """
+    A mirror of the board: flipX maps column x to width - 1 - x (swapping
+    East and West), flipY maps row y to height - 1 - y (swapping North and
+    South).  Every Symmetry is its own inverse, so the same object maps
+    positions and actions to the mirrored board and back.
+    """
+
+    def __init__(self, width, height, flipX, flipY):
+        self.width = width
+        self.height = height
+        self.flipX = flipX
+        self.flipY = flipY
+        self.name = {(False, False): 'identity', (True, False): 'horizontal',
+                     (False, True): 'vertical', (True, True): 'halfTurn'}[(flipX, flipY)]
+        self.directions = {}
+        for direction in ['North', 'South', 'East', 'West', 'Stop']:
+            mapped = direction
+            if flipX:
+                mapped = {'East': 'West', 'West': 'East'}.get(mapped, mapped)
+            if flipY:
+                mapped = {'North': 'South', 'South': 'North'}.get(mapped, mapped)
+            self.directions[direction] = mapped
+
+    def mapX(self, x):
+        return self.width - 1 - x if self.flipX else x
+
+    def mapY(self, y):
+        return self.height - 1 - y if self.flipY else y
+
+    def mapPosition(self, pos):
+        if pos is None:
+            return None
+        return (self.mapX(pos[0]), self.mapY(pos[1]))
+
+    def mapDirection(self, direction):
+        return self.directions[direction]
+
+    def mapFoodKey(self, foodKey):
+        """
+        Mirrors a Grid.asBitmask() key (bit x * height + y).  Reversing the
+        whole bit string is the half turn; reordering whole columns is the
+        horizontal mirror; the vertical one is their composition.
+        """
+        if not (self.flipX or self.flipY):
+            return foodKey
+        height = self.height
+        if self.flipY:
+            size = self.width * height
+            foodKey = int(format(foodKey, '0%db' % size)[::-1], 2)
+            if self.flipX:
+                return foodKey
+        columnMask = (1 << height) - 1
+        mirrored = 0
+        for x in range(self.width):
+            mirrored |= ((foodKey >> (x * height)) & columnMask) << ((self.width - 1 - x) * height)
+        return mirrored
+
+    def __repr__(self):
+        return 'Symmetry(%s)' % self.name
+
+
+class MazeStructure:
+    """
+    Per-cell structural features of a maze, computed once per layout.  All
+    lookups take a cell and return None for walls and off-grid positions
+    (such as a ghost between two cells).
+
+      deadEndDepth      - how far a cell is inside a dead-end pocket: 0 on
+                          any cycle of the maze, growing by one per step
+                          into a pocket.  A maze without cycles is measured
+                          from its centre.
+      junctionDistance  - maze distance to the nearest cell with three or
+                          more open neighbours (LayoutTables.unreachable if
+                          there is none)
+      tunnelIds         - the cells that are not junctions grouped into
+                          connected tunnels; junctions get -1
+      tunnelExits       - per tunnel id, the junctions it opens onto.  A
+                          tunnel with a single exit is a trap.
+      articulationPoints - cells whose removal disconnects the maze
+    """
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.cellIndex = tables.cellIndex
+        cells = tables.freeCells
+        neighbors = tables.neighbors
+        degree = [len(neighbors[cell]) for cell in cells]
+
+        # Peel dead ends leaf by leaf; what remains lies on cycles
+        remaining = list(degree)
+        peeled = [False] * len(cells)
+        layer = [i for i in range(len(cells)) if remaining[i] <= 1]
+        lastLayer = layer
+        while layer:
+            for i in layer:
+                peeled[i] = True
+            nextLayer = []
+            for i in layer:
+                for neighbor in neighbors[cells[i]]:
+                    j = self.cellIndex[neighbor]
+                    if not peeled[j]:
+                        remaining[j] -= 1
+                        if remaining[j] == 1:
+                            nextLayer.append(j)
+            if nextLayer:
+                lastLayer = nextLayer
+            layer = nextLayer
+        core = [cells[i] for i in range(len(cells)) if not peeled[i]]
+        if not core:
+            core = [cells[i] for i in lastLayer]
+        self.deadEndDepth = tables.bfsFrom(core) if cells else []
+
+        junctions = [cells[i] for i in range(len(cells)) if degree[i] >= 3]
+        self.junctionDistance = tables.bfsFrom(junctions) if cells else []
+
+        self.tunnelIds = [-1] * len(cells)
+        self.tunnelExits = []
+        for i, cell in enumerate(cells):
+            if degree[i] >= 3 or self.tunnelIds[i] != -1:
+                continue
+            tunnelId = len(self.tunnelExits)
+            exits = []
+            self.tunnelIds[i] = tunnelId
+            stack = [cell]
+            while stack:
+                for neighbor in neighbors[stack.pop()]:
+                    j = self.cellIndex[neighbor]
+                    if degree[j] >= 3:
+                        if neighbor not in exits:
+                            exits.append(neighbor)
+                    elif self.tunnelIds[j] == -1:
+                        self.tunnelIds[j] = tunnelId
+                        stack.append(neighbor)
+            self.tunnelExits.append(exits)
+
+        self.articulationPoints = self.findArticulationPoints(cells, neighbors)
+
+    def findArticulationPoints(self, cells, neighbors):
+        "Iterative Tarjan: a cell is a cut vertex if some subtree cannot climb past it."
+        order = [None] * len(cells)
+        low = [0] * len(cells)
+        points = set()
+        counter = 0
+        for root in range(len(cells)):
+            if order[root] is not None:
+                continue
+            order[root] = low[root] = counter
+            counter += 1
+            rootChildren = 0
+            stack = [(root, -1, iter(neighbors[cells[root]]))]
+            while stack:
+                i, parent, children = stack[-1]
+                advanced = False
+                for neighbor in children:
+                    j = self.cellIndex[neighbor]
+                    if order[j] is None:
+                        order[j] = low[j] = counter
+                        counter += 1
+                        if i == root:
+                            rootChildren += 1
+                        stack.append((j, i, iter(neighbors[neighbor])))
+                        advanced = True
+                        break
+                    elif j != parent:
+                        low[i] = min(low[i], order[j])
+                if advanced:
+                    continue
+                stack.pop()
+                if parent != -1:
+                    low[parent] = min(low[parent], low[i])
+                    if parent != root and low[i] >= order[parent]:
+                        points.add(cells[parent])
+            if rootChildren > 1:
+                points.add(cells[root])
+        return points
+
+    def getDeadEndDepth(self, pos):
+        i = self.cellIndex.get(pos)
+        return None if i is None else self.deadEndDepth[i]
+
+    def getJunctionDistance(self, pos):
+        i = self.cellIndex.get(pos)
+        return None if i is None else self.junctionDistance[i]
+
+    def getTunnelId(self, pos):
+        i = self.cellIndex.get(pos)
+        return None if i is None else self.tunnelIds[i]
+
+    def getTunnelExits(self, tunnelId):
+        return self.tunnelExits[tunnelId]
+
+    def isArticulationPoint(self, pos):
+        return pos in self.articulationPoints
+
+
+class SpatialIndex:
+    """
+    A set of positions on a layout (food, capsules, agents) answering
+    nearest-by-maze-distance queries.
+
+    Each query cell scans its BFS order (LayoutTables.getBfsOrder) and
+    remembers where it stopped.  Removing positions can only push the
+    nearest one further down that order, so later queries resume from the
+    remembered place and the scanning done from any one cell is bounded by
+    the number of cells over any sequence of removals.  Adding a position
+    resets the remembered places.
+    """
+
+    def __init__(self, layout, positions=()):
+        self.tables = layout.getTables()
+        self.members = bytearray(len(self.tables.freeCells))
+        self.size = 0
+        self.cursors = {}
+        for position in positions:
+            self.add(position)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, position):
+        index = self.tables.cellIndex.get(position)
+        return index is not None and self.members[index] == 1
+
+    def add(self, position):
+        index = self.tables.cellIndex[position]
+        if not self.members[index]:
+            self.members[index] = 1
+            self.size += 1
+            self.cursors = {}
+
+    def remove(self, position):
+        index = self.tables.cellIndex.get(position)
+        if index is not None and self.members[index]:
+            self.members[index] = 0
+            self.size -= 1
+
+    def nearest(self, position):
+        """
+        Returns (distance, position) of the member nearest to position, or
+        (None, None) if no member is reachable.  Agent positions between two
+        cells are rounded to the nearest cell.
+        """
+        source = (int(position[0] + 0.5), int(position[1] + 0.5))
+        if not self.size or source not in self.tables.cellIndex:
+            return None, None
+        order, distances = self.tables.getBfsOrder(source)
+        members = self.members
+        i = self.cursors.get(source, 0)
+        while i < len(order) and not members[order[i]]:
+            i += 1
+        self.cursors[source] = i
+        if i == len(order):
+            return None, None
+        return distances[i], self.tables.freeCells[order[i]]
+
+
+#############################
+# Compiled layout files     #
+#############################
+
+def compiledLayoutPath(sourcePath):
+    directory, name = os.path.split(sourcePath)
+    return os.path.join(directory, COMPILED_LAYOUT_DIR, name + 'c')
+
+
+def writeCompiledLayout(layout, path):
+    """
+    Writes layout to path in the compiled format: a header holding the
+    source text hash, then the board (text, wall and food bitsets, capsules,
+    agent starts) and the derived move and distance tables.
+    """
+    tables = layout.getTables()
+    width, height = layout.width, layout.height
+    text = '\n'.join(layout.layoutText).encode('utf-8')
+    numBytes = (width * height + 7) // 8
+    out = [COMPILED_LAYOUT_MAGIC, struct.pack('<B', COMPILED_LAYOUT_VERSION),
+           bytes.fromhex(layout.contentHash),
+           struct.pack('<HHHI', width, height, layout.numGhosts, len(text)), text,
+           layout.walls.asBitmask().to_bytes(numBytes, 'little'),
+           layout.food.asBitmask().to_bytes(numBytes, 'little'),
+           struct.pack('<H', len(layout.capsules))]
+    for x, y in layout.capsules:
+        out.append(struct.pack('<HH', x, y))
+    out.append(struct.pack('<H', len(layout.agentPositions)))
+    for isPacman, (x, y) in layout.agentPositions:
+        out.append(struct.pack('<BHH', isPacman, x, y))
+    out.append(bytes(tables.moves))
+    if tables.distances is not None:
+        out.append(struct.pack('<B', 1))
+        out.append(tables.distances.tobytes())
     else:
-        layout = tryToLoad('layouts/' + name + '.lay')
-        if layout == None:
-            layout = tryToLoad(name + '.lay')
-    if layout == None and back >= 0:
-        curdir = os.path.abspath('.')
-        os.chdir('..')
-        layout = getLayout(name, back - 1)
-        os.chdir(curdir)
+        out.append(struct.pack('<B', 0))
+    tmpPath = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmpPath, 'wb') as f:
+        f.write(b''.join(out))
+    os.replace(tmpPath, path)
+
+
+def readCompiledLayout(path, contentHash):
+    """
+    Returns the Layout stored at path, or None if the file is missing,
+    unreadable or was compiled from a different source text.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except (IOError, OSError):
+        return None
+    offset = len(COMPILED_LAYOUT_MAGIC)
+    if data[:offset] != COMPILED_LAYOUT_MAGIC or len(data) < offset + 21:
+        return None
+    version, = struct.unpack_from('<B', data, offset)
+    if version != COMPILED_LAYOUT_VERSION or data[offset + 1:offset + 21].hex() != contentHash:
+        return None
+    offset += 21
+    try:
+        width, height, numGhosts, textLength = struct.unpack_from('<HHHI', data, offset)
+        offset += 10
+        layoutText = data[offset:offset + textLength].decode('utf-8').split('\n')
+        offset += textLength
+        numBytes = (width * height + 7) // 8
+        walls = gridFromBitmask(width, height, int.from_bytes(data[offset:offset + numBytes], 'little'))
+        offset += numBytes
+        food = gridFromBitmask(width, height, int.from_bytes(data[offset:offset + numBytes], 'little'))
+        offset += numBytes
+        numCapsules, = struct.unpack_from('<H', data, offset)
+        offset += 2
+        capsules = []
+        for i in range(numCapsules):
+            capsules.append(struct.unpack_from('<HH', data, offset))
+            offset += 4
+        numAgents, = struct.unpack_from('<H', data, offset)
+        offset += 2
+        agentPositions = []
+        for i in range(numAgents):
+            isPacman, x, y = struct.unpack_from('<BHH', data, offset)
+            agentPositions.append((bool(isPacman), (x, y)))
+            offset += 5
+        moves = bytearray(data[offset:offset + width * height])
+        offset += width * height
+        hasDistances, = struct.unpack_from('<B', data, offset)
+        offset += 1
+        distances = None
+        if hasDistances:
+            distances = array(getCellTypecode(width * height - walls.count()))
+            distances.frombytes(data[offset:])
+    except (struct.error, ValueError, UnicodeDecodeError):
+        return None
+
+    layout = Layout.__new__(Layout)
+    layout.width = width
+    layout.height = height
+    layout.walls = walls
+    layout.food = food
+    layout.capsules = [tuple(c) for c in capsules]
+    layout.agentPositions = agentPositions
+    layout.numGhosts = numGhosts
+    layout.layoutText = layoutText
+    layout.totalFood = food.count()
+    layout.contentHash = contentHash
+    layout.tables = LayoutTables(walls, moves, distances)
+    layout.tableSource = None
     return layout
 
 
+def loadLayoutFile(path):
+    """
+    Loads the layout at path through the in-process registry.  On a miss the
+    compiled copy is used when it matches the source text; otherwise the text
+    is parsed and compiled for next time.  Always returns a fresh copy.
+    """
+    f = open(path)
+    try:
+        layoutText = [line.strip() for line in f]
+    finally:
+        f.close()
+    contentHash = hashLayoutText(layoutText)
+    if contentHash not in LAYOUT_REGISTRY:
+        compiledPath = compiledLayoutPath(path)
+        layout = readCompiledLayout(compiledPath, contentHash)
+        if layout is None:
+            layout = Layout(layoutText)
+            try:
+                if not os.path.isdir(os.path.dirname(compiledPath)):
+                    os.makedirs(os.path.dirname(compiledPath))
+                writeCompiledLayout(layout, compiledPath)
+            except (IOError, OSError):
+                pass  # Read-only checkout: keep the in-process copy only
+        LAYOUT_REGISTRY[contentHash] = layout
+    return LAYOUT_REGISTRY[contentHash].deepCopy()
+
+
+def findLayoutFile(name, back=2):
+    """
+    Returns the path of the layout called name, looking in layouts/ and the
+    current directory and then in up to back + 1 parent directories.
+    """
+    if name.endswith('.lay'):
+        candidates = ['layouts/' + name, name]
+    else:
+        candidates = ['layouts/' + name + '.lay', name + '.lay']
+    prefix = ''
+    for level in range(back + 2):
+        for candidate in candidates:
+            path = os.path.join(prefix, candidate)
+            if os.path.exists(path):
+                return path
+        prefix = os.path.join('..', prefix)
+    return None
+
+
+def getLayout(name, back=2):
+    if name.startswith(GENERATED_LAYOUT_PREFIX):
+        return getGeneratedLayout(name)
+    path = findLayoutFile(name, back)
+    if path == None:
+        return None
+    return loadLayoutFile(path)
+
+
 def tryToLoad(fullname):
     if(not os.path.exists(fullname)):
         return None
-    f = open(fullname)
+    return loadLayoutFile(fullname)
+
+
+#############################
+# Generated layouts         #
+#############################
+
+# getLayout('generated:WIDTHxHEIGHT[:SEED]') builds a maze instead of reading one
+GENERATED_LAYOUT_PREFIX = 'generated:'
+
+# The LAYOUT_REGISTRY hash of each maze generated so far, by (width, height, seed)
+GENERATED_LAYOUT_HASHES = {}
+
+
+def generateLayoutText(width, height, seed=None, corridorDensity=0.3, foodDensity=0.8,
+                       numCapsules=4, numGhosts=4, rand=None):
+    """
+    Returns the text (a list of rows, top row first) of a random connected
+    maze of the given outer size.
+
+    The maze is grown as a spanning tree over the cells at odd coordinates,
+    so every open cell is reachable from every other.  corridorDensity is
+    the fraction of the remaining walls between two passages that are then
+    knocked down: 0 keeps the tree (long dead ends), 1 leaves a grid of
+    pillars.  Pacman starts on a random cell, ghosts on the cells of the
+    half of the maze farthest from him, and food covers foodDensity of the
+    remaining cells.  The same seed always gives the same maze.
+    """
+    if width < 5 or height < 5:
+        raise Exception('Generated layouts must be at least 5x5, not %dx%d' % (width, height))
+    if rand is None:
+        rand = random.Random(seed)
+    # Cells on odd coordinates; an even size leaves a double outer wall
+    columns = list(range(1, width - 1, 2))
+    rows = list(range(1, height - 1, 2))
+    passages = set()
+    start = (rand.choice(columns), rand.choice(rows))
+    passages.add(start)
+    stack = [start]
+    while stack:
+        x, y = stack[-1]
+        unvisited = [(x + dx, y + dy) for dx, dy in ((2, 0), (-2, 0), (0, 2), (0, -2))
+                     if 0 < x + dx < width - 1 and 0 < y + dy < height - 1 and
+                     (x + dx, y + dy) not in passages]
+        if not unvisited:
+            stack.pop()
+            continue
+        nx, ny = rand.choice(unvisited)
+        passages.add(((x + nx) // 2, (y + ny) // 2))
+        passages.add((nx, ny))
+        stack.append((nx, ny))
+    # Walls separating two passages, in a fixed order so the seed decides
+    for x in range(1, width - 1):
+        for y in range(1, height - 1):
+            if (x, y) in passages or (x % 2) == (y % 2):
+                continue
+            if ((x - 1, y) in passages and (x + 1, y) in passages) or \
+                    ((x, y - 1) in passages and (x, y + 1) in passages):
+                if rand.random() < corridorDensity:
+                    passages.add((x, y))
+
+    cells = sorted(passages)
+    pacman = rand.choice(cells)
+    distances = {pacman: 0}
+    frontier = [pacman]
+    for cell in frontier:
+        x, y = cell
+        for neighbor in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if neighbor in passages and neighbor not in distances:
+                distances[neighbor] = distances[cell] + 1
+                frontier.append(neighbor)
+    far = frontier[len(frontier) // 2:]
+    ghosts = rand.sample(far, min(numGhosts, len(far) - 1))
+    rest = [cell for cell in cells if cell != pacman and cell not in ghosts]
+    capsules = rand.sample(rest, min(numCapsules, len(rest) - 1))
+    rest = [cell for cell in rest if cell not in capsules]
+    food = [cell for cell in rest if rand.random() < foodDensity]
+    if not food:
+        food = [rest[0]]
+
+    grid = [['%'] * width for y in range(height)]
+    for x, y in cells:
+        grid[y][x] = ' '
+    for x, y in food:
+        grid[y][x] = '.'
+    for x, y in capsules:
+        grid[y][x] = 'o'
+    for x, y in ghosts:
+        grid[y][x] = 'G'
+    grid[pacman[1]][pacman[0]] = 'P'
+    return [''.join(row) for row in reversed(grid)]
+
+
+def generateLayout(width, height, seed=None, **options):
+    """
+    Returns a Layout for generateLayoutText(width, height, seed, **options).
+    """
+    return Layout(generateLayoutText(width, height, seed, **options))
+
+
+def writeLayoutFile(path, layoutText):
+    with open(path, 'w') as f:
+        f.write('\n'.join(layoutText) + '\n')
+
+
+def getGeneratedLayout(name):
+    """
+    Parses names of the form generated:WIDTHxHEIGHT or
+    generated:WIDTHxHEIGHT:SEED (seed 0 by default).
+    """
+    fields = name[len(GENERATED_LAYOUT_PREFIX):].split(':')
     try:
-        return Layout([line.strip() for line in f])
-    finally:
-        f.close()
+        width, height = [int(size) for size in fields[0].lower().split('x')]
+        seed = int(fields[1]) if len(fields) > 1 else 0
+    except ValueError:
+        raise Exception('Bad generated layout name ' + name)
+    key = (width, height, seed)
+    contentHash = GENERATED_LAYOUT_HASHES.get(key)
+    if contentHash not in LAYOUT_REGISTRY:
+        text = generateLayoutText(width, height, seed)
+        contentHash = hashLayoutText(text)
+        if contentHash not in LAYOUT_REGISTRY:
+            LAYOUT_REGISTRY[contentHash] = Layout(text)
+        GENERATED_LAYOUT_HASHES[key] = contentHash
+    return LAYOUT_REGISTRY[contentHash].deepCopy()
@@ -14,7 +14,11 @@
 
 from util import manhattanDistance
 from game import Directions
+from game import Actions
+import foodPlanner
 import random, util
+import collections
+import copy
 
 from game import Agent
 
@@ -118,6 +122,145 @@ def scoreEvaluationFunction(currentGameState):
     """
     return currentGameState.getScore()
 
+class EvaluationCache:
+    """
+    Wraps an evaluation function with a bounded memo table so that leaves
+    reached again (through transpositions within one search, or again on the
+    next move) are not re-evaluated.
+
+    States are keyed by GameState.getCacheKey(); once more than maxSize
+    entries are stored, the least recently used one is evicted.  The hits,
+    misses and evictions counters can be read through the owning agent.
+
+    With canonical set, states are keyed by GameState.getCanonicalKey()
+    instead, so mirror images on a symmetric layout share one entry.  This
+    is only correct for evaluation functions that do not care about the
+    orientation of the board, which holds for the ones in this file.
+    """
+
+    def __init__(self, evaluationFunction, maxSize, canonical=False):
+        self.evaluationFunction = evaluationFunction
+        self.maxSize = maxSize
+        self.canonical = canonical
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def getKey(self, gameState):
+        if self.canonical:
+            return gameState.getCanonicalKey()[0]
+        getCacheKey = getattr(gameState, 'getCacheKey', None)
+        return getCacheKey() if getCacheKey else gameState
+
+    def __call__(self, gameState):
+        key = self.getKey(gameState)
+        entries = self.entries
+        if key in entries:
+            self.hits += 1
+            entries.move_to_end(key)
+            return entries[key]
+        self.misses += 1
+        value = self.evaluationFunction(gameState)
+        entries[key] = value
+        if len(entries) > self.maxSize:
+            entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def evaluateBatch(self, gameStates):
+        """
+        Looks every state up first, then evaluates each missing key once (a
+        key repeated within the batch counts as a hit) and stores the new
+        values, evicting down to maxSize after the whole batch.
+        """
+        values = [None] * len(gameStates)
+        keys = []
+        misses = []
+        repeats = []
+        pending = set()
+        entries = self.entries
+        for i, gameState in enumerate(gameStates):
+            key = self.getKey(gameState)
+            keys.append(key)
+            if key in entries:
+                self.hits += 1
+                entries.move_to_end(key)
+                values[i] = entries[key]
+            elif key in pending:
+                self.hits += 1
+                repeats.append(i)
+            else:
+                pending.add(key)
+                misses.append(i)
+        if not misses:
+            return values
+        self.misses += len(misses)
+        evaluateBatch = getattr(self.evaluationFunction, 'evaluateBatch', None)
+        if evaluateBatch is not None:
+            missValues = evaluateBatch([gameStates[i] for i in misses])
+        else:
+            missValues = [self.evaluationFunction(gameStates[i]) for i in misses]
+        for i, value in zip(misses, missValues):
+            values[i] = value
+            entries[keys[i]] = value
+        for i in repeats:
+            values[i] = entries[keys[i]]
+        while len(entries) > self.maxSize:
+            entries.popitem(last=False)
+            self.evictions += 1
+        return values
+
+    def clear(self):
+        self.entries.clear()
+
+    def getHitRate(self):
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return self.hits / float(lookups)
+
+    def __str__(self):
+        return 'Evaluation cache: %d/%d hits (%.2f), %d entries, %d evictions' % (
+            self.hits, self.hits + self.misses, self.getHitRate(), len(self.entries), self.evictions)
+
+class SearchCutoff(Exception):
+    "Raised inside a search when its node budget runs out."
+    pass
+
+class NodeBudgetGuard:
+    """
+    Counts the states generated (GameState.generatedCount) since the guard
+    was armed.  While armed with a limit it is the state class's
+    generationGuard, so the search is cut off with SearchCutoff just before
+    it would generate more than limit states.
+    """
+
+    def __init__(self, stateClass):
+        self.stateClass = stateClass
+        self.start = 0
+        self.limit = None
+
+    def arm(self, limit):
+        self.start = self.stateClass.generatedCount
+        self.limit = limit
+        self.stateClass.generationGuard = self.check if limit is not None else None
+
+    def disarm(self):
+        self.limit = None
+        self.stateClass.generationGuard = None
+
+    def getNodes(self):
+        return self.stateClass.generatedCount - self.start
+
+    def check(self):
+        if self.getNodes() >= self.limit:
+            raise SearchCutoff()
+
+# Quiescence extension thresholds (see MultiAgentSearchAgent.isNoisy)
+QUIESCENCE_GHOST_RANGE = 2
+QUIESCENCE_SCARED_EXPIRY = 2
+
 class MultiAgentSearchAgent(Agent):
     """
     This class provides some common elements to all of your
@@ -133,10 +276,307 @@ class MultiAgentSearchAgent(Agent):
     is another abstract class.
     """
 
-    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2'):
+    # The search only reads the states it is given; observationFunction
+    # attaches features to a copy
+    mutatesState = False
+
+    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2', evalCache = '0',
+                 nodeBudget = '0', maxDepth = '8', quiescence = '0', macro = '0',
+                 canonicalCache = '0', tablebase = ''):
         self.index = 0 # Pacman is always agent index 0
         self.evaluationFunction = util.lookup(evalFn, globals())
         self.depth = int(depth)
+        # Extra plies searched past self.depth at noisy leaves (-a quiescence=PLIES)
+        self.quiescence = int(quiescence)
+        # Optional LRU memo of leaf evaluations (-a evalCache=SIZE), shared
+        # between mirror-image states with -a canonicalCache=1
+        self.evalCache = None
+        self.cachedLayoutText = None
+        if int(evalCache) > 0:
+            self.evalCache = EvaluationCache(self.evaluationFunction, int(evalCache),
+                                             int(canonicalCache) > 0)
+            self.evaluationFunction = self.evalCache
+        # Optional cap on generated states per move (-a nodeBudget=NODES);
+        # the search depth is then chosen per move, up to maxDepth
+        self.nodeBudget = int(nodeBudget)
+        self.maxDepth = int(maxDepth)
+        self.plyGrowth = None
+        self.searchStats = []
+        # Optional search over corridor moves instead of single steps
+        # (-a macro=1); self.depth then counts macro plies
+        self.macro = int(macro) > 0
+        if self.macro:
+            self.getAction = self.getMacroAction
+        if self.nodeBudget > 0:
+            self.getFixedDepthAction = self.getAction
+            self.getAction = self.getBudgetedAction
+        # Optional solved endgame table consulted before searching
+        # (-a tablebase=PATH, written by tablebase.py)
+        self.tablebase = None
+        self.tablebaseHits = 0
+        if tablebase:
+            import tablebase as tablebaseModule
+            self.tablebase = tablebaseModule.Tablebase(tablebase)
+            self.getSearchAction = self.getAction
+            self.getAction = self.getTablebaseAction
+
+    def getTablebaseAction(self, gameState):
+        """
+        Plays the tablebase move when the position is in the table and
+        searches otherwise.
+        """
+        entry = self.tablebase.lookup(gameState)
+        if entry is not None:
+            self.tablebaseHits += 1
+            return entry[1]
+        return self.getSearchAction(gameState)
+
+    def getBudgetedAction(self, gameState):
+        """
+        Iterative deepening under self.nodeBudget.  Each iteration runs the
+        agent's own fixed-depth search; the next depth is only tried when the
+        predicted size of its tree (the last tree times the measured growth
+        per ply) fits in what is left of the budget.  If a search is cut off
+        anyway, the action of the deepest completed search is returned.  Only
+        the first iteration, which always completes so that there is a move to
+        make, may take the move over the budget.
+        """
+        guard = NodeBudgetGuard(type(gameState))
+        fixedDepth = self.depth
+        bestAction = None
+        completedDepth = 0
+        cutoff = False
+        used = 0
+        lastNodes = None
+        try:
+            for depth in range(1, self.maxDepth + 1):
+                remaining = self.nodeBudget - used
+                if lastNodes is not None and self.plyGrowth is not None:
+                    if lastNodes * self.plyGrowth > remaining:
+                        break
+                self.depth = depth
+                # The first iteration always completes so there is a move to make
+                guard.arm(remaining if bestAction is not None else None)
+                try:
+                    action = self.getFixedDepthAction(gameState)
+                except SearchCutoff:
+                    cutoff = True
+                    used += guard.getNodes()
+                    break
+                finally:
+                    guard.disarm()
+                nodes = guard.getNodes()
+                used += nodes
+                if lastNodes:
+                    growth = nodes / float(lastNodes)
+                    if self.plyGrowth is None:
+                        self.plyGrowth = growth
+                    else:
+                        self.plyGrowth = 0.5 * self.plyGrowth + 0.5 * growth
+                elif self.plyGrowth is None:
+                    # Before any measurement assume every ply multiplies like the first
+                    self.plyGrowth = max(float(nodes), 1.0)
+                lastNodes = max(nodes, 1)
+                bestAction = action
+                completedDepth = depth
+                if gameState.isWin() or gameState.isLose():
+                    break
+        finally:
+            self.depth = fixedDepth
+        self.searchStats.append((completedDepth, used, cutoff))
+        return bestAction
+
+    def getBaseEvaluationFunction(self):
+        if self.evalCache is not None:
+            return self.evalCache.evaluationFunction
+        return self.evaluationFunction
+
+    def registerInitialState(self, gameState):
+        # Cache keys are only meaningful on the layout they were built on
+        layoutText = gameState.data.layout.layoutText
+        if self.evalCache is not None and layoutText != self.cachedLayoutText:
+            self.evalCache.clear()
+        self.cachedLayoutText = layoutText
+
+    def observationFunction(self, gameState):
+        """
+        Attaches incremental evaluation features to the observed state so the
+        search below it can update them instead of recomputing them per leaf.
+        The features go on a shallow copy: the headless game loop hands over
+        its own state, which must not carry them into the rest of the game.
+        """
+        evaluationFunction = self.getBaseEvaluationFunction()
+        if isinstance(evaluationFunction, IncrementalEvaluator):
+            observation = copy.copy(gameState)
+            observation.data = copy.copy(gameState.data)
+            return evaluationFunction.attach(observation)
+        return gameState
+
+    def evaluateLeaves(self, gameStates):
+        """
+        Evaluates a list of leaf states, in one call when the evaluation
+        function offers a batched evaluateBatch(states) and one at a time
+        otherwise.
+        """
+        evaluateBatch = getattr(self.evaluationFunction, 'evaluateBatch', None)
+        if evaluateBatch is not None:
+            return evaluateBatch(gameStates)
+        return [self.evaluationFunction(gameState) for gameState in gameStates]
+
+    def isCutoff(self, gameState, depth, agentIndex):
+        """
+        Returns whether the search stops at gameState, reached at search depth
+        depth with agentIndex to move.  Terminal states and states at
+        self.depth are leaves, except that with quiescence enabled a noisy
+        state (see isNoisy) keeps being searched, a full ply at a time, until
+        it is quiet or self.quiescence extra plies have been searched.
+        """
+        if gameState.isWin() or gameState.isLose():
+            return True
+        if depth < self.depth:
+            return False
+        if depth >= self.depth + self.quiescence:
+            return True
+        if agentIndex != 0:
+            # Finish the ply started by the extension
+            return False
+        return not self.isNoisy(gameState)
+
+    def isNoisy(self, gameState):
+        """
+        A state is noisy when its static evaluation is about to be overturned:
+        an active ghost is within collision range of Pacman, a capsule is
+        next to him, or a nearby ghost's scared timer is about to run out.
+        """
+        pacmanPosition = gameState.getPacmanPosition()
+        for ghostState in gameState.getGhostStates():
+            distance = manhattanDistance(pacmanPosition, ghostState.getPosition())
+            if distance <= QUIESCENCE_GHOST_RANGE:
+                return True
+            if 0 < ghostState.scaredTimer <= QUIESCENCE_SCARED_EXPIRY and \
+                    distance <= QUIESCENCE_GHOST_RANGE + ghostState.scaredTimer:
+                return True
+        for capsule in gameState.getCapsules():
+            if manhattanDistance(pacmanPosition, capsule) <= 1:
+                return True
+        return False
+
+    def getChildValues(self, successors, depth, agentIndex, value):
+        """
+        Returns the values of the successors of a node, which sit at search
+        depth depth with agentIndex to move.  Successors that are leaves (see
+        isCutoff) are evaluated together through evaluateLeaves; the rest are
+        valued by calling value(successor).
+        """
+        values = [None] * len(successors)
+        leaves = [i for i, successor in enumerate(successors)
+                  if self.isCutoff(successor, depth, agentIndex)]
+        if leaves:
+            leafValues = self.evaluateLeaves([successors[i] for i in leaves])
+            for i, leafValue in zip(leaves, leafValues):
+                values[i] = leafValue
+        for i, successor in enumerate(successors):
+            if values[i] is None:
+                values[i] = value(successor)
+        return values
+
+    # Ghosts minimize in the macro search; agents that model them as
+    # chance nodes average over their moves instead
+    macroChance = False
+
+    def getMacroAction(self, gameState):
+        """
+        Searches over macro-actions on the layout's JunctionGraph: Pacman
+        picks a corridor and follows it to the next junction or dead end, so
+        one macro ply covers a whole corridor.  Every ghost branches on its
+        first move of the macro ply and then follows its own corridor, taking
+        at a junction the move that closes on Pacman (or, when scared, flees
+        him), until Pacman arrives.  Returns the first step of the best
+        corridor.
+        """
+        graph = gameState.data.layout.getJunctionGraph()
+        bestAction = None
+        bestValue = None
+        for corridor in self.getMacroCorridors(graph, gameState):
+            value = self.macroGhostValue(gameState.getNextState(0, corridor.actions[0]),
+                                         1, corridor, 0, graph)
+            if bestValue is None or value > bestValue:
+                bestAction, bestValue = corridor.actions[0], value
+        if bestAction is None:
+            return Directions.STOP
+        return bestAction
+
+    def getMacroCorridors(self, graph, gameState):
+        position = gameState.getPacmanPosition()
+        corridors = []
+        for action in gameState.getLegalActions(0):
+            if action != Directions.STOP:
+                corridor = graph.getPath(position, action)
+                if corridor is not None:
+                    corridors.append(corridor)
+        return corridors
+
+    def macroValue(self, gameState, depth, graph):
+        if gameState.isWin() or gameState.isLose() or depth >= self.depth:
+            return self.evaluationFunction(gameState)
+        values = [self.macroGhostValue(gameState.getNextState(0, corridor.actions[0]),
+                                       1, corridor, depth, graph)
+                  for corridor in self.getMacroCorridors(graph, gameState)]
+        if not values:
+            return self.evaluationFunction(gameState)
+        return max(values)
+
+    def macroGhostValue(self, gameState, agentIndex, corridor, depth, graph):
+        if gameState.isWin() or gameState.isLose():
+            return self.evaluationFunction(gameState)
+        if agentIndex == gameState.getNumAgents():
+            gameState = self.followCorridor(gameState, corridor.actions[1:])
+            return self.macroValue(gameState, depth + 1, graph)
+        values = [self.macroGhostValue(gameState.getNextState(agentIndex, action),
+                                       agentIndex + 1, corridor, depth, graph)
+                  for action in gameState.getLegalActions(agentIndex)]
+        if self.macroChance:
+            return sum(values) / float(len(values))
+        return min(values)
+
+    def followCorridor(self, gameState, actions):
+        """
+        Plays the rest of a macro ply: Pacman takes actions one by one and
+        after each of his steps every ghost makes its corridor move.
+        """
+        for action in actions:
+            for agentIndex in range(gameState.getNumAgents()):
+                if gameState.isWin() or gameState.isLose():
+                    return gameState
+                if agentIndex > 0:
+                    action = self.getCorridorGhostAction(gameState, agentIndex)
+                gameState = gameState.getNextState(agentIndex, action)
+        return gameState
+
+    def getCorridorGhostAction(self, gameState, agentIndex):
+        legal = gameState.getLegalActions(agentIndex)
+        if len(legal) == 1:
+            return legal[0]
+        ghostState = gameState.getGhostState(agentIndex)
+        pacmanPosition = gameState.getPacmanPosition()
+        x, y = ghostState.getPosition()
+
+        def distanceAfter(action):
+            dx, dy = Actions.directionToVector(action)
+            return manhattanDistance((x + dx, y + dy), pacmanPosition)
+        if ghostState.scaredTimer > 0:
+            return max(legal, key=distanceAfter)
+        return min(legal, key=distanceAfter)
+
+    def getEvalCacheStats(self):
+        """
+        Returns the evaluation cache counters, or None if caching is off.
+        """
+        if self.evalCache is None:
+            return None
+        return {'hits': self.evalCache.hits, 'misses': self.evalCache.misses,
+                'evictions': self.evalCache.evictions, 'size': len(self.evalCache.entries),
+                'hitRate': self.evalCache.getHitRate()}
 
 class MinimaxAgent(MultiAgentSearchAgent):
     """
@@ -167,7 +607,7 @@ class MinimaxAgent(MultiAgentSearchAgent):
         Returns whether or not the game state is a losing state
         """
         def minimax(agentIndex, depth, gameState):
-            if gameState.isWin() or gameState.isLose() or depth == self.depth:
+            if self.isCutoff(gameState, depth, agentIndex):
                 return self.evaluationFunction(gameState)
             
             if agentIndex == 0:  # Pacman's turn (Max player)
@@ -178,9 +618,11 @@ class MinimaxAgent(MultiAgentSearchAgent):
         def max_value(agentIndex, depth, gameState):
             maxValue = float("-inf")
             bestAction = None
-            for action in gameState.getLegalActions(agentIndex):
-                successor = gameState.getNextState(agentIndex, action)
-                value = minimax(1, depth, successor)
+            actions = gameState.getLegalActions(agentIndex)
+            successors = [gameState.getNextState(agentIndex, action) for action in actions]
+            values = self.getChildValues(successors, depth, 1,
+                                         lambda successor: minimax(1, depth, successor))
+            for action, value in zip(actions, values):
                 if value > maxValue:
                     maxValue = value
                     bestAction = action
@@ -192,9 +634,11 @@ class MinimaxAgent(MultiAgentSearchAgent):
             nextDepth = depth + 1 if nextAgent >= gameState.getNumAgents() else depth
             nextAgent %= gameState.getNumAgents()
 
-            for action in gameState.getLegalActions(agentIndex):
-                successor = gameState.getNextState(agentIndex, action)
-                value = minimax(nextAgent, nextDepth, successor)
+            successors = [gameState.getNextState(agentIndex, action)
+                          for action in gameState.getLegalActions(agentIndex)]
+            values = self.getChildValues(successors, nextDepth, nextAgent,
+                                         lambda successor: minimax(nextAgent, nextDepth, successor))
+            for value in values:
                 if value < minValue:
                     minValue = value
             return minValue
@@ -226,7 +670,7 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
             Returns:
                 El valor de la funcion de evaluacion para los nodos hoja, o el mejor valor calculado para los nodos interiores.
             """
-            if gameState.isWin() or gameState.isLose() or depth == self.depth:
+            if self.isCutoff(gameState, depth, agentIndex):
                 return self.evaluationFunction(gameState)
             
             if agentIndex == 0:
@@ -297,6 +741,8 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
       Your expectimax agent (question 4)
     """
 
+    macroChance = True
+
     def getAction(self, gameState):
         """
         Retorna el mejor movimiento para el agente en el estado actual del juego.
@@ -336,7 +782,7 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
         Returns:
             El valor maximo esperado para el estado del juego
         """
-        if gameState.isWin() or gameState.isLose() or currDepth == self.depth:
+        if self.isCutoff(gameState, currDepth, 0):
             return self.evaluationFunction(gameState)
         
         actions = gameState.getLegalActions(0)
@@ -346,7 +792,8 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
             successors.append( gameState.getNextState(0, a) )
             
         # Agente con indice == 1 (el primer fantasma) juega a continuacion
-        valoresEsperados = [self.chanceExpect(s, currDepth, 1) for s in successors]
+        valoresEsperados = self.getChildValues(successors, currDepth, 1,
+                                               lambda s: self.chanceExpect(s, currDepth, 1))
         
         return max(valoresEsperados)
 
@@ -362,7 +809,7 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
         Returns:
             El valor esperado para el estado del juego
         """
-        if gameState.isWin() or gameState.isLose() or currDepth == self.depth:
+        if self.isCutoff(gameState, currDepth, currAgent):
             return self.evaluationFunction(gameState)
         
         actions = gameState.getLegalActions(currAgent)
@@ -374,23 +821,278 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
             
         if currAgent < gameState.getNumAgents() - 1:
             # Aun hay fantasmas que deben elegir sus movimientos, por lo que se aumenta el indice del agente y se llama a chanceExpect nuevamente
-            return sum( [self.chanceExpect(s, currDepth, currAgent + 1 ) for s in successors ] )/len(successors)
+            return sum(self.getChildValues(successors, currDepth, currAgent + 1,
+                                           lambda s: self.chanceExpect(s, currDepth, currAgent + 1)))/len(successors)
         
         else:
-            # La profundidad se aumenta cuando es el turno de MAX
-            valoresMax = sum([self.maxExpect(s, currDepth + 1 ) for s in successors]) / len(successors)
+            # La profundidad se aumenta cuando es el turno de MAX; las hojas del
+            # ultimo nivel se evaluan juntas en un solo lote
+            valoresMax = sum(self.getChildValues(successors, currDepth + 1, 0,
+                                                 lambda s: self.maxExpect(s, currDepth + 1))) / len(successors)
             return valoresMax
 
 
-def betterEvaluationFunction(currentGameState):
+######################################
+# Incremental (delta) evaluation     #
+######################################
+
+class EvaluationFeature:
+    """
+    One term of an IncrementalEvaluator.
+
+    compute(state) derives the feature value from scratch.  update(value,
+    state, changed) derives it from the parent state's value, where changed
+    is the set of things the last move touched:
+
+      'pacman'   - Pacman moved (agent 0 made the move)
+      'ghosts'   - some ghost configuration or scared timer changed
+      'food'     - a pellet was eaten (state.data._foodEaten)
+      'capsules' - a capsule was eaten (state.data._capsuleEaten)
+
+    The default update recomputes only when the feature depends on one of
+    the changes; subclasses override it when they can do better than that.
+    scalar(value) turns the value into the number that gets weighted.
     """
-    Your extreme ghost-hunting, pellet-nabbing, food-gobbling, unstoppable
-    evaluation function (question 5).
+    name = None
+    dependsOn = frozenset(['pacman', 'ghosts', 'food', 'capsules'])
+
+    def compute(self, gameState):
+        util.raiseNotDefined()
+
+    def update(self, value, gameState, changed):
+        if self.dependsOn & changed:
+            return self.compute(gameState)
+        return value
+
+    def scalar(self, value):
+        return value
+
+class FoodCountFeature(EvaluationFeature):
+    "Number of pellets left on the board."
+    name = 'foodCount'
+    dependsOn = frozenset(['food'])
+
+    def compute(self, gameState):
+        return gameState.getNumFood()
+
+    def update(self, value, gameState, changed):
+        if 'food' in changed:
+            return value - 1
+        return value
+
+class CapsuleCountFeature(EvaluationFeature):
+    "Number of power capsules left on the board."
+    name = 'capsuleCount'
+    dependsOn = frozenset(['capsules'])
+
+    def compute(self, gameState):
+        return len(gameState.getCapsules())
 
-    DESCRIPTION: <write something here so we know what you did>
+    def update(self, value, gameState, changed):
+        if 'capsules' in changed:
+            return value - 1
+        return value
+
+class NearestFoodFeature(EvaluationFeature):
+    "Maze distance from Pacman to the closest pellet (0 if none are left)."
+    name = 'nearestFood'
+    dependsOn = frozenset(['pacman', 'food'])
+
+    def compute(self, gameState):
+        start = util.nearestPoint(gameState.getPacmanPosition())
+        distance, cell = gameState.data.layout.getNearestInGrid(start, gameState.getFood())
+        return distance or 0
+
+class FoodClearanceFeature(EvaluationFeature):
+    """
+    Moves needed to eat all the remaining food, ignoring ghosts: exact when
+    few pellets are left and a spanning-tree lower bound otherwise (see
+    foodPlanner).  The value carries the food key so that a child can hand
+    its parent's food summary to the planner.
     """
-    "*** YOUR CODE HERE ***"
-    util.raiseNotDefined()    
+    name = 'foodClearance'
+    dependsOn = frozenset(['pacman', 'food'])
+
+    def compute(self, gameState, parentKey=None):
+        foodKey = gameState.data._foodKey
+        planner = foodPlanner.getFoodPlanner(gameState.data.layout)
+        return (foodKey, planner.getClearanceEstimate(gameState.getPacmanPosition(), foodKey, parentKey))
+
+    def update(self, value, gameState, changed):
+        if self.dependsOn & changed:
+            return self.compute(gameState, value[0])
+        return value
+
+    def scalar(self, value):
+        return value[1]
+
+class GhostFeature(EvaluationFeature):
+    """
+    Per-ghost (maze distance to Pacman, scared timer) pairs.  When only one
+    ghost moved, only that ghost's entry is recomputed.
+    """
+    name = 'ghosts'
+    dependsOn = frozenset(['pacman', 'ghosts', 'capsules'])
+
+    def compute(self, gameState):
+        return tuple([self.ghostEntry(gameState, index)
+                      for index in range(1, gameState.getNumAgents())])
+
+    def ghostEntry(self, gameState, index):
+        ghostState = gameState.data.agentStates[index]
+        distance = gameState.data.layout.getMazeDistance(util.nearestPoint(gameState.getPacmanPosition()),
+                                                         util.nearestPoint(ghostState.getPosition()))
+        return (distance or 0, ghostState.scaredTimer)
+
+    def update(self, value, gameState, changed):
+        moved = gameState.data._agentMoved
+        if 'pacman' in changed or 'capsules' in changed:
+            return self.compute(gameState)
+        if 'ghosts' in changed:
+            entries = list(value)
+            entries[moved - 1] = self.ghostEntry(gameState, moved)
+            return tuple(entries)
+        return value
+
+    def scalar(self, value):
+        total = 0.0
+        for distance, scaredTimer in value:
+            if scaredTimer > distance:
+                # Chase ghosts we can still reach while they are scared
+                total += 5.0 / (distance + 1)
+            elif scaredTimer == 0 and distance < 4:
+                # Keep out of reach of active ghosts
+                total -= (4 - distance) ** 2
+        return total
+
+class FeatureVector:
+    """
+    The feature values of one state, in the order of evaluator.features.
+    Feature vectors are never modified; child() builds the vector of a
+    successor state from this one.
+    """
+
+    def __init__(self, evaluator, values):
+        self.evaluator = evaluator
+        self.values = values
+
+    def child(self, gameState):
+        return self.evaluator.updateFeatures(self, gameState)
+
+class IncrementalEvaluator:
+    """
+    An evaluation function built from a weighted sum of EvaluationFeatures
+    whose values are carried from parent to child state instead of being
+    recomputed at every leaf.
+
+    Once a root state has been attached, GameState.getNextState keeps the
+    vector of every descendant up to date using what GameStateData already
+    records about the last move (_agentMoved, _foodEaten, _capsuleEaten).
+    States without a vector are evaluated from scratch.
+    """
+
+    def __init__(self, weightedFeatures):
+        self.features = [feature for feature, weight in weightedFeatures]
+        self.weights = [weight for feature, weight in weightedFeatures]
+
+    def computeFeatures(self, gameState):
+        return FeatureVector(self, [feature.compute(gameState) for feature in self.features])
+
+    def updateFeatures(self, parent, gameState):
+        data = gameState.data
+        changed = set()
+        if data._agentMoved == 0:
+            changed.add('pacman')
+            if True in data._eaten:
+                changed.add('ghosts')
+        else:
+            changed.add('ghosts')
+        if data._foodEaten is not None:
+            changed.add('food')
+        if data._capsuleEaten is not None:
+            changed.add('capsules')
+        return FeatureVector(self, [feature.update(value, gameState, changed)
+                                    for feature, value in zip(self.features, parent.values)])
+
+    def attach(self, gameState):
+        """
+        Computes the features of gameState from scratch and stores them on
+        the state so that its descendants are evaluated incrementally.
+        """
+        gameState.data._features = self.computeFeatures(gameState)
+        return gameState
+
+    def getFeatures(self, gameState):
+        features = gameState.data._features
+        if features is None or features.evaluator is not self:
+            features = self.computeFeatures(gameState)
+        return features
+
+    def __call__(self, gameState):
+        if gameState.isWin() or gameState.isLose():
+            return gameState.getScore()
+        values = self.getFeatures(gameState).values
+        weighted = sum([weight * feature.scalar(value)
+                        for feature, weight, value in zip(self.features, self.weights, values)])
+        return gameState.getScore() + weighted
+
+    def evaluateBatch(self, gameStates):
+        """
+        Evaluates several leaf states at once, returning the same values as
+        calling the evaluator on each state.  The weights and the features'
+        scalar methods are looked up once per batch instead of once per
+        state.  (Scoring a NumPy feature matrix instead was measured at
+        0.6x the per-state speed: a last ply has only a handful of children.)
+        """
+        terms = [(feature.scalar, weight) for feature, weight in zip(self.features, self.weights)]
+        values = []
+        for gameState in gameStates:
+            data = gameState.data
+            if data._win or data._lose:
+                values.append(float(data.score))
+                continue
+            features = data._features
+            if features is None or features.evaluator is not self:
+                features = self.computeFeatures(gameState)
+            weighted = 0
+            for (scalar, weight), value in zip(terms, features.values):
+                weighted += weight * scalar(value)
+            values.append(float(data.score) + weighted)
+        return values
+
+# Your extreme ghost-hunting, pellet-nabbing, food-gobbling, unstoppable
+# evaluation function (question 5).
+#
+# DESCRIPTION: A linear combination of the game score with the number of
+# pellets and capsules left, the maze distance to the closest pellet and a
+# ghost term that pushes Pacman away from active ghosts within three steps
+# and towards scared ghosts he can still catch.  The features are maintained
+# incrementally (see IncrementalEvaluator), so a ghost move only refreshes
+# that ghost's distance and a Pacman move that eats nothing leaves the
+# pellet counts untouched.
+betterEvaluationFunction = IncrementalEvaluator([
+    (FoodCountFeature(), -10.0),
+    (CapsuleCountFeature(), -20.0),
+    (NearestFoodFeature(), -1.0),
+    (GhostFeature(), 60.0),
+])
 
 # Abbreviation
 better = betterEvaluationFunction
+
+# betterEvaluationFunction with the nearest-pellet distance replaced by the
+# moves needed to clear all the food (FoodClearanceFeature).  A state is
+# scored by the score it leads to if Pacman eats everything without meeting
+# a ghost: each pellet left is worth the 10 points eating it will bring,
+# and every move still needed costs one.  Unlike the nearest-pellet
+# distance, this tells a detour that leaves a pellet for later apart from
+# one that saves moves overall.
+clearanceEvaluationFunction = IncrementalEvaluator([
+    (FoodCountFeature(), 10.0),
+    (CapsuleCountFeature(), -20.0),
+    (FoodClearanceFeature(), -1.0),
+    (GhostFeature(), 60.0),
+])
+
+# Abbreviation
+clearance = clearanceEvaluationFunction
@@ -147,17 +147,36 @@ def run(lay, layName, pac, ghosts, disp, nGames=1, name='games'):
     """
     starttime = time.time()
     print('*** Running %s on' % name, layName, '%d time(s).' % nGames)
-    games = pacman.runGames(lay, pac, ghosts, disp,
-                            nGames, False, catchExceptions=True, timeout=120)
+    stats = playGames(lay, pac, ghosts, disp, nGames, 120)
     print('*** Finished running %s on' % name, layName,
           'after %d seconds.' % (time.time() - starttime))
-    stats = {'time': time.time() - starttime, 'wins': [g.state.isWin() for g in games].count(True), 'games': games, 'scores': [g.state.getScore() for g in games],
-             'timeouts': [g.agentTimeout for g in games].count(True), 'crashes': [g.agentCrashed for g in games].count(True)}
+    stats['time'] = time.time() - starttime
     print('*** Won %d out of %d games. Average score: %f ***' %
-          (stats['wins'], len(games), sum(stats['scores']) * 1.0 / len(games)))
+          (stats['wins'], len(stats['scores']), sum(stats['scores']) * 1.0 / len(stats['scores'])))
     return stats
 
 
+def playGames(lay, pac, ghosts, disp, nGames, timeout, sequentialTest=None):
+    """
+    Plays games through pacman.iterGames, folding each result into running
+    statistics as it arrives instead of keeping the finished games.  With a
+    pacman.SequentialTest, stops as soon as the test is settled.
+    """
+    running = pacman.RunningStats()
+    summaries = []
+    for summary in pacman.iterGames(lay, pac, ghosts, disp, nGames,
+                                    catchExceptions=True, timeout=timeout):
+        running.add(summary)
+        summaries.append(summary)
+        if sequentialTest is not None:
+            sequentialTest.add(summary)
+            if sequentialTest.isSettled():
+                break
+    pacman.printGameReport(summaries)
+    return {'wins': running.wins, 'scores': [summary.score for summary in summaries],
+            'timeouts': running.timeouts, 'crashes': running.crashes, 'stats': running}
+
+
 class GradingAgent(Agent):
     def __init__(self, seed, studentAgent, optimalActions, altDepthActions, partialPlyBugActions):
         # save student agent and actions of refernce agents
@@ -495,6 +514,24 @@ class EvalAgentTest(testClasses.TestCase):
         self.maxPoints = sum([len(t) for t in [
                              self.scoreThresholds, self.nonTimeoutThresholds, self.winsThresholds]])
         self.agentArgs = testDict.get('agentArgs', '')
+        # Set by the test file or autograder.py --early-stop
+        self.earlyStopConfidence = float(
+            testDict['earlyStopConfidence']) if 'earlyStopConfidence' in testDict else None
+
+    def getSequentialTest(self):
+        """
+        A test that stops the games once every minimum and threshold is
+        settled, or None when this test plays all its games.
+        """
+        if self.earlyStopConfidence is None:
+            return None
+        def cuts(minimum, thresholds):
+            return thresholds + ([minimum] if minimum is not None else [])
+        return pacman.SequentialTest(self.numGames,
+                                     cuts(self.scoreMinimum, self.scoreThresholds),
+                                     cuts(self.winsMinimum, self.winsThresholds),
+                                     cuts(self.nonTimeoutMinimum, self.nonTimeoutThresholds),
+                                     self.earlyStopConfidence)
 
     def execute(self, grades, moduleDict, solutionDict):
         startTime = time.time()
@@ -509,17 +546,20 @@ class EvalAgentTest(testClasses.TestCase):
         disp = self.question.getDisplay()
 
         random.seed(self.seed)
-        games = pacman.runGames(lay, agent, self.ghosts, disp, self.numGames,
-                                False, catchExceptions=True, timeout=self.maxTime)
+        sequentialTest = self.getSequentialTest()
+        stats = playGames(lay, agent, self.ghosts, disp, self.numGames, self.maxTime, sequentialTest)
         totalTime = time.time() - startTime
+        stats['time'] = totalTime
 
-        stats = {'time': totalTime, 'wins': [g.state.isWin() for g in games].count(True),
-                 'games': games, 'scores': [g.state.getScore() for g in games],
-                 'timeouts': [g.agentTimeout for g in games].count(True), 'crashes': [g.agentCrashed for g in games].count(True)}
-
-        averageScore = sum(stats['scores']) / float(len(stats['scores']))
+        averageScore = stats['stats'].mean
         nonTimeouts = self.numGames - stats['timeouts']
         wins = stats['wins']
+        if sequentialTest is not None and sequentialTest.getGamesSaved() > 0:
+            averageScore, wins, nonTimeouts = sequentialTest.getProjection()
+            self.addMessage("Settled after %d of %d games (%d saved at %s confidence); "
+                            "counts below are scaled to %d games" %
+                            (stats['stats'].count, self.numGames, sequentialTest.getGamesSaved(),
+                             self.earlyStopConfidence, self.numGames))
 
         def gradeThreshold(value, minimum, thresholds, name):
             points = 0
@@ -576,3 +616,2283 @@ class EvalAgentTest(testClasses.TestCase):
         handle.write('# File intentionally blank.\n')
         handle.close()
         return True
+
+
+class IncrementalEvaluationTest(testClasses.TestCase):
+    """
+    Checks that an incremental evaluation function (multiAgents.IncrementalEvaluator)
+    produces the same features when updated along a line of play as when the
+    features are computed from scratch, for every child generated on the way.
+    """
+
+    def __init__(self, question, testDict):
+        super(IncrementalEvaluationTest, self).__init__(question, testDict)
+        self.layoutName = testDict['layoutName']
+        self.evalFn = testDict['evalFn']
+        self.seed = int(testDict['randomSeed'])
+        self.numGames = int(testDict['numGames'])
+        self.maxMoves = int(testDict['maxMoves'])
+
+    def execute(self, grades, moduleDict, solutionDict):
+        multiAgents = moduleDict['multiAgents']
+        evaluator = getattr(multiAgents, self.evalFn)
+        if not isinstance(evaluator, multiAgents.IncrementalEvaluator):
+            self.addMessage('%s is not incremental, nothing to check' % self.evalFn)
+            return self.testPass(grades)
+
+        lay = layout.getLayout(self.layoutName, 3)
+        rand = random.Random(self.seed)
+        checked = 0
+        for game in range(self.numGames):
+            state = GameState()
+            state.initialize(lay, lay.getNumGhosts())
+            evaluator.attach(state)
+            agentIndex = 0
+            for move in range(self.maxMoves):
+                if state.isWin() or state.isLose():
+                    break
+                children = [state.getNextState(agentIndex, action)
+                            for action in state.getLegalActions(agentIndex)]
+                for child in children:
+                    incremental = child.data._features.values
+                    full = evaluator.computeFeatures(child).values
+                    if incremental != full:
+                        self.addMessage('Incremental and full features disagree after move %d of game %d' % (move, game))
+                        self.addMessage('State:\n%s' % child)
+                        self.addMessage('    Incremental: %s\n    Full:        %s' % (incremental, full))
+                        return self.testFail(grades)
+                    checked += 1
+                state = rand.choice(children)
+                agentIndex = (agentIndex + 1) % state.getNumAgents()
+        self.addMessage('Checked %d states' % checked)
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class EarlyStopTest(testClasses.TestCase):
+    """
+    Feeds pacman.SequentialTest a fixed sequence of game outcomes (W for a
+    win, L for a loss, T for a timed out loss) and checks after how many
+    games it is settled, that it stays settled from then on, and what it
+    projects the counts to.
+    """
+
+    def __init__(self, question, testDict):
+        super(EarlyStopTest, self).__init__(question, testDict)
+        self.numGames = int(testDict['numGames'])
+        self.outcomes = testDict['outcomes'].split()
+        self.winsThresholds = [int(s) for s in testDict.get('winsThresholds', '').split()]
+        self.nonTimeoutThresholds = [int(s) for s in testDict.get('nonTimeoutThresholds', '').split()]
+        self.confidence = float(testDict['confidence'])
+        self.settledAfter = int(testDict['settledAfter'])
+        self.projectedWins = int(testDict['projectedWins'])
+        self.projectedNonTimeouts = int(testDict['projectedNonTimeouts'])
+
+    def execute(self, grades, moduleDict, solutionDict):
+        sequentialTest = pacman.SequentialTest(self.numGames, (), self.winsThresholds,
+                                               self.nonTimeoutThresholds, self.confidence)
+        for count, outcome in enumerate(self.outcomes):
+            sequentialTest.add(pacman.GameSummary(count, 0, outcome == 'W', 0, outcome == 'T'))
+            settled = sequentialTest.isSettled()
+            if settled != (count + 1 >= self.settledAfter):
+                self.addMessage('After %d games (%s) the test is %ssettled; expected it to be settled from game %d on' %
+                                (count + 1, ' '.join(self.outcomes[:count + 1]), '' if settled else 'not ',
+                                 self.settledAfter))
+                return self.testFail(grades)
+            if count + 1 == self.settledAfter:
+                _, wins, nonTimeouts = sequentialTest.getProjection()
+                if (wins, nonTimeouts) != (self.projectedWins, self.projectedNonTimeouts):
+                    self.addMessage('Projected %d wins and %d games without a timeout; expected %d and %d' %
+                                    (wins, nonTimeouts, self.projectedWins, self.projectedNonTimeouts))
+                    return self.testFail(grades)
+        self.addMessage('Settled after %d of %d games' % (self.settledAfter, self.numGames))
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class InterruptedReader(object):
+    "A stream whose next readline is cut short, as a move timeout's SIGALRM would."
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.interrupted = False
+
+    def readline(self):
+        from util import TimeoutFunctionException
+        if not self.interrupted:
+            self.interrupted = True
+            raise TimeoutFunctionException()
+        return self.stream.readline()
+
+
+class RemoteAgentTest(testClasses.TestCase):
+    """
+    Plays games with a remoteAgents.RemoteAgent and a local agent of the same
+    type side by side and checks that they choose the same action every
+    turn.  In the first game, the requests on interruptTurns and the final
+    one are cut short after the message is sent; the remote agent has to
+    recover from each.
+    """
+
+    def __init__(self, question, testDict):
+        super(RemoteAgentTest, self).__init__(question, testDict)
+        self.layoutName = testDict['layoutName']
+        self.agentName = testDict['agentName']
+        self.agentArgs = testDict.get('agentArgs', '')
+        self.numGhosts = int(testDict['numGhosts'])
+        self.numGames = int(testDict['numGames'])
+        self.interruptTurns = [int(s) for s in testDict.get('interruptTurns', '').split()]
+        self.seed = int(testDict['randomSeed'])
+
+    def interrupt(self, remote, function, *args):
+        from util import TimeoutFunctionException
+        remote.process.stdout = InterruptedReader(remote.process.stdout)
+        try:
+            function(*args)
+        except TimeoutFunctionException:
+            return True
+        return False
+
+    def execute(self, grades, moduleDict, solutionDict):
+        import remoteAgents
+        agentOpts = pacman.parseAgentArgs(self.agentArgs) if self.agentArgs != '' else {}
+        local = getattr(moduleDict['multiAgents'], self.agentName)(**agentOpts)
+        remote = remoteAgents.RemoteAgent(agent=self.agentName, **agentOpts)
+        lay = layout.getLayout(self.layoutName, 3)
+        random.seed(self.seed)
+        turns = 0
+        try:
+            for game in range(self.numGames):
+                state = GameState()
+                state.initialize(lay, self.numGhosts)
+                ghosts = [RandomGhost(i + 1) for i in range(self.numGhosts)]
+                local.registerInitialState(state.deepCopy())
+                remote.registerInitialState(state.deepCopy())
+                agentIndex = 0
+                turn = 0
+                while not (state.isWin() or state.isLose()):
+                    if agentIndex == 0:
+                        if game == 0 and turn in self.interruptTurns:
+                            if not self.interrupt(remote, remote.getAction, state):
+                                self.addMessage('Turn %d of game %d was not interrupted' % (turn, game))
+                                return self.testFail(grades)
+                        expected = local.getAction(local.observationFunction(state.deepCopy()))
+                        action = remote.getAction(state)
+                        if action != expected:
+                            self.addMessage('Turn %d of game %d: the remote agent chose %s, the local one %s' %
+                                            (turn, game, action, expected))
+                            return self.testFail(grades)
+                        turn += 1
+                    else:
+                        action = ghosts[agentIndex - 1].getAction(state)
+                    state = state.getNextState(agentIndex, action)
+                    agentIndex = (agentIndex + 1) % state.getNumAgents()
+                if game == 0:
+                    self.interrupt(remote, remote.final, state)
+                else:
+                    remote.final(state)
+                turns += turn
+        finally:
+            remote.close()
+        self.addMessage('%d turns agreed over %d games' % (turns, self.numGames))
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class HeadlessGameTest(testClasses.TestCase):
+    """
+    Plays the same seeded games through Game.runHeadless and through the
+    classic loop of Game.run and checks that they make the same moves, and
+    that the agents leave no evaluation features on the states of the game
+    itself, which runHeadless hands to agents whose mutatesState is False.
+    """
+
+    def __init__(self, question, testDict):
+        super(HeadlessGameTest, self).__init__(question, testDict)
+        self.layoutName = testDict['layoutName']
+        self.agentName = testDict['agentName']
+        self.agentArgs = testDict.get('agentArgs', '')
+        self.numGhosts = int(testDict['numGhosts'])
+        self.numGames = int(testDict['numGames'])
+        self.seed = int(testDict['randomSeed'])
+
+    def playGame(self, moduleDict, lay, headless, gameIndex):
+        import textDisplay
+        agentOpts = pacman.parseAgentArgs(self.agentArgs) if self.agentArgs != '' else {}
+        agent = getattr(moduleDict['multiAgents'], self.agentName)(**agentOpts)
+        ghosts = [RandomGhost(i + 1) for i in range(self.numGhosts)]
+        random.seed(pacman.deriveGameSeed(self.seed, gameIndex))
+        game = pacman.ClassicGameRules().newGame(lay, agent, ghosts, textDisplay.NullGraphics(), True)
+        game.allowHeadless = headless
+        if headless and not game.canRunHeadless():
+            raise Exception('The game cannot take the headless loop')
+        game.run()
+        return game
+
+    def execute(self, grades, moduleDict, solutionDict):
+        lay = layout.getLayout(self.layoutName, 3)
+        for gameIndex in range(self.numGames):
+            headless = self.playGame(moduleDict, lay, True, gameIndex)
+            classic = self.playGame(moduleDict, lay, False, gameIndex)
+            if headless.state.data._features is not None:
+                self.addMessage('Game %d: the game state carries evaluation features after runHeadless' % gameIndex)
+                return self.testFail(grades)
+            if headless.moveHistory != classic.moveHistory:
+                moves = zip(headless.moveHistory, classic.moveHistory)
+                first = [i for i, (a, b) in enumerate(moves) if a != b]
+                self.addMessage('Game %d: runHeadless and run differ from move %d on' %
+                                (gameIndex, first[0] if first else len(classic.moveHistory)))
+                return self.testFail(grades)
+            self.addMessage('Game %d: %d moves, score %d either way' %
+                            (gameIndex, len(classic.moveHistory), classic.state.getScore()))
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class BatchEvaluationTest(testClasses.TestCase):
+    """
+    Checks that an evaluation function's evaluateBatch returns exactly what
+    calling it on each state does, for the children of every state along
+    random lines of play, with the features attached at the start of the
+    game and without.
+    """
+
+    def __init__(self, question, testDict):
+        super(BatchEvaluationTest, self).__init__(question, testDict)
+        self.layoutName = testDict['layoutName']
+        self.evalFn = testDict['evalFn']
+        self.seed = int(testDict['randomSeed'])
+        self.numGames = int(testDict['numGames'])
+        self.maxMoves = int(testDict['maxMoves'])
+
+    def execute(self, grades, moduleDict, solutionDict):
+        multiAgents = moduleDict['multiAgents']
+        evaluator = getattr(multiAgents, self.evalFn)
+        lay = layout.getLayout(self.layoutName, 3)
+        rand = random.Random(self.seed)
+        checked = 0
+        for game in range(self.numGames):
+            state = GameState()
+            state.initialize(lay, lay.getNumGhosts())
+            if game % 2 == 0 and isinstance(evaluator, multiAgents.IncrementalEvaluator):
+                evaluator.attach(state)
+            agentIndex = 0
+            for move in range(self.maxMoves):
+                if state.isWin() or state.isLose():
+                    break
+                children = [state.getNextState(agentIndex, action)
+                            for action in state.getLegalActions(agentIndex)]
+                batch = evaluator.evaluateBatch(children)
+                single = [evaluator(child) for child in children]
+                if batch != single:
+                    self.addMessage('evaluateBatch and single calls disagree after move %d of game %d' % (move, game))
+                    self.addMessage('    Batch:  %s\n    Single: %s' % (batch, single))
+                    return self.testFail(grades)
+                checked += len(children)
+                state = rand.choice(children)
+                agentIndex = (agentIndex + 1) % state.getNumAgents()
+        self.addMessage('Checked %d states' % checked)
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class LongMazeTest(testClasses.TestCase):
+    """
+    Builds a maze that is a single winding corridor, width wide with the
+    given number of rows, and checks the distances and nearest-cell queries
+    of its LayoutTables between the two ends.  With enough cells, indices
+    and distances no longer fit in 16 bits.
+    """
+
+    def __init__(self, question, testDict):
+        super(LongMazeTest, self).__init__(question, testDict)
+        self.width = int(testDict['width'])
+        self.rows = int(testDict['rows'])
+
+    def getLayoutText(self):
+        width = self.width
+        text = ['%' * width]
+        for row in range(self.rows):
+            text.append('%' + ' ' * (width - 2) + '%')
+            if row < self.rows - 1:
+                gap = width - 2 if row % 2 == 0 else 1
+                text.append(''.join([' ' if x == gap else '%' for x in range(width)]))
+        text.append('%' * width)
+        text[1] = '%P' + text[1][2:]
+        return text
+
+    def execute(self, grades, moduleDict, solutionDict):
+        import game
+        tables = layout.Layout(self.getLayoutText()).getTables()
+        numCells = len(tables.freeCells)
+        ends = [cell for cell in tables.freeCells if len(tables.getNeighbors(cell)) == 1]
+        start, end = ends
+        length = numCells - 1
+        distance = tables.getDistance(start, end)
+        if distance != length:
+            self.addMessage('The ends are %s apart; expected %d' % (distance, length))
+            return self.testFail(grades)
+        order, distances = tables.getBfsOrder(start)
+        if len(order) != numCells or distances[-1] != length or tables.freeCells[order[-1]] != end:
+            self.addMessage('The BFS order from %s does not end at %s, %d steps away' % (start, end, length))
+            return self.testFail(grades)
+        grid = game.Grid(tables.width, tables.height)
+        grid[end[0]][end[1]] = True
+        nearest = tables.findNearestInGrid(start, grid)
+        if nearest != (length, end):
+            self.addMessage('The nearest marked cell is %s; expected %s' % (nearest, (length, end)))
+            return self.testFail(grades)
+        self.addMessage('%d cells, %s arrays' % (numCells, tables.typecode))
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class SpatialIndexTest(testClasses.TestCase):
+    """
+    Checks layout.SpatialIndex and Layout.getNearestInGrid against a brute
+    force minimum of maze distances while random pellets are removed (and
+    now and then put back), and that loading a generated layout a second
+    time takes it from the registry instead of generating it again.
+    """
+
+    def __init__(self, question, testDict):
+        super(SpatialIndexTest, self).__init__(question, testDict)
+        self.layoutName = testDict['layoutName']
+        self.numSteps = int(testDict['numSteps'])
+        self.seed = int(testDict['randomSeed'])
+
+    def execute(self, grades, moduleDict, solutionDict):
+        lay = layout.getLayout(self.layoutName, 3)
+        if self.layoutName.startswith(layout.GENERATED_LAYOUT_PREFIX):
+            generate = layout.generateLayoutText
+            def regenerate(*args, **keys):
+                raise Exception('%s was generated again' % self.layoutName)
+            layout.generateLayoutText = regenerate
+            try:
+                again = layout.getLayout(self.layoutName)
+            except Exception as error:
+                self.addMessage(str(error))
+                return self.testFail(grades)
+            finally:
+                layout.generateLayoutText = generate
+            if again.getTables() is not lay.getTables():
+                self.addMessage('%s does not share the tables of its first load' % self.layoutName)
+                return self.testFail(grades)
+        rand = random.Random(self.seed)
+        cells = lay.getTables().freeCells
+        food = lay.food.copy()
+        members = set(food.asList())
+        index = layout.SpatialIndex(lay, members)
+        eaten = []
+        for step in range(self.numSteps):
+            if eaten and rand.random() < 0.1:
+                position = eaten.pop(rand.randrange(len(eaten)))
+                members.add(position)
+                index.add(position)
+                food[position[0]][position[1]] = True
+            elif members:
+                position = rand.choice(sorted(members))
+                members.remove(position)
+                index.remove(position)
+                food[position[0]][position[1]] = False
+                eaten.append(position)
+            source = rand.choice(cells)
+            distances = [lay.getMazeDistance(source, member) for member in members]
+            expected = min([d for d in distances if d is not None] or [None])
+            for name, (distance, position) in [('SpatialIndex', index.nearest(source)),
+                                               ('getNearestInGrid', lay.getNearestInGrid(source, food))]:
+                if distance != expected or (position is not None and
+                                            (position not in members or
+                                             lay.getMazeDistance(source, position) != distance)):
+                    self.addMessage('Step %d: %s found %s at %s from %s; the nearest pellet is %s away' %
+                                    (step, name, position, distance, source, expected))
+                    return self.testFail(grades)
+        self.addMessage('%d queries agreed' % self.numSteps)
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class ReplayCapture(object):
+    "A display that keeps the last state it was shown."
+
+    def initialize(self, state, isBlue=False):
+        self.data = state
+
+    def update(self, state):
+        self.data = state
+
+    def finish(self):
+        pass
+
+
+class RecordReplayTest(testClasses.TestCase):
+    """
+    Records seeded games to a record file, with numGhosts ghosts (possibly
+    fewer than the layout has), then replays each of them from the start and
+    from a keyframe part way through and checks that every replay ends in
+    the state the game itself ended in.  The same must hold once the file is
+    marked as version 2, whose (then pickled) keyframes are skipped.  Every
+    state of every game must survive a keyframe snapshot unchanged, and a
+    legacy pickle must only be replayed when that is asked for.
+    """
+
+    def __init__(self, question, testDict):
+        super(RecordReplayTest, self).__init__(question, testDict)
+        self.layoutName = testDict['layoutName']
+        self.numGhosts = int(testDict['numGhosts'])
+        self.numGames = int(testDict['numGames'])
+        self.seed = int(testDict['randomSeed'])
+
+    def describeState(self, state):
+        "Everything snapshotState has to keep."
+        data = state.data
+        agents = [(agent.start.pos, agent.start.direction, agent.configuration.pos,
+                   agent.configuration.direction, agent.isPacman, agent.scaredTimer,
+                   agent.numCarrying, agent.numReturned) for agent in data.agentStates]
+        return (agents, data._foodKey, data.food.asBitmask(), list(data.capsules), data.score,
+                list(data._eaten), data._win, data._lose)
+
+    def checkSnapshots(self, lay, game):
+        "Returns a description of the first state the snapshot changes, or None."
+        import gameRecord
+        state = GameState()
+        state.initialize(lay, self.numGhosts)
+        for move, (agentIndex, action) in enumerate([(None, None)] + game.moveHistory):
+            if agentIndex is not None:
+                state = state.getNextState(agentIndex, action)
+            restored = gameRecord.restoreState(lay, gameRecord.snapshotState(state))
+            if self.describeState(restored) != self.describeState(state):
+                return 'State after move %d restored from its snapshot as\n%s\ninstead of\n%s' % (
+                    move, self.describeState(restored), self.describeState(state))
+        return None
+
+    def replay(self, path, gameIndex, firstMove, game):
+        "Returns whether replaying game from firstMove ends as it was played."
+        recorded = pacman.loadRecordedGame(path, gameIndex, firstMove)
+        display = ReplayCapture()
+        recorded['display'] = display
+        pacman.replayGame(**recorded)
+        if display.data != game.state.data:
+            self.addMessage('Played:\n%s\nReplayed:\n%s' % (game.state.data, display.data))
+            return False
+        return True
+
+    def execute(self, grades, moduleDict, solutionDict):
+        import gameRecord
+        import pacmanAgents
+        import pickle
+        import shutil
+        import tempfile
+        import textDisplay
+        lay = layout.getLayout(self.layoutName, 3)
+        ghosts = [RandomGhost(i + 1) for i in range(self.numGhosts)]
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'games.rec')
+        try:
+            games = [summary.game for summary in pacman.iterGames(
+                lay, pacmanAgents.GreedyAgent(), ghosts, textDisplay.NullGraphics(), self.numGames,
+                record=path, seed=self.seed, keepGames=True, quiet=True)]
+            oldPath = os.path.join(directory, 'old.rec')
+            with open(path, 'rb') as f:
+                contents = bytearray(f.read())
+            contents[len(gameRecord.RECORD_MAGIC)] = 2
+            with open(oldPath, 'wb') as f:
+                f.write(contents)
+            for gameIndex, game in enumerate(games):
+                numMoves = len(game.moveHistory)
+                for recordPath in [path, oldPath]:
+                    for firstMove in [0, numMoves // 2]:
+                        if not self.replay(recordPath, gameIndex, firstMove, game):
+                            self.addMessage('Game %d of %s replayed from move %d of %d does not end as it was played' %
+                                            (gameIndex, os.path.basename(recordPath), firstMove, numMoves))
+                            return self.testFail(grades)
+                difference = self.checkSnapshots(lay, game)
+                if difference is not None:
+                    self.addMessage('Game %d: %s' % (gameIndex, difference))
+                    return self.testFail(grades)
+                self.addMessage('Game %d: %d moves with %d ghosts replayed' % (gameIndex, numMoves, self.numGhosts))
+
+            legacyPath = os.path.join(directory, 'game.pickle')
+            with open(legacyPath, 'wb') as f:
+                pickle.dump({'layout': lay, 'actions': games[0].moveHistory}, f)
+            try:
+                pacman.loadRecordedGame(legacyPath)
+                self.addMessage('A legacy pickle was loaded without allowPickle')
+                return self.testFail(grades)
+            except Exception as error:
+                if 'not a game record' not in str(error):
+                    raise
+            if pacman.loadRecordedGame(legacyPath, allowPickle=True)['actions'] != games[0].moveHistory:
+                self.addMessage('The legacy pickle did not load with allowPickle')
+                return self.testFail(grades)
+        finally:
+            shutil.rmtree(directory)
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class StreamingStatsTest(testClasses.TestCase):
+    """
+    Plays the same seeded games through pacman.runGames twice, keeping the
+    games and not, and checks that the streamed RunningStats agree with the
+    kept games (mean and variance against the statistics module) and that
+    nothing of the games is held on to when they are not kept.
+    """
+
+    def __init__(self, question, testDict):
+        super(StreamingStatsTest, self).__init__(question, testDict)
+        self.layoutName = testDict['layoutName']
+        self.numGhosts = int(testDict['numGhosts'])
+        self.numGames = int(testDict['numGames'])
+        self.seed = int(testDict['randomSeed'])
+
+    def execute(self, grades, moduleDict, solutionDict):
+        import pacmanAgents
+        import statistics
+        import textDisplay
+        lay = layout.getLayout(self.layoutName, 3)
+        ghosts = [RandomGhost(i + 1) for i in range(self.numGhosts)]
+        def play(keepGames):
+            return pacman.runGames(lay, pacmanAgents.GreedyAgent(), ghosts, textDisplay.NullGraphics(),
+                                   self.numGames, False, seed=self.seed, keepGames=keepGames)
+        games = play(True)
+        stats = play(False)
+        if not isinstance(stats, pacman.RunningStats):
+            self.addMessage('runGames returned %s instead of RunningStats' % type(stats).__name__)
+            return self.testFail(grades)
+        scores = [game.state.getScore() for game in games]
+        wins = [game.state.isWin() for game in games].count(True)
+        expected = (len(games), wins, statistics.mean(scores), statistics.variance(scores))
+        actual = (stats.count, stats.wins, stats.mean, stats.getVariance())
+        if actual[:2] != expected[:2] or abs(actual[2] - expected[2]) > 1e-6 or \
+                abs(actual[3] - expected[3]) > 1e-6 * max(1.0, expected[3]):
+            self.addMessage('Streamed games, wins, mean and variance %s; the kept games give %s' %
+                            (actual, expected))
+            return self.testFail(grades)
+        held = [summary for summary in pacman.iterGames(lay, pacmanAgents.GreedyAgent(), ghosts,
+                                                        textDisplay.NullGraphics(), 2, quiet=True)
+                if summary.game is not None]
+        if held:
+            self.addMessage('iterGames kept %d games it was not asked to keep' % len(held))
+            return self.testFail(grades)
+        self.addMessage('%d games: mean %.1f, variance %.1f either way' % (stats.count, stats.mean,
+                                                                         stats.getVariance()))
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class EvaluatorDecisionTest(testClasses.TestCase):
+    """
+    Asks agentName for its move from the start of a small layout with each
+    of several evaluation functions and checks each move against the one
+    expected of it.
+    """
+
+    def __init__(self, question, testDict):
+        super(EvaluatorDecisionTest, self).__init__(question, testDict)
+        self.layoutText = testDict['layout']
+        self.agentName = testDict['agentName']
+        self.depth = testDict['depth']
+        self.evalFns = testDict['evalFns'].split()
+        self.actions = testDict['actions'].split()
+
+    def execute(self, grades, moduleDict, solutionDict):
+        lay = layout.Layout([l.strip() for l in self.layoutText.split('\n') if l.strip()])
+        state = GameState()
+        state.initialize(lay, lay.getNumGhosts())
+        agentType = getattr(moduleDict['multiAgents'], self.agentName)
+        failed = False
+        for evalFn, expected in zip(self.evalFns, self.actions):
+            agent = agentType(evalFn=evalFn, depth=self.depth)
+            action = agent.getAction(agent.observationFunction(state.deepCopy()))
+            self.addMessage('%s: %s (expected %s)' % (evalFn, action, expected))
+            failed = failed or action != expected
+        if failed:
+            return self.testFail(grades)
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class FoodPlannerCacheTest(testClasses.TestCase):
+    """
+    Fills a foodPlanner.FoodClearancePlanner past a small MAX_SUMMARIES
+    while one food set keeps being asked for, and checks that the least
+    recently used summaries are the ones dropped.
+    """
+
+    def __init__(self, question, testDict):
+        super(FoodPlannerCacheTest, self).__init__(question, testDict)
+        self.layoutName = testDict['layoutName']
+        self.maxSummaries = int(testDict['maxSummaries'])
+
+    def execute(self, grades, moduleDict, solutionDict):
+        import foodPlanner
+        lay = layout.getLayout(self.layoutName, 3)
+        planner = foodPlanner.FoodClearancePlanner(lay)
+        start = GameState()
+        start.initialize(lay, 0)
+        fullKey = start.data._foodKey
+        bits = []
+        key = fullKey
+        while key:
+            low = key & -key
+            bits.append(low)
+            key ^= low
+        keys = [fullKey ^ bit for bit in bits[:3 * self.maxSummaries]]
+        saved = foodPlanner.MAX_SUMMARIES
+        foodPlanner.MAX_SUMMARIES = self.maxSummaries
+        try:
+            for key in keys:
+                planner.getSummary(fullKey)
+                planner.getSummary(key)
+        finally:
+            foodPlanner.MAX_SUMMARIES = saved
+        expected = [fullKey] + keys[-(self.maxSummaries - 1):]
+        if sorted(planner.summaries) != sorted(expected) or fullKey not in planner.summaries:
+            self.addMessage('Kept %d summaries, %s the one in constant use' %
+                            (len(planner.summaries), 'with' if fullKey in planner.summaries else 'without'))
+            return self.testFail(grades)
+        self.addMessage('%d summaries kept, %d evicted' % (len(planner.summaries), planner.evictions))
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class JunctionGraphTest(testClasses.TestCase):
+    """
+    Checks the JunctionGraph of each layout in layoutNames against the maze
+    it was built from: the nodes are exactly the cells without two open
+    neighbours, every corridor is a walk through corridor cells from a node
+    to a node, every corridor cell is walked once in each direction and
+    getPath from inside a corridor follows the rest of it.  Then asks
+    agentName for its move from the start of layout at the same depth with
+    and without macro and checks each move against the one expected of it.
+    """
+
+    def __init__(self, question, testDict):
+        super(JunctionGraphTest, self).__init__(question, testDict)
+        self.layoutNames = testDict['layoutNames'].split()
+        self.layoutText = testDict['layout']
+        self.agentName = testDict['agentName']
+        self.depth = testDict['depth']
+        self.actions = testDict['actions'].split()
+
+    def checkGraph(self, lay):
+        from game import Actions
+        graph = lay.getJunctionGraph()
+        neighbors = lay.getTables().neighbors
+        cells = [cell for cell in neighbors]
+        nodes = set([cell for cell in cells if len(neighbors[cell]) != 2])
+        if set(graph.nodes) != nodes:
+            return 'nodes %s are not the cells without two open neighbours' % sorted(set(graph.nodes) ^ nodes)
+        walked = defaultdict(int)
+        for node in graph.nodes:
+            corridors = graph.getCorridors(node)
+            if sorted([corridor.cells[0] for corridor in corridors]) != sorted(neighbors[node]):
+                return 'the corridors leaving %s do not start on its neighbours' % (node,)
+            for corridor in corridors:
+                previous = node
+                for cell, action in zip(corridor.cells, corridor.actions):
+                    dx, dy = Actions.directionToVector(action)
+                    if cell not in neighbors[previous] or (previous[0] + dx, previous[1] + dy) != cell:
+                        return 'corridor from %s steps from %s to %s by %s' % (node, previous, cell, action)
+                    previous = cell
+                inner = corridor.cells[:-1]
+                if [cell for cell in inner if cell in nodes] or len(set(corridor.cells)) != corridor.length:
+                    return 'corridor from %s passes a node or a cell twice: %s' % (node, corridor.cells)
+                if corridor.end not in nodes and corridor.end != node:
+                    return 'corridor from %s ends inside a corridor at %s' % (node, corridor.end)
+                if corridor.food != [cell for cell in corridor.cells if lay.food[cell[0]][cell[1]]]:
+                    return 'corridor from %s lists food %s' % (node, corridor.food)
+                for cell in inner:
+                    walked[cell] += 1
+                if len(inner) > 1:
+                    middle = corridor.cells[0]
+                    rest = graph.getPath(middle, corridor.actions[1])
+                    if rest is None or rest.cells != corridor.cells[1:]:
+                        return 'getPath from %s does not follow the corridor from %s' % (middle, node)
+        corridorCells = [cell for cell in cells if cell not in nodes]
+        badly = [cell for cell in corridorCells if walked[cell] != 2]
+        if badly:
+            return 'corridor cells walked other than twice: %s' % badly[:5]
+        return None
+
+    def execute(self, grades, moduleDict, solutionDict):
+        for layoutName in self.layoutNames:
+            lay = layout.getLayout(layoutName, 3)
+            problem = self.checkGraph(lay)
+            if problem is not None:
+                self.addMessage('%s: %s' % (layoutName, problem))
+                return self.testFail(grades)
+            graph = lay.getJunctionGraph()
+            self.addMessage('%s: %d nodes, %d corridors' % (
+                layoutName, len(graph.nodes), sum([len(graph.getCorridors(node)) for node in graph.nodes])))
+        lay = layout.Layout([l.strip() for l in self.layoutText.split('\n') if l.strip()])
+        state = GameState()
+        state.initialize(lay, lay.getNumGhosts())
+        agentType = getattr(moduleDict['multiAgents'], self.agentName)
+        failed = False
+        for macro, expected in zip(['0', '1'], self.actions):
+            agent = agentType(depth=self.depth, macro=macro)
+            action = agent.getAction(agent.observationFunction(state.deepCopy()))
+            self.addMessage('macro=%s: %s (expected %s)' % (macro, action, expected))
+            failed = failed or action != expected
+        if failed:
+            return self.testFail(grades)
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class GeneratedLayoutTest(testClasses.TestCase):
+    """
+    Generates mazes of each size in sizes for several seeds and corridor
+    densities and checks them against the text alone: walled in, connected,
+    a tree when corridorDensity is 0, one Pacman, the asked-for capsules and
+    ghosts with every ghost in the farther half of the maze from Pacman, and
+    the same text for the same seed.  getLayout('generated:...') must give
+    the same maze.
+    """
+
+    def __init__(self, question, testDict):
+        super(GeneratedLayoutTest, self).__init__(question, testDict)
+        self.sizes = [[int(n) for n in size.split('x')] for size in testDict['sizes'].split()]
+        self.seeds = [int(seed) for seed in testDict['seeds'].split()]
+        self.densities = [float(density) for density in testDict['corridorDensities'].split()]
+        self.numGhosts = int(testDict['numGhosts'])
+        self.numCapsules = int(testDict['numCapsules'])
+
+    def checkText(self, text, width, height, density):
+        if len(text) != height or [row for row in text if len(row) != width]:
+            return 'is not %dx%d' % (width, height)
+        if text[0] != '%' * width or text[-1] != '%' * width or \
+                [row for row in text if row[0] != '%' or row[-1] != '%']:
+            return 'is not walled in'
+        cells = dict(((x, y), text[y][x]) for y in range(height) for x in range(width) if text[y][x] != '%')
+        symbols = ''.join(cells.values())
+        if symbols.count('P') != 1 or symbols.count('G') != self.numGhosts or \
+                symbols.count('o') != self.numCapsules:
+            return 'has %d Pacman, %d ghosts and %d capsules' % (
+                symbols.count('P'), symbols.count('G'), symbols.count('o'))
+        pacman = [cell for cell in cells if cells[cell] == 'P'][0]
+        distances = {pacman: 0}
+        frontier = [pacman]
+        edges = 0
+        for x, y in frontier:
+            for neighbor in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                if neighbor in cells:
+                    edges += 1
+                    if neighbor not in distances:
+                        distances[neighbor] = distances[(x, y)] + 1
+                        frontier.append(neighbor)
+        if len(distances) != len(cells):
+            return 'leaves %d of %d open cells unreachable' % (len(cells) - len(distances), len(cells))
+        if density == 0 and edges // 2 != len(cells) - 1:
+            return 'has loops with corridorDensity 0'
+        median = sorted(distances.values())[len(distances) // 2]
+        near = [cell for cell in cells if cells[cell] == 'G' and distances[cell] < median]
+        if near:
+            return 'has ghosts %s nearer Pacman than the median distance %d' % (near, median)
+        return None
+
+    def execute(self, grades, moduleDict, solutionDict):
+        for width, height in self.sizes:
+            for density in self.densities:
+                texts = []
+                for seed in self.seeds:
+                    options = {'corridorDensity': density, 'numGhosts': self.numGhosts,
+                               'numCapsules': self.numCapsules}
+                    text = layout.generateLayoutText(width, height, seed, **options)
+                    problem = self.checkText(text, width, height, density)
+                    if problem is None and layout.generateLayoutText(width, height, seed, **options) != text:
+                        problem = 'differs when generated again'
+                    if problem is not None:
+                        self.addMessage('%dx%d seed %d density %.1f %s:\n%s' % (
+                            width, height, seed, density, problem, '\n'.join(text)))
+                        return self.testFail(grades)
+                    texts.append(text)
+                if len(set(['\n'.join(text) for text in texts])) == 1 and len(texts) > 1:
+                    self.addMessage('%dx%d density %.1f: every seed gives the same maze' % (width, height, density))
+                    return self.testFail(grades)
+            self.addMessage('%dx%d: %d mazes' % (width, height, len(self.seeds) * len(self.densities)))
+        width, height = self.sizes[0]
+        seed = self.seeds[-1]
+        named = layout.getLayout('%s%dx%d:%d' % (layout.GENERATED_LAYOUT_PREFIX, width, height, seed))
+        generated = layout.generateLayout(width, height, seed)
+        if named is None or named.walls != generated.walls or named.food != generated.food or \
+                named.agentPositions != generated.agentPositions:
+            self.addMessage('getLayout does not give the maze generateLayout does for %dx%d seed %d' %
+                            (width, height, seed))
+            return self.testFail(grades)
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class MazeStructureTest(testClasses.TestCase):
+    """
+    Checks the MazeStructure of each layout in layoutNames cell by cell
+    against brute force: articulation points by removing each cell and
+    counting what stays reachable, dead-end depth by repeatedly deleting
+    cells with at most one neighbour and searching from what is left,
+    junction distance by a search from every cell and tunnels by grouping
+    adjacent non-junction cells.
+    """
+
+    def __init__(self, question, testDict):
+        super(MazeStructureTest, self).__init__(question, testDict)
+        self.layoutNames = testDict['layoutNames'].split()
+
+    def reachable(self, neighbors, start, removed=None):
+        seen = set([start])
+        frontier = [start]
+        for cell in frontier:
+            for neighbor in neighbors[cell]:
+                if neighbor != removed and neighbor not in seen:
+                    seen.add(neighbor)
+                    frontier.append(neighbor)
+        return seen
+
+    def distancesFrom(self, neighbors, sources):
+        distances = dict((cell, 0) for cell in sources)
+        frontier = list(sources)
+        for cell in frontier:
+            for neighbor in neighbors[cell]:
+                if neighbor not in distances:
+                    distances[neighbor] = distances[cell] + 1
+                    frontier.append(neighbor)
+        return distances
+
+    def checkStructure(self, lay):
+        tables = lay.getTables()
+        structure = lay.getStructure()
+        neighbors = tables.neighbors
+        cells = list(tables.freeCells)
+        for cell in cells:
+            others = [other for other in cells if other != cell]
+            cut = len(self.reachable(neighbors, others[0], cell)) < len(others) if others else False
+            if cut != structure.isArticulationPoint(cell):
+                return '%s is%s an articulation point' % (cell, ' not' if cut else '')
+
+        core = set(cells)
+        while True:
+            leaves = [cell for cell in core if len([n for n in neighbors[cell] if n in core]) <= 1]
+            if not leaves:
+                break
+            core -= set(leaves)
+        if core:
+            depths = self.distancesFrom(neighbors, sorted(core))
+            wrong = [cell for cell in cells if structure.getDeadEndDepth(cell) != depths[cell]]
+            if wrong:
+                return 'dead-end depth at %s is %s, not %d' % (
+                    wrong[0], structure.getDeadEndDepth(wrong[0]), depths[wrong[0]])
+
+        junctions = set([cell for cell in cells if len(neighbors[cell]) >= 3])
+        for cell in cells:
+            distances = self.distancesFrom(neighbors, [cell])
+            nearest = min([distances[junction] for junction in junctions if junction in distances] or
+                          [tables.unreachable])
+            if structure.getJunctionDistance(cell) != nearest:
+                return 'junction distance at %s is %s, not %d' % (cell, structure.getJunctionDistance(cell), nearest)
+
+        tunnels = {}
+        for cell in cells:
+            tunnelId = structure.getTunnelId(cell)
+            if (tunnelId == -1) != (cell in junctions):
+                return '%s has tunnel id %d' % (cell, tunnelId)
+            if tunnelId != -1:
+                tunnels.setdefault(tunnelId, set()).add(cell)
+        corridors = dict((cell, [n for n in neighbors[cell] if n not in junctions])
+                         for cell in cells if cell not in junctions)
+        for tunnelId, members in tunnels.items():
+            if self.reachable(corridors, sorted(members)[0]) != members:
+                return 'tunnel %d is not a connected group of corridor cells' % tunnelId
+            exits = set([n for cell in members for n in neighbors[cell] if n in junctions])
+            if set(structure.getTunnelExits(tunnelId)) != exits or \
+                    len(structure.getTunnelExits(tunnelId)) != len(exits):
+                return 'tunnel %d exits onto %s, not %s' % (tunnelId, structure.getTunnelExits(tunnelId),
+                                                            sorted(exits))
+        if structure.getTunnelId((0, 0)) is not None or structure.getDeadEndDepth((0.5, 1)) is not None:
+            return 'answers for walls or positions between cells'
+        return None
+
+    def execute(self, grades, moduleDict, solutionDict):
+        for layoutName in self.layoutNames:
+            lay = layout.getLayout(layoutName, 3)
+            problem = self.checkStructure(lay)
+            if problem is not None:
+                self.addMessage('%s: %s' % (layoutName, problem))
+                return self.testFail(grades)
+            structure = lay.getStructure()
+            self.addMessage('%s: %d articulation points, %d tunnels' % (
+                layoutName, len(structure.articulationPoints), len(structure.tunnelExits)))
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class FreeCellSamplingTest(testClasses.TestCase):
+    """
+    Samples random positions and corners from each layout in layoutNames
+    with a seeded random.Random and checks that every sample is an open
+    cell, that every open cell turns up, that the same seed gives the same
+    samples, that each corner is the open cell nearest its corner of the
+    board and that getFurthestCorner agrees with a search from every cell.
+    """
+
+    def __init__(self, question, testDict):
+        super(FreeCellSamplingTest, self).__init__(question, testDict)
+        self.layoutNames = testDict['layoutNames'].split()
+        self.samplesPerCell = int(testDict['samplesPerCell'])
+        self.seed = int(testDict['randomSeed'])
+
+    def checkLayout(self, lay):
+        from util import manhattanDistance
+        width, height = lay.width, lay.height
+        openCells = [(x, y) for x in range(width) for y in range(height) if not lay.walls[x][y]]
+        numSamples = self.samplesPerCell * len(openCells)
+        rand = random.Random(self.seed)
+        samples = [lay.getRandomLegalPosition(rand) for i in range(numSamples)]
+        again = random.Random(self.seed)
+        if [lay.getRandomLegalPosition(again) for i in range(numSamples)] != samples:
+            return 'the same seed gives different positions'
+        walls = [pos for pos in samples if lay.isWall(pos)]
+        if walls:
+            return 'sampled walls %s' % walls[:5]
+        missed = set(openCells) - set(samples)
+        if missed:
+            return '%d of %d open cells never sampled in %d draws' % (len(missed), len(openCells), numSamples)
+
+        expected = []
+        for corner in [(1, 1), (1, height - 2), (width - 2, 1), (width - 2, height - 2)]:
+            nearest = min(openCells, key=lambda cell: (manhattanDistance(cell, corner), cell))
+            if nearest not in expected:
+                expected.append(nearest)
+        corners = lay.getTables().getCorners()
+        if corners != expected:
+            return 'corners %s, not %s' % (corners, expected)
+        rand = random.Random(self.seed)
+        drawn = set([lay.getRandomCorner(rand) for i in range(self.samplesPerCell * len(corners))])
+        if drawn != set(corners):
+            return 'getRandomCorner drew %s' % sorted(drawn)
+
+        distances = {}
+        for corner in corners:
+            row = {corner: 0}
+            frontier = [corner]
+            for x, y in frontier:
+                for neighbor in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                    if neighbor in row or lay.isWall(neighbor):
+                        continue
+                    row[neighbor] = row[(x, y)] + 1
+                    frontier.append(neighbor)
+            distances[corner] = row
+        for cell in openCells:
+            furthest = lay.getFurthestCorner(cell)
+            farthest = max([distances[corner].get(cell, -1) for corner in corners])
+            if distances[furthest].get(cell, -1) != farthest:
+                return 'the furthest corner from %s is %d away, %s is %d away' % (
+                    cell, farthest, furthest, distances[furthest].get(cell, -1))
+        return None
+
+    def execute(self, grades, moduleDict, solutionDict):
+        for layoutName in self.layoutNames:
+            lay = layout.getLayout(layoutName, 3)
+            problem = self.checkLayout(lay)
+            if problem is not None:
+                self.addMessage('%s: %s' % (layoutName, problem))
+                return self.testFail(grades)
+            self.addMessage('%s: corners %s' % (layoutName, lay.getTables().getCorners()))
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class SymmetryTest(testClasses.TestCase):
+    """
+    Mirrors the text of each layout in layoutNames (ghosts numbered so they
+    keep their indices) and checks that getSymmetries reports exactly the
+    mirrors that leave the walls unchanged.  For each of those, plays
+    seeded random moves on the layout and the mirrored moves on its mirror
+    image and checks that the two games share a canonical key after every
+    move, and that mapDirection takes every legal move to a legal one.
+    """
+
+    def __init__(self, question, testDict):
+        super(SymmetryTest, self).__init__(question, testDict)
+        self.layoutNames = testDict['layoutNames'].split()
+        self.numMoves = int(testDict['numMoves'])
+        self.seed = int(testDict['randomSeed'])
+
+    def mirrorText(self, text, flipX, flipY):
+        rows = [row[::-1] if flipX else row for row in text]
+        return rows[::-1] if flipY else rows
+
+    def playMirrored(self, lay, mirrored, symmetry):
+        state = GameState()
+        state.initialize(lay, lay.getNumGhosts())
+        image = GameState()
+        image.initialize(mirrored, mirrored.getNumGhosts())
+        rand = random.Random(self.seed)
+        for move in range(self.numMoves):
+            for agentIndex in range(state.getNumAgents()):
+                if state.getCanonicalKey()[0] != image.getCanonicalKey()[0]:
+                    return 'canonical keys differ after %d moves:\n%s\n%s' % (move, state, image)
+                if state.isWin() or state.isLose():
+                    return None
+                legal = state.getLegalActions(agentIndex)
+                mirroredLegal = image.getLegalActions(agentIndex)
+                if sorted([symmetry.mapDirection(action) for action in legal]) != sorted(mirroredLegal):
+                    return 'agent %d may move %s, in the mirror %s' % (agentIndex, legal, mirroredLegal)
+                action = rand.choice(legal)
+                state = state.getNextState(agentIndex, action)
+                image = image.getNextState(agentIndex, symmetry.mapDirection(action))
+        return None
+
+    def execute(self, grades, moduleDict, solutionDict):
+        for layoutName in self.layoutNames:
+            text = layout.getLayout(layoutName, 3).layoutText
+            numbered = []
+            ghosts = 0
+            for row in text:
+                cells = list(row)
+                for x, cell in enumerate(cells):
+                    if cell == 'G':
+                        ghosts += 1
+                        cells[x] = str(ghosts)
+                numbered.append(''.join(cells))
+            lay = layout.Layout(numbered)
+            expected = []
+            for flipX, flipY in [(True, False), (False, True), (True, True)]:
+                mirrored = layout.Layout(self.mirrorText(numbered, flipX, flipY))
+                if mirrored.walls == lay.walls:
+                    expected.append(layout.Symmetry(lay.width, lay.height, flipX, flipY).name)
+            found = [symmetry.name for symmetry in lay.getSymmetries()]
+            if found != expected:
+                self.addMessage('%s: symmetries %s, not %s' % (layoutName, found, expected))
+                return self.testFail(grades)
+            for symmetry in lay.getSymmetries():
+                mirrored = layout.Layout(self.mirrorText(numbered, symmetry.flipX, symmetry.flipY))
+                problem = self.playMirrored(lay, mirrored, symmetry)
+                if problem is not None:
+                    self.addMessage('%s under the %s mirror: %s' % (layoutName, symmetry.name, problem))
+                    return self.testFail(grades)
+            self.addMessage('%s: %s' % (layoutName, ', '.join(found) or 'no symmetries'))
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class TablebaseTest(testClasses.TestCase):
+    """
+    Solves a tablebase for each of layoutName and layout under both ghost
+    models, writes it to a temporary file and reads it back.  Every
+    reachable position with Pacman to move must be in the table.  Under
+    minimax its value must match a depth-limited minimax search of
+    searchPlies plies whenever that search sees the game end; under both
+    models the value must be the best one-move backup through the table and
+    the stored action must achieve it.
+    """
+
+    def __init__(self, question, testDict):
+        super(TablebaseTest, self).__init__(question, testDict)
+        self.layoutName = testDict['layoutName']
+        self.layoutText = testDict['layout']
+        self.searchPlies = int(testDict['searchPlies'])
+
+    def minimax(self, gameState, agentIndex, plies, memo):
+        import tablebase
+        if gameState.isWin() or gameState.isLose():
+            return 0.0
+        if plies == 0:
+            return float('-inf')
+        key = (agentIndex, tablebase.getStateKey(gameState), plies)
+        if key not in memo:
+            nextAgent = (agentIndex + 1) % gameState.getNumAgents()
+            values = []
+            for action in gameState.getLegalActions(agentIndex):
+                child = gameState.getNextState(agentIndex, action)
+                values.append(child.getScore() - gameState.getScore() +
+                              self.minimax(child, nextAgent, plies - 1, memo))
+            memo[key] = max(values) if agentIndex == 0 else min(values)
+        return memo[key]
+
+    def getPacmanStates(self, start):
+        import tablebase
+        seen = set([(0, tablebase.getStateKey(start))])
+        frontier = [(start, 0)]
+        states = []
+        for gameState, agentIndex in frontier:
+            if gameState.isWin() or gameState.isLose():
+                continue
+            if agentIndex == 0:
+                states.append(gameState)
+            nextAgent = (agentIndex + 1) % gameState.getNumAgents()
+            for action in gameState.getLegalActions(agentIndex):
+                child = gameState.getNextState(agentIndex, action)
+                key = (nextAgent, tablebase.getStateKey(child))
+                if key not in seen:
+                    seen.add(key)
+                    frontier.append((child, nextAgent))
+        return states
+
+    def checkTable(self, table, lay, model):
+        start = GameState()
+        start.initialize(lay, lay.getNumGhosts())
+        memo = {}
+        checked = 0
+        for gameState in self.getPacmanStates(start):
+            entry = table.lookup(gameState)
+            if entry is None:
+                return 'a reachable position is missing:\n%s' % gameState
+            value, action = entry
+            if model == 'minimax':
+                searched = self.minimax(gameState, 0, self.searchPlies, memo)
+                if searched != float('-inf'):
+                    checked += 1
+                    if abs(searched - value) > 1e-6:
+                        return 'the table says %s, minimax %s:\n%s' % (value, searched, gameState)
+            backups = dict((a, table.getActionValue(gameState, a)) for a in gameState.getLegalActions(0))
+            best = max(backups.values())
+            if abs(best - value) > 1e-6 and not (best == value == float('-inf')):
+                return 'the table says %s, its own backups %s:\n%s' % (value, backups, gameState)
+            if backups[action] != best and abs(backups[action] - best) > 1e-6:
+                return 'the stored move %s is worth %s, not %s:\n%s' % (action, backups[action], best, gameState)
+        if model == 'minimax' and checked == 0:
+            return 'minimax saw no game end within %d plies' % self.searchPlies
+        return None
+
+    def execute(self, grades, moduleDict, solutionDict):
+        import shutil
+        import tablebase
+        import tempfile
+        layouts = [(self.layoutName, layout.getLayout(self.layoutName, 3)),
+                   ('layout', layout.Layout([l.strip() for l in self.layoutText.split('\n') if l.strip()]))]
+        directory = tempfile.mkdtemp()
+        try:
+            for name, lay in layouts:
+                for model in tablebase.TABLEBASE_MODELS:
+                    solver = tablebase.TablebaseSolver(lay, lay.getNumGhosts(), model)
+                    startValue = solver.solve()
+                    path = os.path.join(directory, '%s-%s.tb' % (name, model))
+                    solver.write(path)
+                    table = tablebase.Tablebase(path)
+                    try:
+                        problem = self.checkTable(table, lay, model)
+                        other = [other for otherName, other in layouts if otherName != name][0]
+                        otherStart = GameState()
+                        otherStart.initialize(other, other.getNumGhosts())
+                        if problem is None and table.lookup(otherStart) is not None:
+                            problem = 'answers for a position on another layout'
+                    finally:
+                        table.close()
+                    if problem is not None:
+                        self.addMessage('%s, %s: %s' % (name, model, problem))
+                        return self.testFail(grades)
+                    self.addMessage('%s, %s: %d states, start worth %s' % (
+                        name, model, solver.numStates, startValue))
+        finally:
+            shutil.rmtree(directory)
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class ParallelSeedTest(testClasses.TestCase):
+    """
+    Plays the same seeded games through pacman.iterGames on one process and
+    on each worker count in workerCounts and checks that every game gets the
+    same score, result and length however many processes play them, and
+    that another master seed plays different games.
+    """
+
+    def __init__(self, question, testDict):
+        super(ParallelSeedTest, self).__init__(question, testDict)
+        self.layoutName = testDict['layoutName']
+        self.numGhosts = int(testDict['numGhosts'])
+        self.numGames = int(testDict['numGames'])
+        self.workerCounts = [int(n) for n in testDict['workerCounts'].split()]
+        self.seed = int(testDict['randomSeed'])
+
+    def play(self, workers, seed):
+        import pacmanAgents
+        import textDisplay
+        lay = layout.getLayout(self.layoutName, 3)
+        ghosts = [RandomGhost(i + 1) for i in range(self.numGhosts)]
+        summaries = pacman.iterGames(lay, pacmanAgents.GreedyAgent(), ghosts, textDisplay.NullGraphics(),
+                                     self.numGames, workers=workers, seed=seed, quiet=True)
+        return sorted([(summary.index, summary.score, summary.win, summary.numMoves)
+                       for summary in summaries])
+
+    def execute(self, grades, moduleDict, solutionDict):
+        serial = self.play(1, self.seed)
+        if [game[0] for game in serial] != list(range(self.numGames)):
+            self.addMessage('Games %s were played, not 0 to %d' % ([game[0] for game in serial],
+                                                                   self.numGames - 1))
+            return self.testFail(grades)
+        for workers in self.workerCounts:
+            parallel = self.play(workers, self.seed)
+            if parallel != serial:
+                self.addMessage('One process played (index, score, win, moves)\n%s\n%d played\n%s' %
+                                (serial, workers, parallel))
+                return self.testFail(grades)
+            self.addMessage('%d workers: the same %d games' % (workers, len(parallel)))
+        if self.play(1, self.seed + 1) == serial:
+            self.addMessage('Master seeds %d and %d play the same games' % (self.seed, self.seed + 1))
+            return self.testFail(grades)
+        self.addMessage('Scores %s' % [game[1] for game in serial])
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class RecordFileTest(testClasses.TestCase):
+    """
+    Records seeded games on two layouts to one record file in two runs,
+    with a game cut short by a crash in between, and checks that readGames
+    gives back every finished game (header, layout, moves, score and
+    result) and nothing of the unfinished one, and that each layout's text
+    is stored once.
+    """
+
+    def __init__(self, question, testDict):
+        super(RecordFileTest, self).__init__(question, testDict)
+        self.layoutNames = testDict['layoutNames'].split()
+        self.numGhosts = int(testDict['numGhosts'])
+        self.numGames = int(testDict['numGames'])
+        self.seed = int(testDict['randomSeed'])
+
+    def execute(self, grades, moduleDict, solutionDict):
+        import gameRecord
+        import pacmanAgents
+        import shutil
+        import tempfile
+        import textDisplay
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'games.rec')
+        try:
+            played = []
+            for run, layoutName in enumerate(self.layoutNames):
+                lay = layout.getLayout(layoutName, 3)
+                ghosts = [RandomGhost(i + 1) for i in range(self.numGhosts)]
+                if run > 0:
+                    # A run killed part way through its first game
+                    crashed = gameRecord.GameRecorder(path)
+                    crashed.beginGame(lay, [pacmanAgents.GreedyAgent()] + ghosts, 0)
+                    for move in range(3):
+                        crashed.recordMove(0, 'Stop', None)
+                    crashed.file.write(crashed.buffer)
+                    crashed.close()
+                for summary in pacman.iterGames(lay, pacmanAgents.GreedyAgent(), ghosts,
+                                                textDisplay.NullGraphics(), self.numGames, record=path,
+                                                seed=self.seed + run, keepGames=True, quiet=True):
+                    played.append((lay, self.seed + run, summary))
+            recorded = list(gameRecord.readGames(path))
+            if len(recorded) != len(played):
+                self.addMessage('Read back %d games, %d were played' % (len(recorded), len(played)))
+                return self.testFail(grades)
+            for (lay, seed, summary), game in zip(played, recorded):
+                expected = {'layoutHash': lay.contentHash, 'masterSeed': seed, 'gameIndex': summary.index,
+                            'seed': pacman.deriveGameSeed(seed, summary.index),
+                            'agents': [type(agent).__name__ for agent in summary.game.agents]}
+                header = dict((key, game.header.get(key)) for key in expected)
+                if header != expected:
+                    self.addMessage('Game header %s, expected %s' % (game.header, expected))
+                    return self.testFail(grades)
+                if game.layoutText != lay.layoutText:
+                    self.addMessage('Game %d of seed %d reads back with another layout' % (summary.index, seed))
+                    return self.testFail(grades)
+                if game.actions != list(summary.game.moveHistory) or game.score != summary.score or \
+                        game.win != summary.win:
+                    self.addMessage('Game %d of seed %d: %d moves, score %s, win %s read back as %d, %s, %s' % (
+                        summary.index, seed, len(summary.game.moveHistory), summary.score, summary.win,
+                        len(game.actions), game.score, game.win))
+                    return self.testFail(grades)
+            reader = gameRecord.RecordReader(path)
+            layoutChunks = 0
+            try:
+                while True:
+                    tag, payload = reader.readChunk()
+                    if tag is None:
+                        break
+                    if tag == b'L':
+                        layoutChunks += 1
+                    else:
+                        reader.readMoves()
+            finally:
+                reader.close()
+            if layoutChunks != len(self.layoutNames):
+                self.addMessage('%d layout chunks for %d layouts' % (layoutChunks, len(self.layoutNames)))
+                return self.testFail(grades)
+            numMoves = sum([len(summary.game.moveHistory) for lay, seed, summary in played])
+            self.addMessage('%d games, %d moves in %d bytes' % (len(recorded), numMoves, os.path.getsize(path)))
+        finally:
+            shutil.rmtree(directory)
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class TournamentResumeTest(testClasses.TestCase):
+    """
+    Plays a small tournament into a temporary SQLite database straight
+    through, and again with the run interrupted after gamesBeforeStop
+    games and then rerun (on workers processes).  The rerun must play only
+    the missing games, and both databases must hold the same results.
+    """
+
+    def __init__(self, question, testDict):
+        super(TournamentResumeTest, self).__init__(question, testDict)
+        self.agents = testDict['agents'].split()
+        self.layoutNames = testDict['layoutNames'].split()
+        self.ghosts = testDict['ghosts'].split()
+        self.ghostCounts = [int(k) for k in testDict['ghostCounts'].split()]
+        self.numGames = int(testDict['numGames'])
+        self.gamesBeforeStop = int(testDict['gamesBeforeStop'])
+        self.workers = int(testDict['workers'])
+        self.seed = int(testDict['randomSeed'])
+
+    def getTournament(self, dbPath, workers=1):
+        import tournament
+        return tournament.Tournament(self.agents, self.layoutNames, self.ghosts, self.ghostCounts,
+                                     self.numGames, dbPath, self.seed, workers)
+
+    def getResults(self, dbPath):
+        import sqlite3
+        db = sqlite3.connect(dbPath)
+        try:
+            return db.execute('SELECT agent, layout, ghost, numGhosts, gameIndex, seed, score, win, moves '
+                              'FROM games ORDER BY agent, layout, ghost, numGhosts, gameIndex').fetchall()
+        finally:
+            db.close()
+
+    def execute(self, grades, moduleDict, solutionDict):
+        import shutil
+        import tempfile
+        import tournament
+        directory = tempfile.mkdtemp()
+        straightPath = os.path.join(directory, 'straight.db')
+        resumedPath = os.path.join(directory, 'resumed.db')
+        playMatchupGame = tournament.playMatchupGame
+        played = []
+
+        def interruptedGame(task):
+            if len(played) == self.gamesBeforeStop:
+                raise KeyboardInterrupt()
+            played.append(task)
+            return playMatchupGame(task)
+        try:
+            straight = self.getTournament(straightPath)
+            straight.run()
+            straight.db.close()
+            expected = self.getResults(straightPath)
+            total = len(straight.matchups) * self.numGames
+            if len(expected) != total:
+                self.addMessage('The tournament stored %d of its %d games' % (len(expected), total))
+                return self.testFail(grades)
+
+            interrupted = self.getTournament(resumedPath)
+            tournament.playMatchupGame = interruptedGame
+            try:
+                interrupted.run()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                tournament.playMatchupGame = playMatchupGame
+                interrupted.db.close()
+            resumed = self.getTournament(resumedPath, self.workers)
+            pending = len(resumed.getPendingTasks())
+            if pending != total - self.gamesBeforeStop:
+                self.addMessage('After %d games the rerun has %d of %d left to play' %
+                                (self.gamesBeforeStop, pending, total))
+                return self.testFail(grades)
+            resumed.run()
+            stats = resumed.getStats(['agent'])
+            resumed.db.close()
+            actual = self.getResults(resumedPath)
+            if actual != expected:
+                self.addMessage('Played straight through:\n%s\nInterrupted and resumed:\n%s' %
+                                ('\n'.join(map(str, expected)), '\n'.join(map(str, actual))))
+                return self.testFail(grades)
+            for (agent,), agentStats in sorted(stats.items()):
+                self.addMessage('%s: %d games, mean %.1f' % (agent, agentStats.count, agentStats.mean))
+        finally:
+            shutil.rmtree(directory)
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class SimulationDaemonTest(testClasses.TestCase):
+    """
+    Starts a simulationDaemon on a temporary socket, over a socket file a
+    dead daemon left behind, and submits the same seeded job with each
+    worker count in workerCounts plus one bad job.  Every game the daemon
+    reports must match the one pacman.iterGames plays with the same seed,
+    the totals must agree with the games, and the bad job must be answered
+    with an error without stopping the daemon.
+    """
+
+    def __init__(self, question, testDict):
+        super(SimulationDaemonTest, self).__init__(question, testDict)
+        self.job = json.loads(testDict['job'])
+        self.workerCounts = [int(n) for n in testDict['workerCounts'].split()]
+
+    def execute(self, grades, moduleDict, solutionDict):
+        import shutil
+        import simulationDaemon
+        import socket
+        import tempfile
+        import textDisplay
+        import threading
+        job = dict(simulationDaemon.JOB_DEFAULTS)
+        job.update(self.job)
+        lay = layout.getLayout(job['layout'], 3)
+        ghostType = pacman.loadAgent(job['ghost'], True)
+        expected = [{'game': summary.index, 'score': summary.score, 'win': summary.win,
+                     'moves': summary.numMoves, 'timeout': summary.timeout, 'crashed': summary.crashed}
+                    for summary in pacman.iterGames(
+                        lay, pacman.loadAgent(job['pacman'], True)(**pacman.parseAgentArgs(job['agentArgs'] or None)),
+                        [ghostType(i + 1) for i in range(job['numGhosts'])], textDisplay.NullGraphics(),
+                        job['numGames'], seed=job['seed'], quiet=True)]
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'daemon.sock')
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(path)
+        stale.close()
+        daemon = simulationDaemon.SimulationDaemon(path)
+        thread = threading.Thread(target=daemon.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            for workers in self.workerCounts:
+                results = list(simulationDaemon.submitJob(dict(self.job, workers=workers), path))
+                games, totals = sorted(results[:-1], key=lambda result: result['game']), results[-1]
+                if games != expected:
+                    self.addMessage('With %d workers the daemon played\n%s\niterGames played\n%s' %
+                                    (workers, games, expected))
+                    return self.testFail(grades)
+                scores = [game['score'] for game in games]
+                if not totals.get('done') or totals['games'] != len(games) or \
+                        totals['wins'] != len([game for game in games if game['win']]) or \
+                        abs(totals['mean'] - sum(scores) / float(len(scores))) > 1e-6:
+                    self.addMessage('Totals %s do not match the games %s' % (totals, games))
+                    return self.testFail(grades)
+                self.addMessage('%d workers: %d games, mean %.1f' % (workers, totals['games'], totals['mean']))
+            try:
+                list(simulationDaemon.submitJob(dict(self.job, layout='noSuchLayout'), path))
+            except Exception as error:
+                self.addMessage('A bad job is answered with: %s' % error)
+            else:
+                self.addMessage('The daemon played a job on a layout that does not exist')
+                return self.testFail(grades)
+            again = list(simulationDaemon.submitJob(dict(self.job, numGames=1), path))
+            if again[0] != expected[0]:
+                self.addMessage('After the bad job the daemon played %s, not %s' % (again[0], expected[0]))
+                return self.testFail(grades)
+        finally:
+            daemon.shutdown()
+            daemon.server_close()
+            thread.join()
+            shutil.rmtree(directory)
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class CheckpointResumeTest(testClasses.TestCase):
+    """
+    Runs pacman.py with --checkpoint straight through, and again killed
+    (SIGKILL) once the checkpoint holds a snapshot of game killInGame at
+    least killAfterMoves moves in, then resumed with --resume.  Resuming
+    with Pacman's -a options changed to otherAgentArgs must be refused; the
+    real resumed run must finish with the same results, game for game, as
+    the one that was not killed.
+    """
+
+    def __init__(self, question, testDict):
+        super(CheckpointResumeTest, self).__init__(question, testDict)
+        self.arguments = testDict['arguments'].split()
+        self.killInGame = int(testDict['killInGame'])
+        self.killAfterMoves = int(testDict['killAfterMoves'])
+        self.otherAgentArgs = testDict['otherAgentArgs']
+
+    def runPacman(self, arguments):
+        import subprocess
+        import sys
+        return subprocess.Popen([sys.executable, 'pacman.py'] + self.arguments + arguments,
+                                cwd=os.path.dirname(os.path.abspath(pacman.__file__)),
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    def readResults(self, path):
+        with open(path) as f:
+            return [json.loads(line) for line in f]
+
+    def execute(self, grades, moduleDict, solutionDict):
+        import checkpoints
+        import pickle
+        import shutil
+        import tempfile
+        import time
+        directory = tempfile.mkdtemp()
+        straightPath = os.path.join(directory, 'straight.ckpt')
+        killedPath = os.path.join(directory, 'killed.ckpt')
+        try:
+            straight = self.runPacman(['--checkpoint', straightPath])
+            if straight.wait() != 0:
+                self.addMessage('pacman.py failed:\n%s' % straight.stderr.read().decode())
+                return self.testFail(grades)
+            expected = self.readResults(straightPath)
+
+            killed = self.runPacman(['--checkpoint', killedPath])
+            snapshot = None
+            while killed.poll() is None:
+                try:
+                    with open(checkpoints.getStatePath(killedPath), 'rb') as f:
+                        state = pickle.load(f)
+                except (IOError, EOFError, pickle.UnpicklingError):
+                    state = None
+                if state is not None and state['nextGame'] == self.killInGame and state['game'] is not None \
+                        and len(state['game']['moveHistory']) >= self.killAfterMoves:
+                    killed.kill()
+                    snapshot = state['game']
+                    break
+                time.sleep(0.005)
+            killed.wait()
+            if snapshot is None:
+                self.addMessage('The run ended before it saved a snapshot of game %d after %d moves' %
+                                (self.killInGame, self.killAfterMoves))
+                return self.testFail(grades)
+            self.addMessage('Killed %d moves into game %d' % (len(snapshot['moveHistory']), self.killInGame))
+
+            mismatched = self.runPacman(['--checkpoint', killedPath, '--resume', '-a', self.otherAgentArgs])
+            error = mismatched.communicate()[1].decode()
+            if mismatched.returncode == 0 or 'written by a different run' not in error:
+                self.addMessage('Resuming with -a %s was not refused:\n%s' % (self.otherAgentArgs, error))
+                return self.testFail(grades)
+            self.addMessage('Resuming with -a %s is refused' % self.otherAgentArgs)
+
+            resumed = self.runPacman(['--checkpoint', killedPath, '--resume'])
+            if resumed.wait() != 0:
+                self.addMessage('pacman.py --resume failed:\n%s' % resumed.stderr.read().decode())
+                return self.testFail(grades)
+            actual = self.readResults(killedPath)
+            if actual != expected:
+                self.addMessage('Straight through:\n%s\nKilled and resumed:\n%s' % (
+                    '\n'.join(map(json.dumps, expected)), '\n'.join(map(json.dumps, actual))))
+                return self.testFail(grades)
+            self.addMessage('Scores %s either way' % [result['score'] for result in actual[1:]])
+        finally:
+            shutil.rmtree(directory)
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class EvaluationCacheTest(testClasses.TestCase):
+    """
+    Evaluates the states of a seeded random walk, each twice and some again
+    later, through a multiAgents.EvaluationCache of maxSize entries, one at
+    a time and in batches.  Every value must equal the uncached evaluation,
+    and the hits, misses, evictions and the entries kept must match a plain
+    least-recently-used model.  Then checks that agentName with evalCache
+    set picks the same moves along the walk as without it.
+    """
+
+    def __init__(self, question, testDict):
+        super(EvaluationCacheTest, self).__init__(question, testDict)
+        self.layoutName = testDict['layoutName']
+        self.evalFn = testDict['evalFn']
+        self.maxSize = int(testDict['maxSize'])
+        self.numMoves = int(testDict['numMoves'])
+        self.agentName = testDict['agentName']
+        self.depth = testDict['depth']
+        self.seed = int(testDict['randomSeed'])
+
+    def getWalk(self):
+        lay = layout.getLayout(self.layoutName, 3)
+        state = GameState()
+        state.initialize(lay, lay.getNumGhosts())
+        rand = random.Random(self.seed)
+        states = [state]
+        while len(states) < self.numMoves and not (state.isWin() or state.isLose()):
+            for agentIndex in range(state.getNumAgents()):
+                state = state.getNextState(agentIndex, rand.choice(state.getLegalActions(agentIndex)))
+                if state.isWin() or state.isLose():
+                    break
+            states.append(state)
+        return states
+
+    def execute(self, grades, moduleDict, solutionDict):
+        import collections
+        import util
+        multiAgents = moduleDict['multiAgents']
+        evaluationFunction = util.lookup(self.evalFn, multiAgents.__dict__)
+        walk = self.getWalk()
+        rand = random.Random(self.seed)
+        # Each state twice in a row, then now and then one from further back
+        sequence = []
+        for i, state in enumerate(walk):
+            sequence += [state, state]
+            if i > 0 and rand.random() < 0.5:
+                sequence.append(walk[rand.randrange(i)])
+
+        cache = multiAgents.EvaluationCache(evaluationFunction, self.maxSize)
+        model = collections.OrderedDict()
+        hits = misses = evictions = 0
+
+        def store(added):
+            model.update(added)
+            added.clear()
+            evicted = 0
+            while len(model) > self.maxSize:
+                model.popitem(last=False)
+                evicted += 1
+            return evicted
+        batches = [sequence[i:i + 5] for i in range(0, len(sequence), 5)]
+        for batchIndex, batch in enumerate(batches):
+            batched = batchIndex % 2 == 1
+            if batched:
+                values = cache.evaluateBatch(batch)
+            else:
+                values = [cache(state) for state in batch]
+            # A batch stores its new values and evicts only after all its lookups
+            added = collections.OrderedDict()
+            for state, value in zip(batch, values):
+                if value != evaluationFunction(state):
+                    self.addMessage('Cached value %s, uncached %s' % (value, evaluationFunction(state)))
+                    return self.testFail(grades)
+                key = state.getCacheKey()
+                if key in model:
+                    hits += 1
+                    model.move_to_end(key)
+                elif key in added:
+                    hits += 1
+                else:
+                    misses += 1
+                    added[key] = value
+                if not batched:
+                    evictions += store(added)
+            evictions += store(added)
+            if len(cache.entries) > self.maxSize:
+                self.addMessage('%d entries in a cache of %d' % (len(cache.entries), self.maxSize))
+                return self.testFail(grades)
+        counts = (cache.hits, cache.misses, cache.evictions)
+        if counts != (hits, misses, evictions) or list(cache.entries) != list(model):
+            self.addMessage('Hits, misses and evictions %s; least recently used order gives %s%s' % (
+                counts, (hits, misses, evictions),
+                '' if list(cache.entries) == list(model) else ', and other entries kept'))
+            return self.testFail(grades)
+        self.addMessage('%d lookups: %d hits, %d misses, %d evictions' % (len(sequence), hits, misses, evictions))
+
+        agentType = getattr(multiAgents, self.agentName)
+        plain = agentType(evalFn=self.evalFn, depth=self.depth)
+        cached = agentType(evalFn=self.evalFn, depth=self.depth, evalCache=str(self.maxSize))
+        for state in walk:
+            if state.isWin() or state.isLose():
+                break
+            expected = plain.getAction(plain.observationFunction(state.deepCopy()))
+            action = cached.getAction(cached.observationFunction(state.deepCopy()))
+            if action != expected:
+                self.addMessage('With the cache %s moves %s, without it %s:\n%s' % (
+                    self.agentName, action, expected, state))
+                return self.testFail(grades)
+        stats = cached.getEvalCacheStats()
+        self.addMessage('%s: the same moves with the cache (hit rate %.2f)' % (self.agentName, stats['hitRate']))
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class VisibilityTest(testClasses.TestCase):
+    """
+    Checks Layout.isVisibleFrom on each layout in layoutNames, from every
+    open cell in every direction, against every half-cell point of the
+    board, with a plain ray scan that steps half a cell at a time until it
+    reaches a wall.  Then checks GameState.getVisibleGhosts along a seeded
+    random walk, started again whenever a game ends (ghosts between cells
+    included), against the same scan.
+    """
+
+    def __init__(self, question, testDict):
+        super(VisibilityTest, self).__init__(question, testDict)
+        self.layoutNames = testDict['layoutNames'].split()
+        self.numMoves = int(testDict['numMoves'])
+        self.seed = int(testDict['randomSeed'])
+
+    def scan(self, lay, pos, direction):
+        from game import Actions
+        if direction == 'Stop':
+            return set()
+        dx, dy = Actions.directionToVector(direction, 0.5)
+        seen = set()
+        x, y = pos[0] + dx, pos[1] + dy
+        while x != int(x) or y != int(y) or not lay.walls[int(x)][int(y)]:
+            seen.add((x, y))
+            x, y = x + dx, y + dy
+        return seen
+
+    def execute(self, grades, moduleDict, solutionDict):
+        from util import nearestPoint
+        directions = ['North', 'South', 'East', 'West', 'Stop']
+        for layoutName in self.layoutNames:
+            lay = layout.getLayout(layoutName, 3)
+            points = [(x / 2.0, y / 2.0) for x in range(2 * lay.width - 1) for y in range(2 * lay.height - 1)]
+            scans = {}
+            for pos in lay.getTables().freeCells:
+                for direction in directions:
+                    seen = self.scan(lay, pos, direction)
+                    scans[(pos, direction)] = seen
+                    wrong = [point for point in points
+                             if lay.isVisibleFrom(point, pos, direction) != (point in seen)]
+                    if wrong:
+                        self.addMessage('%s: from %s facing %s, %s is%s visible' % (
+                            layoutName, pos, direction, wrong[0], '' if wrong[0] not in seen else ' not'))
+                        return self.testFail(grades)
+            start = GameState()
+            start.initialize(lay, lay.getNumGhosts())
+            state = start
+            rand = random.Random(self.seed)
+            visible = between = 0
+            for move in range(self.numMoves):
+                for agentIndex in range(state.getNumAgents()):
+                    state = state.getNextState(agentIndex, rand.choice(state.getLegalActions(agentIndex)))
+                    if state.isWin() or state.isLose():
+                        state = start
+                        break
+                pacmanState = state.getPacmanState()
+                seen = scans[(pacmanState.getPosition(), pacmanState.getDirection())]
+                expected = [ghost for ghost in state.getGhostStates() if ghost.getPosition() in seen]
+                if state.getVisibleGhosts() != expected:
+                    self.addMessage('%s: getVisibleGhosts gives %s, the scan %s:\n%s' % (
+                        layoutName, [g.getPosition() for g in state.getVisibleGhosts()],
+                        [g.getPosition() for g in expected], state))
+                    return self.testFail(grades)
+                visible += len(expected) > 0
+                between += len([p for p in state.getGhostPositions() if p != nearestPoint(p)]) > 0
+            self.addMessage('%s: %d cells; %d states, %d with a ghost in sight, %d with one between cells' % (
+                layoutName, len(lay.getTables().freeCells), self.numMoves, visible, between))
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class NodeBudgetTest(testClasses.TestCase):
+    """
+    Asks agentName with nodeBudget for a move in each state of a seeded
+    random walk and checks that the move generates no more states than the
+    budget and is the move a plain search to the deepest completed depth
+    makes.  The walk is played again by an agent whose growth estimate stays
+    tiny, so it always tries the next depth and every move ends in a search
+    that is cut off,
+    and once more with an unlimited budget and maxDepth set to cappedDepth,
+    which must stop the deepening after exactly cappedDepth iterations.
+    """
+
+    def __init__(self, question, testDict):
+        super(NodeBudgetTest, self).__init__(question, testDict)
+        self.layoutName = testDict['layoutName']
+        self.agentName = testDict['agentName']
+        self.evalFn = testDict['evalFn']
+        self.nodeBudget = int(testDict['nodeBudget'])
+        self.maxDepth = int(testDict['maxDepth'])
+        self.cappedDepth = int(testDict['cappedDepth'])
+        self.numMoves = int(testDict['numMoves'])
+        self.seed = int(testDict['randomSeed'])
+
+    def getWalk(self):
+        lay = layout.getLayout(self.layoutName, 3)
+        start = GameState()
+        start.initialize(lay, lay.getNumGhosts())
+        state = start
+        rand = random.Random(self.seed)
+        states = []
+        while len(states) < self.numMoves:
+            states.append(state)
+            for agentIndex in range(state.getNumAgents()):
+                state = state.getNextState(agentIndex, rand.choice(state.getLegalActions(agentIndex)))
+                if state.isWin() or state.isLose():
+                    state = start
+                    break
+        return states
+
+    def search(self, agent, state):
+        "Returns the agent's move and the number of states it generated."
+        before = GameState.generatedCount
+        action = agent.getAction(state)
+        return action, GameState.generatedCount - before
+
+    def execute(self, grades, moduleDict, solutionDict):
+        agentType = getattr(moduleDict['multiAgents'], self.agentName)
+        walk = self.getWalk()
+        class OptimisticAgent(agentType):
+            plyGrowth = property(lambda self: 1e-6, lambda self, growth: None)
+        budgeted = agentType(evalFn=self.evalFn, nodeBudget=str(self.nodeBudget), maxDepth=str(self.maxDepth))
+        forced = OptimisticAgent(evalFn=self.evalFn, nodeBudget=str(self.nodeBudget), maxDepth=str(self.maxDepth))
+        for name, agent in [('budgeted', budgeted), ('forced', forced)]:
+            depths = []
+            cutoffs = 0
+            for state in walk:
+                action, nodes = self.search(agent, state)
+                completedDepth, used, cutoff = agent.searchStats[-1]
+                if nodes > self.nodeBudget or used != nodes:
+                    self.addMessage('%s: %d states generated (%d counted) on a budget of %d' % (
+                        name, nodes, used, self.nodeBudget))
+                    return self.testFail(grades)
+                expected = agentType(evalFn=self.evalFn, depth=str(completedDepth)).getAction(state)
+                if action != expected:
+                    self.addMessage('%s: moved %s after completing depth %d, where a depth %d search moves %s:\n%s' % (
+                        name, action, completedDepth, completedDepth, expected, state))
+                    return self.testFail(grades)
+                depths.append(completedDepth)
+                cutoffs += cutoff
+            if agent is forced and cutoffs != len(walk):
+                self.addMessage('forced: only %d of %d searches were cut off' % (cutoffs, len(walk)))
+                return self.testFail(grades)
+            self.addMessage('%s: depths %d to %d, %d of %d searches cut off' % (
+                name, min(depths), max(depths), cutoffs, len(walk)))
+
+        unlimited = agentType(evalFn=self.evalFn, nodeBudget=str(10 ** 9), maxDepth=str(self.cappedDepth))
+        for state in walk:
+            action, nodes = self.search(unlimited, state)
+            completedDepth, used, cutoff = unlimited.searchStats[-1]
+            plain = sum([self.search(agentType(evalFn=self.evalFn, depth=str(depth)), state)[1]
+                         for depth in range(1, self.cappedDepth + 1)])
+            if completedDepth != self.cappedDepth or cutoff or nodes != plain:
+                self.addMessage('Unlimited budget: completed depth %d of maxDepth %d, %d states where '
+                                'searches to depths 1 to %d generate %d' % (
+                                    completedDepth, self.cappedDepth, nodes, self.cappedDepth, plain))
+                return self.testFail(grades)
+        self.addMessage('Unlimited budget: every search stopped at depth %d' % self.cappedDepth)
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+class QuiescenceTest(testClasses.TestCase):
+    """
+    Searches each state of a seeded random walk with agentName at depth,
+    once without quiescence and once with quiescence extra plies, and
+    compares the states each search generates with a count taken directly
+    from the rule: a quiet state reached at depth with Pacman to move is a
+    leaf, and a noisy one keeps being expanded, a full ply at a time, for at
+    most quiescence extra plies.  Every leaf the agent evaluates is also
+    checked against that rule.  The walk must include states where the
+    extension searches deeper and states where it changes nothing.
+    """
+
+    def __init__(self, question, testDict):
+        super(QuiescenceTest, self).__init__(question, testDict)
+        self.layoutName = testDict['layoutName']
+        self.agentName = testDict['agentName']
+        self.evalFn = testDict['evalFn']
+        self.depth = int(testDict['depth'])
+        self.quiescence = int(testDict['quiescence'])
+        self.numMoves = int(testDict['numMoves'])
+        self.seed = int(testDict['randomSeed'])
+
+    def getWalk(self):
+        lay = layout.getLayout(self.layoutName, 3)
+        start = GameState()
+        start.initialize(lay, lay.getNumGhosts())
+        state = start
+        rand = random.Random(self.seed)
+        states = []
+        while len(states) < self.numMoves:
+            states.append(state)
+            for agentIndex in range(state.getNumAgents()):
+                state = state.getNextState(agentIndex, rand.choice(state.getLegalActions(agentIndex)))
+                if state.isWin() or state.isLose():
+                    state = start
+                    break
+        return states
+
+    def countStates(self, agent, state, depth, agentIndex, quiescence):
+        "Returns the number of states a search of state generates under the rule."
+        if state.isWin() or state.isLose() or depth >= self.depth + quiescence:
+            return 0
+        if depth >= self.depth and agentIndex == 0 and not agent.isNoisy(state):
+            return 0
+        nextAgent = (agentIndex + 1) % state.getNumAgents()
+        nextDepth = depth + 1 if nextAgent == 0 else depth
+        total = 0
+        for action in state.getLegalActions(agentIndex):
+            successor = state.getNextState(agentIndex, action)
+            total += 1 + self.countStates(agent, successor, nextDepth, nextAgent, quiescence)
+        return total
+
+    def execute(self, grades, moduleDict, solutionDict):
+        agentType = getattr(moduleDict['multiAgents'], self.agentName)
+        leaves = []
+        class RecordingAgent(agentType):
+            def isCutoff(self, gameState, depth, agentIndex):
+                cutoff = agentType.isCutoff(self, gameState, depth, agentIndex)
+                if cutoff and not (gameState.isWin() or gameState.isLose()):
+                    leaves.append((depth, agentIndex, self.isNoisy(gameState)))
+                return cutoff
+        agents = [RecordingAgent(evalFn=self.evalFn, depth=str(self.depth), quiescence=str(quiescence))
+                  for quiescence in (0, self.quiescence)]
+        extended = unchanged = 0
+        totals = [0, 0]
+        for state in self.getWalk():
+            counts = []
+            for agent in agents:
+                del leaves[:]
+                before = GameState.generatedCount
+                agent.getAction(state)
+                nodes = GameState.generatedCount - before
+                expected = self.countStates(agent, state, 0, 0, agent.quiescence)
+                if nodes != expected:
+                    self.addMessage('quiescence=%d: search generated %d states where the rule gives %d:\n%s' % (
+                        agent.quiescence, nodes, expected, state))
+                    return self.testFail(grades)
+                for depth, agentIndex, noisy in leaves:
+                    if depth == self.depth + agent.quiescence:
+                        continue
+                    if depth < self.depth or depth > self.depth + agent.quiescence or agentIndex != 0 or noisy:
+                        self.addMessage('quiescence=%d: leaf at depth %d (agent %d, %s) with depth=%d:\n%s' % (
+                            agent.quiescence, depth, agentIndex, noisy and 'noisy' or 'quiet',
+                            self.depth, state))
+                        return self.testFail(grades)
+                counts.append(nodes)
+            if counts[1] > counts[0]:
+                extended += 1
+            elif counts[1] == counts[0]:
+                unchanged += 1
+            else:
+                self.addMessage('quiescence=%d generated fewer states (%d) than a plain search (%d):\n%s' % (
+                    self.quiescence, counts[1], counts[0], state))
+                return self.testFail(grades)
+            totals = [total + count for total, count in zip(totals, counts)]
+        if not extended or not unchanged:
+            self.addMessage('The walk needs both noisy and quiet positions: %d extended, %d unchanged' % (
+                extended, unchanged))
+            return self.testFail(grades)
+        self.addMessage('%d states without quiescence, %d with quiescence=%d; %d searches extended, %d unchanged' % (
+            totals[0], totals[1], self.quiescence, extended, unchanged))
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+class CompiledLayoutTest(testClasses.TestCase):
+    """
+    Copies each layout's source into a temporary directory and loads it
+    there, which compiles it, and checks that the compiled copy reads back
+    with the same board and tables as parsing the text.  One pellet is then
+    removed from the source: the stale compiled copy must be refused and the
+    load must parse the new text and recompile it.  Also checks that copying
+    a layout whose tables have not been built leaves them unbuilt, and that
+    the copy and the original then share one set.
+    """
+
+    def __init__(self, question, testDict):
+        super(CompiledLayoutTest, self).__init__(question, testDict)
+        self.layoutNames = testDict['layoutNames'].split()
+
+    def compare(self, name, compiled, parsed):
+        "Returns a description of the first difference between two layouts, or None."
+        for attribute in ['width', 'height', 'numGhosts', 'layoutText', 'totalFood',
+                          'contentHash', 'capsules', 'agentPositions']:
+            if getattr(compiled, attribute) != getattr(parsed, attribute):
+                return '%s: compiled %s %r, parsed %r' % (
+                    name, attribute, getattr(compiled, attribute), getattr(parsed, attribute))
+        for attribute in ['walls', 'food']:
+            if getattr(compiled, attribute).asBitmask() != getattr(parsed, attribute).asBitmask():
+                return '%s: compiled %s differ from the parsed ones' % (name, attribute)
+        compiledTables, parsedTables = compiled.getTables(), parsed.getTables()
+        for attribute in ['freeCells', 'typecode', 'moves', 'distances']:
+            if getattr(compiledTables, attribute) != getattr(parsedTables, attribute):
+                return '%s: compiled tables have different %s' % (name, attribute)
+        return None
+
+    def load(self, path, layoutText):
+        "Loads path as if for the first time in this process."
+        contentHash = layout.hashLayoutText(layoutText)
+        registered = layout.LAYOUT_REGISTRY.pop(contentHash, None)
+        try:
+            return layout.loadLayoutFile(path)
+        finally:
+            if registered is not None:
+                layout.LAYOUT_REGISTRY[contentHash] = registered
+            else:
+                layout.LAYOUT_REGISTRY.pop(contentHash, None)
+
+    def execute(self, grades, moduleDict, solutionDict):
+        import shutil
+        import tempfile
+
+        directory = tempfile.mkdtemp()
+        try:
+            for name in self.layoutNames:
+                path = os.path.join(directory, name + '.lay')
+                shutil.copy(layout.findLayoutFile(name, 3), path)
+                compiledPath = layout.compiledLayoutPath(path)
+                with open(path) as handle:
+                    layoutText = [line.strip() for line in handle]
+                self.load(path, layoutText)
+                if not os.path.exists(compiledPath):
+                    self.addMessage('%s: loading did not write %s' % (name, compiledPath))
+                    return self.testFail(grades)
+                compiled = layout.readCompiledLayout(compiledPath, layout.hashLayoutText(layoutText))
+                if compiled is None:
+                    self.addMessage('%s: the compiled copy was refused' % name)
+                    return self.testFail(grades)
+                difference = self.compare(name, compiled, layout.Layout(layoutText))
+                if difference is not None:
+                    self.addMessage(difference)
+                    return self.testFail(grades)
+
+                row = [i for i, line in enumerate(layoutText) if '.' in line][0]
+                layoutText[row] = layoutText[row].replace('.', ' ', 1)
+                handle = open(path, 'w')
+                handle.write('\n'.join(layoutText) + '\n')
+                handle.close()
+                if layout.readCompiledLayout(compiledPath, layout.hashLayoutText(layoutText)) is not None:
+                    self.addMessage('%s: the compiled copy of the old text was accepted' % name)
+                    return self.testFail(grades)
+                difference = self.compare(name, self.load(path, layoutText), layout.Layout(layoutText))
+                if difference is not None:
+                    self.addMessage('After editing the source, ' + difference)
+                    return self.testFail(grades)
+                if layout.readCompiledLayout(compiledPath, layout.hashLayoutText(layoutText)) is None:
+                    self.addMessage('%s: the edited source was not recompiled' % name)
+                    return self.testFail(grades)
+
+                original = layout.Layout(layoutText)
+                copied = original.deepCopy().deepCopy()
+                if original.tables is not None or copied.tables is not None:
+                    self.addMessage('%s: copying the layout built its tables' % name)
+                    return self.testFail(grades)
+                if copied.getTables() is not original.getTables():
+                    self.addMessage('%s: a copy built its own tables' % name)
+                    return self.testFail(grades)
+            self.addMessage('%d layouts compiled, read back and recompiled after an edit' % len(self.layoutNames))
+            return self.testPass(grades)
+        finally:
+            shutil.rmtree(directory)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+class RemoteCrashTest(testClasses.TestCase):
+    """
+    Plays remoteAgents.playRemoteGame with an agent process that fails to
+    build its agent (agentName with brokenArgs): the game must be recorded
+    as crashed, not timed out, with the traceback printed.  Then plays with
+    a working agent (agentArgs) against a ghost that raises: that is not
+    the agent's fault, so the exception must reach the caller instead of
+    being recorded as a crash.
+    """
+
+    def __init__(self, question, testDict):
+        super(RemoteCrashTest, self).__init__(question, testDict)
+        self.layoutName = testDict['layoutName']
+        self.agentName = testDict['agentName']
+        self.agentArgs = testDict['agentArgs']
+        self.brokenArgs = testDict['brokenArgs']
+        self.seed = int(testDict['randomSeed'])
+
+    def execute(self, grades, moduleDict, solutionDict):
+        import asyncio
+        import io
+        import remoteAgents
+        lay = layout.getLayout(self.layoutName, 3)
+
+        class GhostBug(Exception):
+            pass
+
+        class BrokenGhost(RandomGhost):
+            def getAction(self, state):
+                raise GhostBug('The ghost failed')
+
+        class TrackedAgent(remoteAgents.AsyncRemoteAgent):
+            "Keeps the processes it kills, so they can be reaped before the event loop closes."
+            def kill(self):
+                if self.process is not None:
+                    killed.append(self.process)
+                remoteAgents.AsyncRemoteAgent.kill(self)
+
+        killed = []
+        async def play(agentArgs, ghost):
+            agent = TrackedAgent(self.agentName, pacman.parseAgentArgs(agentArgs))
+            try:
+                return await remoteAgents.playRemoteGame(lay, agent, [ghost], 0, self.seed, 10)
+            finally:
+                agent.kill()
+                for process in killed:
+                    await process.wait()
+
+        stderr = sys.stderr
+        sys.stderr = io.StringIO()
+        try:
+            summary = asyncio.run(play(self.brokenArgs, RandomGhost(1)))
+            printed = sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+        if not summary.crashed or summary.timeout:
+            self.addMessage('An agent process that failed was recorded with crashed=%s, timeout=%s' % (
+                summary.crashed, summary.timeout))
+            return self.testFail(grades)
+        if 'RemoteAgentError' not in printed:
+            self.addMessage('The crash was recorded without printing its traceback')
+            return self.testFail(grades)
+
+        try:
+            summary = asyncio.run(play(self.agentArgs, BrokenGhost(1)))
+            self.addMessage('A failing ghost was recorded as a crash of the agent (crashed=%s)' % summary.crashed)
+            return self.testFail(grades)
+        except GhostBug:
+            pass
+        self.addMessage('Agent process failures are crashes; other errors propagate')
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
@@ -0,0 +1,497 @@
+# remoteAgents.py
+# ---------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Agents that think in a subprocess of their own, so a slow or crashing agent
+cannot take the game down with it.
+
+  python pacman.py -p RemoteAgent -a agent=ExpectimaxAgent,evalFn=better -l smallClassic
+  python remoteAgents.py -p ExpectimaxAgent -a evalFn=better -l smallClassic -n 16 --concurrency 4
+
+The game and the agent process talk in JSON lines over the agent's stdin and
+stdout.  At the start of a game the agent process gets the layout and
+builds the same initial GameState as the game; from then on it keeps its
+own mirror of the state and is only sent what changed since its last turn:
+
+  {"type": "turn", "agents": [[index, x, y, direction, scaredTimer], ...],
+   "food": [[x, y], ...], "capsules": [[x, y], ...], "score": 123}
+
+listing the agents whose configuration or scared timer changed, the food
+and capsules eaten and the new score, which takes a few dozen bytes instead
+of a pickled GameState.  The agent process answers {"action": "North"}.
+Every message carries a sequence number "seq" that its reply echoes, so a
+reply is never taken for the answer to a later request.
+Several moves (one per agent) separate two turns of the same agent, so the
+changes are found by comparing with the last state sent, using the food
+bitmask GameStateData keeps, rather than read from the _agentMoved and
+_foodEaten of the last move alone.
+
+RemoteAgent plays through the usual Game loop.  playRemoteGames is an
+asyncio driver that plays many games at once: while one game waits for its
+agent process, the others move on.
+"""
+from game import Agent
+from game import Configuration
+from game import GameStateData
+import json
+import os
+import random
+import subprocess
+import sys
+
+# The agent process is this file run with this flag
+SERVE_FLAG = '--serveAgent'
+
+
+class RemoteAgentError(Exception):
+    "The agent process failed, exited or broke the protocol."
+
+
+def getAgentView(data):
+    "What the agent process needs to know of each agent: position, direction and scared timer."
+    view = []
+    for agentState in data.agentStates:
+        configuration = agentState.configuration
+        x, y = configuration.pos
+        view.append((x, y, configuration.direction, agentState.scaredTimer))
+    return view
+
+
+class StateDeltaTracker:
+    """
+    Remembers the last state sent to an agent process and describes a new
+    state as the changes from it.
+    """
+
+    def __init__(self):
+        self.agents = None
+        self.foodKey = None
+        self.capsules = None
+        self.score = None
+
+    def reset(self, gameState):
+        data = gameState.data
+        self.agents = getAgentView(data)
+        self.foodKey = data._foodKey
+        self.capsules = list(data.capsules)
+        self.score = data.score
+
+    def getDelta(self, gameState):
+        data = gameState.data
+        agents = getAgentView(data)
+        changed = [[index] + list(view) for index, (view, last) in enumerate(zip(agents, self.agents))
+                   if view != last]
+        height = data.food.height
+        eatenBits = self.foodKey & ~data._foodKey
+        eaten = []
+        while eatenBits:
+            low = eatenBits & -eatenBits
+            bit = low.bit_length() - 1
+            eaten.append([bit // height, bit % height])
+            eatenBits ^= low
+        capsules = [list(capsule) for capsule in self.capsules if capsule not in data.capsules]
+        delta = {'agents': changed, 'food': eaten, 'capsules': capsules, 'score': data.score}
+        if data._foodKey & ~self.foodKey:
+            raise RemoteAgentError('Food was added, which the agent protocol cannot describe')
+        self.agents = agents
+        self.foodKey = data._foodKey
+        self.capsules = list(data.capsules)
+        self.score = data.score
+        return delta
+
+
+def applyDelta(gameState, delta):
+    "Returns the state gameState becomes after the changes delta describes."
+    state = gameState.__class__(gameState)
+    data = GameStateData(gameState.data)
+    for index, x, y, direction, scaredTimer in delta['agents']:
+        agentState = data.agentStates[index]
+        agentState.configuration = Configuration((x, y), direction)
+        agentState.scaredTimer = scaredTimer
+    if delta['food']:
+        data.food = data.food.copy()
+        height = data.food.height
+        for x, y in delta['food']:
+            data.food[x][y] = False
+            data._foodKey &= ~(1 << (x * height + y))
+    for x, y in delta['capsules']:
+        data.capsules.remove((x, y))
+    data.scoreChange = delta['score'] - data.score
+    data.score = delta['score']
+    state.data = data
+    return state
+
+
+def getStartMessage(gameState, seed):
+    return {'type': 'start', 'layout': gameState.data.layout.layoutText,
+            'numGhosts': gameState.getNumAgents() - 1, 'seed': seed}
+
+
+def parseReply(line, sequence):
+    "The reply in line, checked to answer request number sequence."
+    if not line:
+        raise RemoteAgentError('The agent process exited')
+    try:
+        reply = json.loads(line)
+    except ValueError:
+        raise RemoteAgentError('The agent process sent %r' % line)
+    if 'error' in reply:
+        raise RemoteAgentError('The agent process failed:\n' + reply['error'])
+    if reply.get('seq') != sequence:
+        raise RemoteAgentError('The agent process answered request %s instead of %d' % (reply.get('seq'), sequence))
+    return reply
+
+
+class RemoteAgent(Agent):
+    """
+    Runs an agent of type agent, built with the rest of the agent arguments,
+    in a subprocess.  The process lives as long as this object, so the agent
+    keeps what it learns from one game to the next, as a local agent would.
+
+    A request that is cut short (by the game's move timeout, which raises
+    out of getAction through SIGALRM) leaves the process working on, or
+    answering, a message the game no longer waits for, and the tracker
+    possibly ahead of what the process has seen.  The next request notices
+    through inFlight and, like the asyncio driver on a timeout, kills the
+    process; a fresh one is started and brought up to the current state from
+    the start of the game.
+    """
+    mutatesState = False
+
+    def __init__(self, index=0, agent='ExpectimaxAgent', **agentArgs):
+        Agent.__init__(self, index)
+        self.agentType = agent
+        self.agentArgs = agentArgs
+        self.process = None
+        self.tracker = StateDeltaTracker()
+        self.sequence = 0
+        self.inFlight = False
+        self.startState = None
+        self.startSeed = None
+
+    def request(self, message):
+        self.inFlight = True
+        self.sequence += 1
+        message['seq'] = self.sequence
+        self.process.stdin.write(json.dumps(message) + '\n')
+        self.process.stdin.flush()
+        reply = parseReply(self.process.stdout.readline(), self.sequence)
+        self.inFlight = False
+        return reply
+
+    def startProcess(self):
+        self.kill()
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), SERVE_FLAG],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.inFlight = False
+        self.request({'type': 'agent', 'agent': self.agentType, 'agentArgs': self.agentArgs,
+                      'index': self.index})
+
+    def startGame(self):
+        self.tracker.reset(self.startState)
+        self.request(getStartMessage(self.startState, self.startSeed))
+
+    def registerInitialState(self, gameState):
+        if self.inFlight or self.process is None or self.process.poll() is not None:
+            self.startProcess()
+        self.startState = gameState.deepCopy()
+        self.startSeed = random.randrange(1 << 32)
+        self.startGame()
+
+    def requestUpdate(self, gameState, message):
+        """
+        Sends message with the changes since the last state sent, first
+        replacing the process if an earlier request was cut short.
+        """
+        if self.inFlight:
+            self.startProcess()
+            self.startGame()
+        # The tracker moves on before the message is out
+        self.inFlight = True
+        message.update(self.tracker.getDelta(gameState))
+        return self.request(message)
+
+    def getAction(self, gameState):
+        return self.requestUpdate(gameState, {'type': 'turn'})['action']
+
+    def final(self, gameState):
+        self.requestUpdate(gameState, {'type': 'final', 'win': gameState.isWin(),
+                                       'lose': gameState.isLose()})
+
+    def kill(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+    def close(self):
+        if self.inFlight:
+            self.kill()
+        if self.process is not None and self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait()
+        self.process = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def serveAgent(input, output):
+    """
+    The agent process: builds the agent, mirrors the game from the messages
+    on input and writes its answers to output.  Whatever the agent prints
+    goes to stderr.
+    """
+    import layout
+    import pacman
+    import traceback
+    agent = None
+    state = None
+    layouts = {}
+    for line in input:
+        message = json.loads(line)
+        try:
+            kind = message['type']
+            if kind == 'agent':
+                agentType = pacman.loadAgent(message['agent'], True)
+                agent = agentType(index=message['index'], **message['agentArgs']) \
+                    if message['index'] else agentType(**message['agentArgs'])
+                reply = {}
+            elif kind == 'start':
+                text = tuple(message['layout'])
+                if text not in layouts:
+                    layouts[text] = layout.Layout(list(text))
+                random.seed(message['seed'])
+                state = pacman.GameState()
+                state.initialize(layouts[text], message['numGhosts'])
+                if hasattr(agent, 'registerInitialState'):
+                    agent.registerInitialState(state.deepCopy())
+                reply = {}
+            elif kind == 'turn':
+                state = applyDelta(state, message)
+                observation = state.deepCopy()
+                if hasattr(agent, 'observationFunction'):
+                    observation = agent.observationFunction(observation)
+                reply = {'action': agent.getAction(observation)}
+            elif kind == 'final':
+                state = applyDelta(state, message)
+                state.data._win = message['win']
+                state.data._lose = message['lose']
+                if hasattr(agent, 'final'):
+                    agent.final(state)
+                reply = {}
+            else:
+                raise Exception('Unknown message type ' + str(kind))
+        except Exception:
+            reply = {'error': traceback.format_exc()}
+        reply['seq'] = message.get('seq')
+        output.write(json.dumps(reply) + '\n')
+        output.flush()
+
+
+class AsyncRemoteAgent:
+    """
+    The asyncio counterpart of RemoteAgent, for playRemoteGames: the same
+    protocol over an asyncio subprocess, so waiting for a move does not
+    block the other games.
+    """
+
+    def __init__(self, agentType, agentArgs, index=0):
+        self.agentType = agentType
+        self.agentArgs = agentArgs
+        self.index = index
+        self.process = None
+        self.tracker = StateDeltaTracker()
+        self.sequence = 0
+
+    async def request(self, message, timeout=None):
+        import asyncio
+        self.sequence += 1
+        message['seq'] = self.sequence
+        self.process.stdin.write((json.dumps(message) + '\n').encode())
+        await self.process.stdin.drain()
+        try:
+            line = await asyncio.wait_for(self.process.stdout.readline(), timeout)
+        except ValueError:
+            raise RemoteAgentError('The agent process sent a line over the stream limit')
+        return parseReply(line.decode(), self.sequence)
+
+    async def start(self, gameState, seed, timeout=None):
+        import asyncio
+        if self.process is None or self.process.returncode is not None:
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, os.path.abspath(__file__), SERVE_FLAG,
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+                cwd=os.path.dirname(os.path.abspath(__file__)))
+            await self.request({'type': 'agent', 'agent': self.agentType,
+                                'agentArgs': self.agentArgs, 'index': self.index})
+        self.tracker.reset(gameState)
+        await self.request(getStartMessage(gameState, seed), timeout)
+
+    async def getAction(self, gameState, timeout=None):
+        message = self.tracker.getDelta(gameState)
+        message['type'] = 'turn'
+        return (await self.request(message, timeout))['action']
+
+    async def final(self, gameState):
+        message = self.tracker.getDelta(gameState)
+        message.update({'type': 'final', 'win': gameState.isWin(), 'lose': gameState.isLose()})
+        await self.request(message)
+
+    async def close(self):
+        if self.process is not None and self.process.returncode is None:
+            self.process.stdin.close()
+            await self.process.wait()
+        self.process = None
+
+    def kill(self):
+        if self.process is not None and self.process.returncode is None:
+            self.process.kill()
+        self.process = None
+
+
+async def playRemoteGame(lay, agent, ghosts, gameIndex, gameSeed, moveTimeout=None):
+    """
+    Plays one game of a remote Pacman against local ghosts and returns its
+    pacman.GameSummary.  The ghosts draw from a random state of their own,
+    swapped in around their moves, so concurrent games do not disturb each
+    other's random numbers.  A game whose agent process fails, exits,
+    breaks the protocol or picks an illegal move is recorded as crashed,
+    with the traceback printed as Game.run does under catchExceptions;
+    other exceptions are not the agent's fault and propagate.
+    """
+    import asyncio
+    import pacman
+    import traceback
+    rand = random.Random(gameSeed)
+    randomState = rand.getstate()
+    state = pacman.GameState()
+    state.initialize(lay, len(ghosts))
+    numAgents = state.getNumAgents()
+    numMoves = 0
+    try:
+        await agent.start(state.deepCopy(), rand.randrange(1 << 32), moveTimeout)
+        agentIndex = 0
+        while not (state.isWin() or state.isLose()):
+            if agentIndex == 0:
+                action = await agent.getAction(state, moveTimeout)
+                if action not in state.getLegalActions(0):
+                    raise RemoteAgentError('The agent process chose the illegal action %r' % (action,))
+            else:
+                random.setstate(randomState)
+                action = ghosts[agentIndex - 1].getAction(state)
+                randomState = random.getstate()
+            state = state.getNextState(agentIndex, action)
+            numMoves += 1
+            agentIndex = (agentIndex + 1) % numAgents
+        await agent.final(state)
+    except asyncio.TimeoutError:
+        agent.kill()
+        return pacman.GameSummary(gameIndex, state.getScore(), False, numMoves, True, True)
+    except (RemoteAgentError, OSError, EOFError):
+        traceback.print_exc()
+        agent.kill()
+        return pacman.GameSummary(gameIndex, state.getScore(), False, numMoves, False, True)
+    return pacman.GameSummary(gameIndex, state.getScore(), state.isWin(), numMoves)
+
+
+async def playRemoteGamesAsync(lay, agentType, agentArgs, ghostType, numGhosts, numGames,
+                               concurrency, seed, moveTimeout=None):
+    import asyncio
+    import pacman
+    agents = asyncio.Queue()
+    for i in range(concurrency):
+        agents.put_nowait(AsyncRemoteAgent(agentType, agentArgs))
+
+    async def play(gameIndex):
+        agent = await agents.get()
+        try:
+            ghosts = [ghostType(i + 1) for i in range(numGhosts)]
+            return await playRemoteGame(lay, agent, ghosts, gameIndex,
+                                        pacman.deriveGameSeed(seed, gameIndex), moveTimeout)
+        finally:
+            agents.put_nowait(agent)
+
+    try:
+        return await asyncio.gather(*[play(i) for i in range(numGames)])
+    finally:
+        while not agents.empty():
+            await agents.get_nowait().close()
+
+
+def playRemoteGames(lay, agentType, agentArgs, ghostType, numGhosts, numGames, concurrency=4,
+                    seed=0, moveTimeout=None):
+    """
+    Plays numGames games with up to concurrency of them in flight, each with
+    its Pacman in an agent process, and returns their GameSummary objects in
+    game order.  Game i is seeded from pacman.deriveGameSeed(seed, i), so
+    the results do not depend on concurrency.
+    """
+    import asyncio
+    return asyncio.run(playRemoteGamesAsync(lay, agentType, agentArgs, ghostType, numGhosts,
+                                            numGames, concurrency, seed, moveTimeout))
+
+
+def readCommand(argv):
+    from optparse import OptionParser
+    parser = OptionParser('python remoteAgents.py -p AGENT [options]')
+    parser.add_option('-l', '--layout', dest='layout', default='smallClassic',
+                      help='the layout to play on [Default: %default]')
+    parser.add_option('-p', '--pacman', dest='pacman', default='ExpectimaxAgent',
+                      help='the Pacman agent type to run out of process [Default: %default]')
+    parser.add_option('-a', '--agentArgs', dest='agentArgs', default=None,
+                      help='comma separated values sent to the agent, e.g. "opt1=val1,opt2"')
+    parser.add_option('-g', '--ghosts', dest='ghost', default='RandomGhost',
+                      help='the ghost agent type [Default: %default]')
+    parser.add_option('-k', '--numghosts', dest='numGhosts', type='int', default=2,
+                      help='the maximum number of ghosts [Default: %default]')
+    parser.add_option('-n', '--numGames', dest='numGames', type='int', default=8,
+                      help='the number of games to play [Default: %default]')
+    parser.add_option('--concurrency', dest='concurrency', type='int', default=4,
+                      help='games (and agent processes) in flight at once [Default: %default]')
+    parser.add_option('--seed', dest='seed', type='int', default=0,
+                      help='master seed each game derives its own seed from [Default: %default]')
+    parser.add_option('--timeout', dest='timeout', type='float', default=None,
+                      help='seconds the agent may take per move')
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == [SERVE_FLAG]:
+        protocol = sys.stdout
+        sys.stdout = sys.stderr
+        serveAgent(sys.stdin, protocol)
+    else:
+        import layout
+        import pacman
+        import time
+        options = readCommand(sys.argv[1:])
+        lay = layout.getLayout(options.layout)
+        if lay == None:
+            raise Exception('The layout ' + options.layout + ' cannot be found')
+        started = time.time()
+        summaries = playRemoteGames(lay, options.pacman, pacman.parseAgentArgs(options.agentArgs),
+                                    pacman.loadAgent(options.ghost, True), options.numGhosts,
+                                    options.numGames, options.concurrency, options.seed, options.timeout)
+        pacman.printGameReport(summaries)
+        print('%d games in %.1fs with %d in flight' % (len(summaries), time.time() - started,
+                                                       options.concurrency))
@@ -0,0 +1,243 @@
+# simulationDaemon.py
+# -------------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+A long-running process that plays Pacman games on request, so short
+evaluation jobs do not each pay for starting Python, importing the agents
+and parsing layouts.
+
+  python simulationDaemon.py --serve &
+  python simulationDaemon.py -l smallClassic -p ExpectimaxAgent -a evalFn=better -n 20 --seed 1
+
+The daemon listens on a Unix domain socket.  A client writes one job per
+line as a JSON object:
+
+  {"layout": "smallClassic", "pacman": "ExpectimaxAgent", "agentArgs": "evalFn=better",
+   "ghost": "RandomGhost", "numGhosts": 2, "numGames": 20, "seed": 1}
+
+Only layout and pacman are required; see JOB_DEFAULTS for the rest.  Games
+run without catchExceptions by default, which lets them take the headless
+loop; an agent that crashes fails its job, not the daemon.  The daemon
+answers with one JSON line per finished game, then one line with
+"done": true and the totals (or one line with an "error").  A connection
+may send any number of jobs, one after another.
+
+Layouts, the tables derived from them and agent classes stay loaded between
+jobs; every job gets fresh agent instances.  Jobs are played one at a time,
+so they do not compete for the global random module: with a seed, a job
+plays the same games as pacman.py with --seed.  A job with "workers" > 1
+plays its games on processes forked from the warm daemon.
+"""
+import json
+import layout
+import os
+import pacman
+import signal
+import socket
+import socketserver
+import sys
+import time
+
+DEFAULT_SOCKET = '/tmp/pacman-simulation.sock'
+
+JOB_DEFAULTS = {
+    'agentArgs': '',
+    'ghost': 'RandomGhost',
+    'numGhosts': 4,
+    'numGames': 1,
+    'seed': None,
+    'timeout': 30,
+    'catchExceptions': False,
+    'workers': 1,
+}
+
+# Layouts by name and agent classes by type name, kept for the daemon's lifetime
+LAYOUTS = {}
+AGENT_CLASSES = {}
+
+
+def getWarmLayout(name):
+    if name not in LAYOUTS:
+        lay = layout.getLayout(name)
+        if lay == None:
+            raise Exception('The layout ' + name + ' cannot be found')
+        # Build the distance tables once, not on the first move of a game
+        lay.getTables()
+        LAYOUTS[name] = lay
+    return LAYOUTS[name]
+
+
+def getAgentClass(name):
+    if name not in AGENT_CLASSES:
+        AGENT_CLASSES[name] = pacman.loadAgent(name, True)
+    return AGENT_CLASSES[name]
+
+
+def runJob(job):
+    """
+    Plays the games a job asks for and yields one result dict per game,
+    then the totals.
+    """
+    import textDisplay
+    unknown = set(job) - set(JOB_DEFAULTS) - set(['layout', 'pacman'])
+    if unknown:
+        raise Exception('Unknown job fields: ' + ', '.join(sorted(unknown)))
+    if 'layout' not in job or 'pacman' not in job:
+        raise Exception('A job needs a layout and a pacman')
+    options = dict(JOB_DEFAULTS)
+    options.update(job)
+    lay = getWarmLayout(options['layout'])
+    agentOpts = pacman.parseAgentArgs(options['agentArgs'] or None)
+    pacmanAgent = getAgentClass(options['pacman'])(**agentOpts)
+    ghostType = getAgentClass(options['ghost'])
+    ghosts = [ghostType(i + 1) for i in range(options['numGhosts'])]
+
+    started = time.time()
+    stats = pacman.RunningStats()
+    for summary in pacman.iterGames(lay, pacmanAgent, ghosts, textDisplay.NullGraphics(),
+                                    options['numGames'], catchExceptions=options['catchExceptions'],
+                                    timeout=options['timeout'], workers=options['workers'],
+                                    seed=options['seed'], quiet=True):
+        stats.add(summary)
+        yield {'game': summary.index, 'score': summary.score, 'win': summary.win,
+               'moves': summary.numMoves, 'timeout': summary.timeout, 'crashed': summary.crashed}
+    low, high = stats.getScoreInterval()
+    yield {'done': True, 'games': stats.count, 'wins': stats.wins, 'mean': stats.mean,
+           'scoreInterval': [low, high], 'winRate': stats.getWinRate(),
+           'seconds': time.time() - started}
+
+
+class SimulationHandler(socketserver.StreamRequestHandler):
+    """
+    Reads jobs from a connection and writes their results back as JSON
+    lines.  A job that fails is answered with {"error": ...}; the
+    connection and the daemon carry on.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                for result in runJob(json.loads(line)):
+                    self.send(result)
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            except Exception as error:
+                self.send({'error': '%s: %s' % (type(error).__name__, error)})
+
+    def send(self, result):
+        self.wfile.write((json.dumps(result) + '\n').encode())
+        self.wfile.flush()
+
+
+class SimulationDaemon(socketserver.UnixStreamServer):
+    """
+    Serves one connection at a time; clients that connect meanwhile wait in
+    the listen backlog.
+    """
+    request_queue_size = 64
+
+    def __init__(self, path):
+        if os.path.exists(path):
+            # A socket left behind by a daemon that did not shut down cleanly
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except OSError:
+                os.unlink(path)
+            else:
+                raise Exception('A daemon is already listening on ' + path)
+            finally:
+                probe.close()
+        socketserver.UnixStreamServer.__init__(self, path, SimulationHandler)
+        self.path = path
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def submitJob(job, path=DEFAULT_SOCKET):
+    """
+    Sends a job to the daemon listening on path and yields its result dicts
+    as they arrive, ending with the totals.  Raises an Exception if the
+    daemon reports an error.
+    """
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.connect(path)
+    try:
+        connection.sendall((json.dumps(job) + '\n').encode())
+        stream = connection.makefile('r')
+        for line in stream:
+            result = json.loads(line)
+            if 'error' in result:
+                raise Exception(result['error'])
+            yield result
+            if result.get('done'):
+                return
+        raise Exception('The daemon closed the connection before the job was done')
+    finally:
+        connection.close()
+
+
+def readCommand(argv):
+    from optparse import OptionParser
+    parser = OptionParser('python simulationDaemon.py --serve | -l LAYOUT -p AGENT [options]')
+    parser.add_option('--serve', dest='serve', action='store_true', default=False,
+                      help='run the daemon instead of submitting a job')
+    parser.add_option('--socket', dest='socket', default=DEFAULT_SOCKET,
+                      help='the Unix socket to listen or connect on [Default: %default]')
+    parser.add_option('-l', '--layout', dest='layout', default='mediumClassic',
+                      help='the layout to play on [Default: %default]')
+    parser.add_option('-p', '--pacman', dest='pacman', default='ExpectimaxAgent',
+                      help='the Pacman agent type [Default: %default]')
+    parser.add_option('-a', '--agentArgs', dest='agentArgs', default='',
+                      help='comma separated values sent to the agent, e.g. "opt1=val1,opt2"')
+    parser.add_option('-g', '--ghosts', dest='ghost', default=JOB_DEFAULTS['ghost'],
+                      help='the ghost agent type [Default: %default]')
+    parser.add_option('-k', '--numghosts', dest='numGhosts', type='int', default=JOB_DEFAULTS['numGhosts'],
+                      help='the maximum number of ghosts [Default: %default]')
+    parser.add_option('-n', '--numGames', dest='numGames', type='int', default=JOB_DEFAULTS['numGames'],
+                      help='the number of games to play [Default: %default]')
+    parser.add_option('--seed', dest='seed', type='int', default=None,
+                      help='master seed each game derives its own seed from')
+    parser.add_option('--workers', dest='workers', type='int', default=JOB_DEFAULTS['workers'],
+                      help='processes the daemon plays the games on [Default: %default]')
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options
+
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    if options.serve:
+        daemon = SimulationDaemon(options.socket)
+        # Shut down through the finally below on kill as well as Ctrl-C
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        print('Listening on ' + options.socket)
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            daemon.server_close()
+    else:
+        job = {'layout': options.layout, 'pacman': options.pacman, 'agentArgs': options.agentArgs,
+               'ghost': options.ghost, 'numGhosts': options.numGhosts, 'numGames': options.numGames,
+               'seed': options.seed, 'workers': options.workers}
+        for result in submitJob(job, options.socket):
+            print(json.dumps(result))
@@ -0,0 +1,310 @@
+# tablebase.py
+# ------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Endgame tablebases: exact game values for tiny layouts.
+
+  python tablebase.py -l minimaxClassic
+  python tablebase.py -l trappedClassic -g expectimax -k 1
+
+The solver enumerates every state reachable from the layout's start
+(positions, directions, remaining food and capsules, scared timers and whose
+turn it is), then runs the Bellman backups backwards from the terminal
+states until the values stop changing.  A state's value is the score Pacman
+still collects from it under optimal play, against minimizing ghosts
+(minimax) or uniformly random ones (expectimax); a game the ghosts can keep
+going forever is worth -inf.
+
+Only the states with Pacman to move are written, as an open-addressing hash
+table of fixed-size records that Tablebase reads through mmap, so a lookup
+costs one hash and usually one probe.  MultiAgentSearchAgent consults a
+table with -a tablebase=PATH and searches as usual for positions it lacks.
+"""
+from pacman import GameState
+import layout
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+TABLEBASE_MAGIC = b'PACTB'
+TABLEBASE_VERSION = 1
+TABLEBASE_HEADER = struct.Struct('<5sB40sBBQQ')
+TABLEBASE_RECORD = struct.Struct('<QdB7x')
+TABLEBASE_MODELS = ['minimax', 'expectimax']
+TABLEBASE_ACTIONS = ['North', 'South', 'East', 'West', 'Stop']
+
+# Enumeration stops with an error past this many states (with Pacman or a
+# ghost to move); each costs a few hundred bytes while solving
+DEFAULT_MAX_STATES = 2000000
+
+
+def getStateKey(gameState):
+    "The cache key of gameState without its score, which the values are relative to."
+    agents, foodKey, capsules, score, win, lose = gameState.getCacheKey()
+    return (agents, foodKey, capsules, win, lose)
+
+
+def getFingerprint(gameState):
+    "A stable 64-bit hash of getStateKey(gameState); never 0, which marks empty slots."
+    digest = hashlib.blake2b(repr(getStateKey(gameState)).encode(), digest_size=8).digest()
+    return struct.unpack('<Q', digest)[0] or 1
+
+
+def getTablebasePath(layoutName, numGhosts, model):
+    return os.path.join('layouts', layout.COMPILED_LAYOUT_DIR,
+                        '%s-%dg-%s.tb' % (layoutName, numGhosts, model))
+
+
+class TablebaseSolver:
+    """
+    Solves the game on a layout by backward induction over its reachable
+    state graph.  After solve(), entries maps the fingerprint of every state
+    with Pacman to move to its (value, best action).
+    """
+
+    def __init__(self, lay, numGhosts, model='minimax', maxStates=DEFAULT_MAX_STATES):
+        if model not in TABLEBASE_MODELS:
+            raise Exception('Unknown ghost model ' + model)
+        self.layout = lay
+        self.numGhosts = min(numGhosts, lay.getNumGhosts())
+        self.model = model
+        self.maxStates = maxStates
+        self.entries = None
+        self.startValue = None
+        self.numStates = 0
+        self.iterations = 0
+
+    def solve(self):
+        start = GameState()
+        start.initialize(self.layout, self.numGhosts)
+        numAgents = start.getNumAgents()
+        index = {}
+        turns = []
+        fingerprints = []
+        children = []
+
+        def visit(gameState, turn):
+            key = (turn, getStateKey(gameState))
+            if key not in index:
+                if len(turns) >= self.maxStates:
+                    raise Exception('More than %d states; raise maxStates or use a smaller layout'
+                                    % self.maxStates)
+                index[key] = len(turns)
+                turns.append(turn)
+                fingerprints.append(getFingerprint(gameState) if turn == 0 else 0)
+                children.append(None)
+                frontier.append(gameState)
+            return index[key]
+
+        frontier = []
+        visit(start, 0)
+        expanded = 0
+        while expanded < len(frontier):
+            gameState = frontier[expanded]
+            frontier[expanded] = None
+            turn = turns[expanded]
+            edges = []
+            if not (gameState.isWin() or gameState.isLose()):
+                nextTurn = (turn + 1) % numAgents
+                for action in gameState.getLegalActions(turn):
+                    child = gameState.getNextState(turn, action)
+                    edges.append((visit(child, nextTurn), child.getScore() - gameState.getScore(), action))
+            children[expanded] = edges
+            expanded += 1
+        self.numStates = len(turns)
+
+        values = self.backup(turns, children)
+        self.startValue = values[0]
+        self.entries = {}
+        for i, turn in enumerate(turns):
+            if turn == 0 and children[i]:
+                bestValue, bestAction = None, None
+                for child, reward, action in children[i]:
+                    value = reward + values[child]
+                    if bestValue is None or value > bestValue:
+                        bestValue, bestAction = value, action
+                self.entries[fingerprints[i]] = (values[i], bestAction)
+            elif turn == 0:
+                self.entries[fingerprints[i]] = (values[i], 'Stop')
+        return self.startValue
+
+    def backup(self, turns, children, tolerance=1e-9, maxIterations=100000):
+        """
+        Value iteration from below: terminal states are worth 0 and all others
+        start at -inf, so after k sweeps a value is what Pacman can secure
+        within k moves.  Sweeping in reverse discovery order lets values flow
+        back from the terminal states in few sweeps.
+        """
+        inf = float('inf')
+        values = [0.0 if not edges else -inf for edges in children]
+        order = [i for i in range(len(turns) - 1, -1, -1) if children[i]]
+        expect = self.model == 'expectimax'
+        for iteration in range(maxIterations):
+            changed = False
+            for i in order:
+                options = [reward + values[child] for child, reward, action in children[i]]
+                if turns[i] == 0:
+                    value = max(options)
+                elif expect:
+                    value = sum(options) / len(options)
+                else:
+                    value = min(options)
+                if value > values[i] + tolerance or (value != values[i] and values[i] == -inf):
+                    values[i] = value
+                    changed = True
+            self.iterations = iteration + 1
+            if not changed:
+                break
+        return values
+
+    def write(self, path):
+        """
+        Writes the Pacman-to-move entries as a hash table with at least twice
+        as many slots as entries, probed linearly from fingerprint % slots.
+        """
+        numSlots = 1
+        while numSlots < 2 * len(self.entries):
+            numSlots *= 2
+        table = bytearray(numSlots * TABLEBASE_RECORD.size)
+        mask = numSlots - 1
+        for fingerprint, (value, action) in self.entries.items():
+            slot = fingerprint & mask
+            while TABLEBASE_RECORD.unpack_from(table, slot * TABLEBASE_RECORD.size)[0] != 0:
+                slot = (slot + 1) & mask
+            TABLEBASE_RECORD.pack_into(table, slot * TABLEBASE_RECORD.size,
+                                       fingerprint, value, TABLEBASE_ACTIONS.index(action))
+        header = TABLEBASE_HEADER.pack(TABLEBASE_MAGIC, TABLEBASE_VERSION,
+                                       self.layout.contentHash.encode(), self.numGhosts,
+                                       TABLEBASE_MODELS.index(self.model), numSlots,
+                                       len(self.entries))
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        tmpPath = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmpPath, 'wb') as f:
+            f.write(header)
+            f.write(table)
+        os.replace(tmpPath, path)
+
+
+class Tablebase:
+    """
+    A solved table opened read-only through mmap.  lookup(gameState) returns
+    (value, action) for a state with Pacman to move, or None when the state
+    is not in the table (another layout or ghost count, or a position the
+    solved game cannot reach).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, contentHash, numGhosts, model, numSlots, numEntries = \
+            TABLEBASE_HEADER.unpack_from(self.map, 0)
+        if magic != TABLEBASE_MAGIC or version != TABLEBASE_VERSION:
+            raise Exception('%s is not a version %d tablebase' % (path, TABLEBASE_VERSION))
+        self.contentHash = contentHash.decode()
+        self.numGhosts = numGhosts
+        self.model = TABLEBASE_MODELS[model]
+        self.numSlots = numSlots
+        self.numEntries = numEntries
+        self.mask = numSlots - 1
+
+    def covers(self, gameState):
+        return gameState.data.layout.contentHash == self.contentHash and \
+            gameState.getNumAgents() == self.numGhosts + 1
+
+    def lookup(self, gameState):
+        if not self.covers(gameState):
+            return None
+        fingerprint = getFingerprint(gameState)
+        slot = fingerprint & self.mask
+        while True:
+            stored, value, action = TABLEBASE_RECORD.unpack_from(
+                self.map, TABLEBASE_HEADER.size + slot * TABLEBASE_RECORD.size)
+            if stored == fingerprint:
+                return value, TABLEBASE_ACTIONS[action]
+            if stored == 0:
+                return None
+            slot = (slot + 1) & self.mask
+
+    def getActionValue(self, gameState, action):
+        """
+        Returns the value of Pacman taking action in gameState, expanding the
+        ghosts' replies down to the next Pacman turn, or None if one of the
+        positions reached is missing from the table.
+        """
+        child = gameState.getNextState(0, action)
+        return child.getScore() - gameState.getScore() + self.getGhostValue(child, 1)
+
+    def getGhostValue(self, gameState, agentIndex):
+        if gameState.isWin() or gameState.isLose():
+            return 0.0
+        if agentIndex == gameState.getNumAgents():
+            entry = self.lookup(gameState)
+            if entry is None:
+                raise KeyError('Position not in tablebase')
+            return entry[0]
+        options = []
+        for action in gameState.getLegalActions(agentIndex):
+            child = gameState.getNextState(agentIndex, action)
+            options.append(child.getScore() - gameState.getScore() +
+                           self.getGhostValue(child, agentIndex + 1))
+        if self.model == 'expectimax':
+            return sum(options) / len(options)
+        return min(options)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+def readCommand(argv):
+    from optparse import OptionParser
+    parser = OptionParser('python tablebase.py -l LAYOUT [options]')
+    parser.add_option('-l', '--layout', dest='layout', default='minimaxClassic',
+                      help='the layout to solve [Default: %default]')
+    parser.add_option('-k', '--numghosts', type='int', dest='numGhosts', default=4,
+                      help='the maximum number of ghosts [Default: %default]')
+    parser.add_option('-g', '--ghosts', dest='model', default='minimax',
+                      help='ghost model, one of: %s [Default: %%default]' % ', '.join(TABLEBASE_MODELS))
+    parser.add_option('-m', '--maxStates', type='int', dest='maxStates', default=DEFAULT_MAX_STATES,
+                      help='give up past this many states [Default: %default]')
+    parser.add_option('-o', '--output', dest='output', default=None,
+                      help='where to write the table [Default: layouts/%s/LAYOUT-Ng-MODEL.tb]'
+                      % layout.COMPILED_LAYOUT_DIR)
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options
+
+
+if __name__ == '__main__':
+    import time
+    options = readCommand(sys.argv[1:])
+    lay = layout.getLayout(options.layout)
+    if lay == None:
+        raise Exception('The layout ' + options.layout + ' cannot be found')
+    solver = TablebaseSolver(lay, options.numGhosts, options.model, options.maxStates)
+    started = time.time()
+    solver.solve()
+    path = options.output or getTablebasePath(options.layout, solver.numGhosts, options.model)
+    solver.write(path)
+    print('%s: %d states, %d with Pacman to move, %d sweeps, %.1fs' % (
+        options.layout, solver.numStates, len(solver.entries), solver.iterations,
+        time.time() - started))
+    print('Start position value under %s ghosts: %s' % (options.model, solver.startValue))
+    print('Written to ' + path)
@@ -0,0 +1,242 @@
+# tournament.py
+# -------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Plays every Pacman configuration against every combination of layout,
+ghost type and ghost count, and ranks the configurations.
+
+  python tournament.py -p ExpectimaxAgent:evalFn=better -p AlphaBetaAgent:evalFn=better,depth=3 \\
+      -l smallClassic,mediumClassic -g RandomGhost,DirectionalGhost -k 1,2 -n 20 --workers 4
+
+Each game is stored in an SQLite database (--db) as soon as it finishes, so
+an interrupted tournament picks up where it stopped when run again with the
+same arguments.  Game i of a matchup is seeded from the master seed, the
+matchup and i, so results do not depend on the number of workers or on the
+order in which games finish.
+"""
+import pacman
+import sqlite3
+import sys
+import time
+
+RESULTS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS games (
+    agent TEXT NOT NULL,
+    layout TEXT NOT NULL,
+    ghost TEXT NOT NULL,
+    numGhosts INTEGER NOT NULL,
+    gameIndex INTEGER NOT NULL,
+    seed TEXT NOT NULL,
+    score REAL NOT NULL,
+    win INTEGER NOT NULL,
+    moves INTEGER NOT NULL,
+    timeout INTEGER NOT NULL,
+    crashed INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (agent, layout, ghost, numGhosts, gameIndex, seed)
+)
+'''
+
+
+class Matchup:
+    """
+    One cell of the tournament: a Pacman configuration ('Type' or
+    'Type:agentArgs') on a layout against numGhosts ghosts of one type.
+    """
+
+    def __init__(self, agent, layoutName, ghost, numGhosts):
+        self.agent = agent
+        self.layoutName = layoutName
+        self.ghost = ghost
+        self.numGhosts = numGhosts
+
+    def getKey(self):
+        return (self.agent, self.layoutName, self.ghost, self.numGhosts)
+
+    def getSeed(self, masterSeed, gameIndex):
+        return pacman.deriveGameSeed('%s|%s|%s|%s|%d' % ((masterSeed,) + self.getKey()), gameIndex)
+
+
+def playMatchupGame(task):
+    """
+    Plays game gameIndex of a matchup with fresh agents and returns the
+    matchup key, the game index and its GameSummary.  Runs in the workers.
+    """
+    import layout
+    import random
+    import textDisplay
+    matchup, gameIndex, masterSeed, timeout = task
+    if ':' in matchup.agent:
+        agentType, agentArgs = matchup.agent.split(':', 1)
+    else:
+        agentType, agentArgs = matchup.agent, None
+    pacmanAgent = pacman.loadAgent(agentType, True)(**pacman.parseAgentArgs(agentArgs))
+    ghostType = pacman.loadAgent(matchup.ghost, True)
+    ghosts = [ghostType(i + 1) for i in range(matchup.numGhosts)]
+    lay = layout.getLayout(matchup.layoutName)
+    if lay == None:
+        raise Exception('The layout ' + matchup.layoutName + ' cannot be found')
+    random.seed(matchup.getSeed(masterSeed, gameIndex))
+    rules = pacman.ClassicGameRules(timeout)
+    start = time.time()
+    game = rules.newGame(lay, pacmanAgent, ghosts, textDisplay.NullGraphics(), True, True)
+    game.run()
+    return matchup.getKey(), gameIndex, pacman.GameSummary.fromGame(gameIndex, game), time.time() - start
+
+
+class Tournament:
+    """
+    Schedules the games of every matchup that the database does not hold yet
+    and stores each result as it arrives.
+    """
+
+    def __init__(self, agents, layouts, ghosts, ghostCounts, numGames, dbPath,
+                 masterSeed=0, workers=1, timeout=30):
+        self.matchups = [Matchup(agent, layoutName, ghost, numGhosts)
+                         for agent in agents for layoutName in layouts
+                         for ghost in ghosts for numGhosts in ghostCounts]
+        self.numGames = numGames
+        self.masterSeed = masterSeed
+        self.workers = workers
+        self.timeout = timeout
+        self.db = sqlite3.connect(dbPath)
+        self.db.execute(RESULTS_SCHEMA)
+        self.db.commit()
+
+    def getPendingTasks(self):
+        done = set(self.db.execute(
+            'SELECT agent, layout, ghost, numGhosts, gameIndex FROM games WHERE seed = ?',
+            (str(self.masterSeed),)).fetchall())
+        return [(matchup, i, self.masterSeed, self.timeout)
+                for i in range(self.numGames) for matchup in self.matchups
+                if matchup.getKey() + (i,) not in done]
+
+    def store(self, key, gameIndex, summary, seconds):
+        self.db.execute('INSERT OR REPLACE INTO games VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        key + (gameIndex, str(self.masterSeed), summary.score, int(summary.win),
+                               summary.numMoves, int(summary.timeout), int(summary.crashed), seconds))
+        self.db.commit()
+
+    def run(self):
+        """
+        Plays the pending games, on a process pool when workers > 1.  Games
+        are handed out one at a time, so a slow matchup does not hold up the
+        workers that finish early.
+        """
+        tasks = self.getPendingTasks()
+        total = len(self.matchups) * self.numGames
+        print('%d of %d games already played' % (total - len(tasks), total))
+        if not tasks:
+            return
+        if self.workers > 1:
+            import multiprocessing
+            if 'fork' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('fork')
+            else:
+                context = multiprocessing.get_context()
+            pool = context.Pool(self.workers)
+            results = pool.imap_unordered(playMatchupGame, tasks, chunksize=1)
+        else:
+            pool = None
+            results = (playMatchupGame(task) for task in tasks)
+        try:
+            for count, (key, gameIndex, summary, seconds) in enumerate(results):
+                self.store(key, gameIndex, summary, seconds)
+                print('[%d/%d] %s on %s vs %d %s: %s %.0f' % (
+                    count + 1, len(tasks), key[0], key[1], key[3], key[2],
+                    ['Loss', 'Win'][int(summary.win)], summary.score))
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+    def getStats(self, groupBy):
+        """
+        Returns a dict from the values of the groupBy columns to the
+        RunningStats of their games under this tournament's seed.
+        """
+        stats = {}
+        matchupKeys = set([matchup.getKey() for matchup in self.matchups])
+        rows = self.db.execute(
+            'SELECT agent, layout, ghost, numGhosts, gameIndex, score, win, moves, timeout, crashed '
+            'FROM games WHERE seed = ? AND gameIndex < ?', (str(self.masterSeed), self.numGames))
+        columns = ['agent', 'layout', 'ghost', 'numGhosts']
+        for row in rows:
+            if tuple(row[:4]) not in matchupKeys:
+                continue
+            group = tuple([row[columns.index(column)] for column in groupBy])
+            if group not in stats:
+                stats[group] = pacman.RunningStats()
+            stats[group].add(pacman.GameSummary(row[4], row[5], bool(row[6]), row[7],
+                                                bool(row[8]), bool(row[9])))
+        return stats
+
+    def printSummary(self):
+        """
+        Ranks the Pacman configurations by mean score over all their games,
+        with 95% confidence intervals, then lists every matchup.
+        """
+        overall = self.getStats(['agent'])
+        ranked = sorted(overall.items(), key=lambda item: -item[1].mean)
+        print('\nRank  %-44s %6s  %-24s %s' % ('Agent', 'Games', 'Mean score [95% CI]', 'Win rate [95% CI]'))
+        for rank, ((agent,), stats) in enumerate(ranked):
+            low, high = stats.getScoreInterval()
+            winLow, winHigh = stats.getWinRateInterval()
+            print('%4d  %-44s %6d  %7.1f [%7.1f, %7.1f]  %.2f [%.2f, %.2f]' % (
+                rank + 1, agent, stats.count, stats.mean, low, high,
+                stats.getWinRate(), winLow, winHigh))
+        cells = self.getStats(['agent', 'layout', 'ghost', 'numGhosts'])
+        print('\n%-44s %-16s %-18s %6s %8s %6s' % ('Agent', 'Layout', 'Ghosts', 'Games', 'Mean', 'Wins'))
+        for (agent, layoutName, ghost, numGhosts), stats in sorted(cells.items()):
+            print('%-44s %-16s %-18s %6d %8.1f %6.2f' % (
+                agent, layoutName, '%d %s' % (numGhosts, ghost), stats.count,
+                stats.mean, stats.getWinRate()))
+
+
+def readCommand(argv):
+    from optparse import OptionParser
+    parser = OptionParser('python tournament.py -p AGENT[:ARGS] [-p AGENT[:ARGS] ...] [options]')
+    parser.add_option('-p', '--pacman', dest='agents', action='append', default=[],
+                      help='a Pacman configuration, e.g. ExpectimaxAgent:evalFn=better,depth=2 (repeatable)')
+    parser.add_option('-l', '--layouts', dest='layouts', default='smallClassic',
+                      help='comma separated layouts [Default: %default]')
+    parser.add_option('-g', '--ghosts', dest='ghosts', default='RandomGhost,DirectionalGhost',
+                      help='comma separated ghost types [Default: %default]')
+    parser.add_option('-k', '--numghosts', dest='ghostCounts', default='2',
+                      help='comma separated ghost counts [Default: %default]')
+    parser.add_option('-n', '--numGames', dest='numGames', type='int', default=10,
+                      help='games per matchup [Default: %default]')
+    parser.add_option('--seed', dest='seed', type='int', default=0,
+                      help='master seed [Default: %default]')
+    parser.add_option('--workers', dest='workers', type='int', default=1,
+                      help='processes to play on [Default: %default]')
+    parser.add_option('--timeout', dest='timeout', type='int', default=30,
+                      help='seconds an agent may think per game [Default: %default]')
+    parser.add_option('--db', dest='db', default='tournament.db',
+                      help='SQLite file results are kept in [Default: %default]')
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    if not options.agents:
+        raise Exception('Name at least one Pacman configuration with -p')
+    return options
+
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    tournament = Tournament(options.agents, options.layouts.split(','), options.ghosts.split(','),
+                            [int(k) for k in options.ghostCounts.split(',')], options.numGames,
+                            options.db, options.seed, options.workers, options.timeout)
+    tournament.run()
+    tournament.printSummary()